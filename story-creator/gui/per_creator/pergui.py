@@ -7,7 +7,7 @@ from PySide2.QtWidgets import (QWidget, QGridLayout, QListWidget, QPushButton, Q
                                QTextEdit)
 from gui.popup import popup
 from libs.creatures import Persona
-from libs import json_reader
+from libs import catalog, json_reader
 
 
 class PersonaUI(QWidget):
@@ -160,7 +160,7 @@ class PersonaUI(QWidget):
         self.luckT.setFixedSize(20, 20)
         self.cfgrid.addWidget(self.luckT, 4, 3)
 
-        resList = json_reader.data_list("resistances")
+        resList = catalog.resistances()
         resL = QLabel(self.createFrame, text="Resistance:")
         self.cfgrid.addWidget(resL, 0, 5)
         slashL = QLabel(self.createFrame, text="Slash")
@@ -218,7 +218,7 @@ class PersonaUI(QWidget):
         self.darkO.setCurrentIndex(1)
         self.cfgrid.addWidget(self.darkO, 9, 6)
 
-        spellList = json_reader.data_list("spells")
+        spellList = catalog.spells()
         self.listLS = QListWidget(self.createFrame)
         self.listLS.setFixedSize(200, 300)
         self.cfgrid.addWidget(self.listLS, 3, 7, 8, 2)
@@ -235,7 +235,7 @@ class PersonaUI(QWidget):
 
         arcanaL = QLabel(self.createFrame, text="Arcana:")
         self.cfgrid.addWidget(arcanaL, 1, 0)
-        arc_list = json_reader.data_list("arcanas")
+        arc_list = catalog.arcanas()
         self.arcO = QComboBox(self.createFrame)
         self.arcO.addItems(arc_list)
         self.arcO.setCurrentIndex(0)
@@ -250,7 +250,7 @@ class PersonaUI(QWidget):
         heritageL = QLabel(self.createFrame, text="Inherits:")
         self.cfgrid.addWidget(heritageL, 3, 0, 1, 2)
 
-        elements = json_reader.data_list("elements")
+        elements = catalog.elements()
         elements.append("Support")
         self.listEL1 = QComboBox(self.createFrame)
         self.listEL1.addItems(elements)
@@ -4,14 +4,16 @@ Module for all the cutscene editing views.
 #pylint: disable=no-name-in-module
 from PySide2.QtWidgets import (QWidget, QGridLayout, QPushButton, QLabel, QComboBox, QListWidget, QTextEdit,
                                QLineEdit)
-from PySide2.QtCore import Qt
+from PySide2.QtCore import Qt, QTimer
 from gui.sl_creator.simulate import Simulation
 from gui.sl_creator.slview import PrettySL
 from gui.sl_creator.slinfo import LinkInfo
 from gui.popup import popup
 from libs.sls import SocialLink
 from libs.action import Info, Speak, Camera, Movement
-from libs import json_reader
+from libs import catalog, json_reader
+
+COMPACT_AFTER_MS = 30000
 
 class SLFrame(QWidget):
     """
@@ -30,7 +32,7 @@ class SLFrame(QWidget):
         self.arcana = arcana
         self.level = level
         self.angle = angle
-        self.linkstored = SocialLink(arcana)
+        self.linkstored = SocialLink(arcana, ["{level}_{angle}".format(level=level, angle=angle)])
         self.link = self.linkstored.startLink(level, angle)
         self.i = 0
 
@@ -40,6 +42,12 @@ class SLFrame(QWidget):
         self.sim = None
         self.cc = None
 
+        # Fold the journal back into the link file once edits have settled down.
+        self.compactTimer = QTimer(self)
+        self.compactTimer.setSingleShot(True)
+        self.compactTimer.setInterval(COMPACT_AFTER_MS)
+        self.compactTimer.timeout.connect(lambda: json_reader.compactLink(self.arcana))
+
         self.initUI()
 
     def initUI(self):
@@ -72,6 +80,8 @@ class SLFrame(QWidget):
         """
         Return view to the parent widget.
         """
+        self.compactTimer.stop()
+        json_reader.compactLink(self.arcana)
         self.mainframe.changeState(self.op)
 
     def simulate(self):
@@ -136,6 +146,38 @@ class SLFrame(QWidget):
         self.linkstored.setLink(self.link, self.level, self.angle)
         self.linkstored.save()
 
+    def saveNode(self, index):
+        """
+        Save a single node of the current cutscene.
+        Only the node is journaled, the full link is rewritten once editing goes idle.
+
+        :param int index: index of the node to save
+        """
+        self.linkstored.setLink(self.link, self.level, self.angle)
+        self.linkstored.saveNode(self.level, self.angle, index)
+        self.compactTimer.start()
+
+    def saveRelation(self, i, j):
+        """
+        Save a new relation of the current cutscene.
+        Only the relation is journaled, the full link is rewritten once editing goes idle.
+
+        :param int i: index of the node the relation starts from
+        :param int j: index of the node the relation leads to
+        """
+        self.linkstored.setLink(self.link, self.level, self.angle)
+        self.linkstored.saveRelation(self.level, self.angle, i, j)
+        self.compactTimer.start()
+
+    def saveCutscene(self):
+        """
+        Save the whole current cutscene, after edits that renumber its nodes.
+        The cutscene is journaled, the full link is rewritten once editing goes idle.
+        """
+        self.linkstored.setLink(self.link, self.level, self.angle)
+        self.linkstored.saveCutscene(self.level, self.angle)
+        self.compactTimer.start()
+
 class SLBase(QWidget):
     """
     Some kind of duplicate class for displaying the "real" edit views.
@@ -184,9 +226,10 @@ class SLBase(QWidget):
         ^ lol ^
         Change frame to edit a certain cutscene action.
         """
+        self.op.i = 0
         if self.actOM.currentText():
-            self.load = self.op.link.getItem(self.actions.index(self.actOM.currentText()))
-        self.op.i = self.actions.index(self.actOM.currentText())
+            self.op.i = self.op.link.getIndex(self.actOM.currentText())
+            self.load = self.op.link.getItem(self.op.i)
         self.close()
         CreationContainer(self.mainframe, self.op, self.load)
 
@@ -294,13 +337,16 @@ class CreationContainer(QWidget):
                      "the graphical view of the tree in order to see the potential effects of the deletion.",
                      "Warning"):
             return
-        self.op.link.delRelation(
+        remap = self.op.link.delRelation(
             self.op.i,
-            self.actions.index(self.existing_connections.currentItem().text())
+            self.op.link.getIndex(self.existing_connections.currentItem().text())
         )
+        # The current element may have moved down, or been deleted along with the subtree.
+        if remap is not None:
+            self.op.i = max(remap[self.op.i], 0)
         self.populateExistingConnections()
         self.updateElementList()
-        self.op.linkstored.save()
+        self.op.saveCutscene()
 
     def populateExistingConnections(self):
         """
@@ -308,7 +354,7 @@ class CreationContainer(QWidget):
         """
         self.existing_connections.clear()
         for relation in self.op.link.getRelations(self.op.i):
-            self.existing_connections.addItem(self.op.link.getOneID(self.op.link.getItem(relation)))
+            self.existing_connections.addItem(self.op.link.getLabel(relation) or "")
 
     def back(self):
         """
@@ -327,12 +373,8 @@ class CreationContainer(QWidget):
         if not self.existing_connections.currentItem() or \
            self.existing_connections.currentItem().text() == "":
             return
-        self.next.setCurrentIndex(
-            [self.next.itemText(i) for i in range(self.next.count())].index(
-                self.existing_connections.currentItem().text()
-            )
-        )
-        self.op.i = self.actions.index(self.next.currentText())
+        self.op.i = self.op.link.getIndex(self.existing_connections.currentItem().text())
+        self.next.setCurrentIndex(self.op.i)
         self.connect()
         self.next.setCurrentIndex(self.next.count()-1)
 
@@ -345,14 +387,17 @@ class CreationContainer(QWidget):
             return
         if self.next.currentText() == "New element":
             self.op.link.addRelation(self.op.i, self.op.link.size())
+            self.op.saveRelation(self.op.i, self.op.link.size())
             print("Linked to index " + str(self.op.link.size()))
             self.op.i = self.op.link.size()
             self.load = 0
             self.changeFrame(0)
             self.updateElementList()
         else:
-            self.op.link.addRelation(self.op.i, self.actions.index(self.next.currentText()))
-            print("Linked to index " + str(self.actions.index(self.next.currentText())))
+            target = self.op.link.getIndex(self.next.currentText())
+            self.op.link.addRelation(self.op.i, target)
+            self.op.saveRelation(self.op.i, target)
+            print("Linked to index " + str(target))
         self.populateExistingConnections()
 
     def connect(self):
@@ -367,17 +412,17 @@ class CreationContainer(QWidget):
             self.load = 0
             self.changeFrame(0)
         else:
-            if isinstance(self.op.link.getItem(self.actions.index(self.next.currentText())), Info):
+            self.load = self.op.link.getItem(self.op.link.getIndex(self.next.currentText()))
+            if isinstance(self.load, Info):
                 self.actOM.setCurrentIndex(0)
-            elif isinstance(self.op.link.getItem(self.actions.index(self.next.currentText())), Speak):
+            elif isinstance(self.load, Speak):
                 self.actOM.setCurrentIndex(1)
-            elif isinstance(self.op.link.getItem(self.actions.index(self.next.currentText())), Camera):
+            elif isinstance(self.load, Camera):
                 self.actOM.setCurrentIndex(2)
-            elif isinstance(self.op.link.getItem(self.actions.index(self.next.currentText())), Movement):
+            elif isinstance(self.load, Movement):
                 self.actOM.setCurrentIndex(3)
             else:
                 raise Exception("Not a type!")
-            self.load = self.op.link.getItem(self.actions.index(self.next.currentText()))
             self.changeFrame(0)
 
     def checkCached(self):
@@ -387,11 +432,9 @@ class CreationContainer(QWidget):
         :returns: if the element has been saved
         :rtype: bool
         """
-        print(len(self.op.link.items)-1)
+        print(self.op.link.size()-1)
         print(self.op.i)
-        if self.op.link.getItem(self.op.i) == []:
-            return False
-        return True
+        return self.op.link.hasItem(self.op.i)
 
     def updateElementList(self):
         """
@@ -472,8 +515,7 @@ class InfoFrame(QWidget):
         print(self.op.op.i)
         self.op.op.link.addItem(infoSlide, self.op.op.i)
         print("Saved")
-        self.op.op.linkstored.setLink(self.op.op.link, self.op.op.level, self.op.op.angle)
-        self.op.op.linkstored.save()
+        self.op.op.saveNode(self.op.op.i)
         self.op.updateElementList()
         popup("Saved!", "Information")
 
@@ -507,7 +549,7 @@ class SpeakFrame(QWidget):
         self.setLayout(self.grid)
 
         self.characs = json_reader.readCharNames()
-        self.arcanas = json_reader.data_list("arcanas")
+        self.arcanas = catalog.arcanas()
         self.arcanas.extend([""])
 
         self.textl = QLabel(self, text="Text:")
@@ -554,7 +596,7 @@ class SpeakFrame(QWidget):
 
         self.emotionL = QLabel(self, text="Emotion:")#emotionL memes
         self.grid.addWidget(self.emotionL, 1, 6)
-        self.s_emotions = json_reader.data_list('sprite_emotions')
+        self.s_emotions = catalog.spriteEmotions()
         self.emotion = QComboBox(self)
         self.emotion.addItems(self.s_emotions)
         self.grid.addWidget(self.emotion, 1, 7)
@@ -644,8 +686,7 @@ class SpeakFrame(QWidget):
                     print("Amount must be an integer")
         self.op.op.link.addItem(speakSlide, self.op.op.i)
         print("Saved")
-        self.op.op.linkstored.setLink(self.op.op.link, self.op.op.level, self.op.op.angle)
-        self.op.op.linkstored.save()
+        self.op.op.saveNode(self.op.op.i)
         self.op.updateElementList()
         popup("Saved!", "Information")
 
@@ -672,7 +713,7 @@ class CameraFrame(QWidget):
         self.grid = QGridLayout()
         self.setLayout(self.grid)
 
-        self.locations = json_reader.data_list("locations")
+        self.locations = catalog.locations()
 
         self.textl = QLabel(self, text="Camera's position x:")
         self.grid.addWidget(self.textl, 1, 0)
@@ -759,8 +800,7 @@ class CameraFrame(QWidget):
         cameraSlide.setCameraPosition(((int)(self.cx.text()), (int)(self.cy.text()), (int)(self.cz.text())))
         self.op.op.link.addItem(cameraSlide, self.op.op.i)
         print("Saved")
-        self.op.op.linkstored.setLink(self.op.op.link, self.op.op.level, self.op.op.angle)
-        self.op.op.linkstored.save()
+        self.op.op.saveNode(self.op.op.i)
         self.op.updateElementList()
         popup("Saved!", "Information")
 
@@ -787,7 +827,7 @@ class MoveFrame(QWidget):
         self.grid = QGridLayout()
         self.setLayout(self.grid)
 
-        self.animations = json_reader.data_list("animations")
+        self.animations = catalog.animations()
         self.characs = json_reader.readCharNames()
 
         self.textl = QLabel(self, text="Go to x:")
@@ -845,7 +885,6 @@ class MoveFrame(QWidget):
         moveSlide.setDestination(((int)(self.lx.text()), (int)(self.ly.text())))
         self.op.op.link.addItem(moveSlide, self.op.op.i)
         print("Saved")
-        self.op.op.linkstored.setLink(self.op.op.link, self.op.op.level, self.op.op.angle)
-        self.op.op.linkstored.save()
+        self.op.op.saveNode(self.op.op.i)
         self.op.updateElementList()
         popup("Saved!", "Information")
@@ -4,7 +4,7 @@ Helper module to simulate running a social link.
 #pylint: disable=no-name-in-module,cell-var-from-loop
 from PySide2.QtWidgets import QWidget, QGridLayout, QPushButton, QLabel
 from PySide2.QtCore import Qt
-from libs.action import Info, Speak, Camera, Movement
+from libs.playback import Playback, describe, NEXT, CHOICE
 
 
 class Simulation(QWidget):
@@ -19,7 +19,6 @@ class Simulation(QWidget):
     def __init__(self, link, arcana, level, angle):
         QWidget.__init__(self)
         self.fullLink = link
-        self.link = self.fullLink.items
         self.arcana = arcana
         self.level = level
         self.angle = angle
@@ -28,7 +27,9 @@ class Simulation(QWidget):
         self.responses = None
         self.next = None
         self.label = None
+        self.totals = None
         self.currentIndex = None
+        self.playback = None
 
         self.start()
 
@@ -45,8 +46,10 @@ class Simulation(QWidget):
         #Causes UI to constantly resize...
         #grid.setSizeConstraint(QLayout.SetFixedSize)
         self.label = None
+        self.totals = None
         self.next = None
         self.responses = []
+        self.playback = Playback(self.fullLink)
         self.currentIndex = 0
 
         self.action()
@@ -67,15 +70,8 @@ class Simulation(QWidget):
 
     def action(self):
         """
-        Handle the prep and display of a single node in the social link graph.
-        Handles connecting the progression buttons to the correct signal.
+        Display the node being played, along with the buttons to move on from it.
         """
-        print(
-            "Dipslaying Action at index " +
-            str(self.currentIndex) +
-            " " +
-            self.fullLink.getOneID(self.fullLink.getItem(self.currentIndex))[:20]
-        )
         for response in self.responses:
             response.close()
             response.clicked.disconnect()
@@ -86,59 +82,45 @@ class Simulation(QWidget):
         self.next = None
         if not self.label:
             self.label = QLabel(self)
-
-        if isinstance(self.link[self.currentIndex][0], Info):
-            actionText = self.link[self.currentIndex][0].text
-        elif isinstance(self.link[self.currentIndex][0], Speak):
-            actionText = self.link[self.currentIndex][0].speaker+":\n\n"+self.link[self.currentIndex][0].text
-        elif isinstance(self.link[self.currentIndex][0], Camera):
-            actionText = "Camera is being changed in/to " + self.link[self.currentIndex][0].place
-        elif isinstance(self.link[self.currentIndex][0], Movement):
-            actionText = self.link[self.currentIndex][0].subject + \
-                         " is performing a " + \
-                         self.link[self.currentIndex][0].animation + \
-                         " action"
-        else:
-            actionText = "ERROR READING SOCIAL LINK\nACTION INDEX: " + self.currentIndex
-
+            self.grid.addWidget(self.label, 0, 0)
+        if not self.totals:
+            self.totals = QLabel(self)
+            self.grid.addWidget(self.totals, 999, 0)
+
+        try:
+            step = self.playback.step()
+        except ValueError:
+            self.label.setText("ERROR READING SOCIAL LINK\nACTION INDEX: " + str(self.playback.index))
+            return
+        self.currentIndex = step.index
+        actionText = describe(step.action)
+        if self.fullLink.inLoop(self.currentIndex, endless=True):
+            actionText += "\n\n(Stuck in a loop that never reaches an end of the cutscene)"
         self.label.setText(actionText)
-        self.grid.addWidget(self.label, 0, 0)
+        self.totals.setText(
+            "Points: " + str(self.playback.points.get(self.arcana, 0)) +
+            "    Angle: " + str(self.playback.angle.get(self.arcana, 0))
+        )
 
-        print("Currently reading: " + str(self.link[self.currentIndex]))
-        if len(self.link[self.currentIndex]) == 2:
+        if step.kind == NEXT:
             self.next = QPushButton(self, text="Next")
             self.grid.addWidget(self.next, 1, 0)
-            self.next.clicked.connect(self.action)
-            self.currentIndex = self.link[self.currentIndex][1]
-        elif len(self.link[self.currentIndex]) > 2:
-            for relation in self.link[self.currentIndex][1:len(self.link[self.currentIndex])]:
-                print("Linked to multiple relations: " + str(relation))
-                self.responses.append(QPushButton(
-                    self,
-                    text=self.fullLink.getOneID(self.fullLink.getItem(relation))
-                ))
+            self.next.clicked.connect(lambda _=False: self.chosenOne(None))
+        elif step.kind == CHOICE:
+            for position, choice in enumerate(step.choices):
+                self.responses.append(QPushButton(self, text=choice.label))
                 self.grid.addWidget(self.responses[-1], len(self.responses), 0)
-                if len(self.link[relation]) == 2:
-                    self.responses[-1].clicked.connect(
-                        lambda _=False, nextIndex=self.link[relation][1]: self.chosenOne(nextIndex)
-                    )
-                else:
-                    self.responses[-1].clicked.connect(
-                        lambda _=False, nextIndex=relation: self.chosenOne(nextIndex)
-                    )
-        elif len(self.link[self.currentIndex]) == 1:
-            print("End of link, user forced to quit")
+                self.responses[-1].clicked.connect(lambda _=False, picked=position: self.chosenOne(picked))
         else:
-            print("ERROR READING SOCIAL LINK\nACTION INDEX: " + str(self.currentIndex))
+            print("End of link, user forced to quit")
 
-    def chosenOne(self, index):
+    def chosenOne(self, choice):
         """
-        Continue the action with the selected index during a choice.
+        Continue the simulation, with the selected option during a choice.
 
-        :param int index: selected index
+        :param int choice: position of the selected option, None if there was no choice
         """
-        print(index)
-        self.currentIndex = index
+        self.playback.advance(choice)
         self.action()
 
 #TESTS
@@ -9,7 +9,7 @@ from gui.sl_creator.qtslgui import SLFrame
 from gui.sl_creator.slinfo import LinkInfo
 from gui.popup import popup
 from libs.sls import SocialLink
-from libs import json_reader
+from libs import catalog, json_reader
 
 
 class SLUI(QWidget):
@@ -44,7 +44,7 @@ class SLUI(QWidget):
         self.grid = QGridLayout()
         self.setLayout(self.grid)
 
-        arcanaList = json_reader.data_list("arcanas")
+        arcanaList = catalog.arcanas()
 
         self.arcSel = QComboBox(self)
         self.arcSel.addItem("Select Arcana")
@@ -83,7 +83,7 @@ class SLUI(QWidget):
         """
         if self.arcSel.currentText() == "Select Arcana":
             return
-        self.mainframe.changeState(LinkInfo(self.mainframe, self, SocialLink(self.arcSel.currentText())))
+        self.mainframe.changeState(LinkInfo(self.mainframe, self, SocialLink(self.arcSel.currentText(), [])))
 
     def context(self):
         """
@@ -128,8 +128,7 @@ class SLUI(QWidget):
             print("Failed to close delang")
         self.angs = []
         try:
-            tempLink = json_reader.readLink(str(self.arcSel.currentText()))
-            for decon in tempLink["cutscenes"]:
+            for decon in json_reader.listCutscenes(str(self.arcSel.currentText())):
                 if str(decon)[:str(decon).index("_")] == \
                    self.levelOM.currentText()[str(self.levelOM.currentText()).index(" ") + 1:]:
                     self.angs.append("Angle " + str(decon)[str(decon).index("_") + 1:])
@@ -172,20 +171,14 @@ class SLUI(QWidget):
                      "you back up your data by going to the Support/Contact page and choose \"Export\".",
                      "Warning"):
             return
-        link = SocialLink(self.arcSel.currentText())
-        print(link.cutscenes)
-        key = self.levelOM.currentText()[self.levelOM.currentText().index(" ")+1:] + \
-              "_" + \
-              self.angleOM.currentText()[self.angleOM.currentText().index(" ")+1:]
-        print(key)
-        if key in link.cutscenes:
-            link.cutscenes.pop(key)
-            link.save()
+        level = self.levelOM.currentText()[self.levelOM.currentText().index(" ")+1:]
+        angle = self.angleOM.currentText()[self.angleOM.currentText().index(" ")+1:]
+        print(level + "_" + angle)
+        json_reader.deleteCutscene(self.arcSel.currentText(), level + "_" + angle)
         self.angleOM.removeItem(self.angleOM.currentIndex())
         if self.angleOM.count() == 0:
             self.angleOM.addItem("No angles")
             self.delang.close()
-        print(link.cutscenes)
         print("Deleted")
 
     def showText(self):
@@ -195,7 +188,7 @@ class SLUI(QWidget):
         temp = [self.arcSel.itemText(i) for i in range(self.arcSel.count())]
         if "Select Arcana" in temp:
             self.arcSel.removeItem(temp.index("Select Arcana"))
-        self.text.setText(json_reader.readArcDesc(str(self.arcSel.currentText())))
+        self.text.setText(catalog.arcanaDescription(str(self.arcSel.currentText())))
         self.card.setPixmap(QPixmap(
             json_reader.buildPath("int/cards/" + str(self.arcSel.currentText()) + ".png")
         ))
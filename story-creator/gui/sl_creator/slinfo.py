@@ -5,7 +5,7 @@ Module to handle the general information related to a Social Link as a whole.
 from PySide2.QtWidgets import QWidget, QGridLayout, QLabel, QComboBox, QTextEdit, QLineEdit, QPushButton
 from PySide2.QtCore import Qt
 from gui.popup import popup
-from libs import json_reader
+from libs import json_reader, feasibility
 
 class LinkInfo(QWidget):
     """
@@ -40,7 +40,7 @@ class LinkInfo(QWidget):
         self.levang = {}
         elev = []
 
-        for key, _ in self.link.cutscenes.items():
+        for key in self.link.cutsceneKeys():
             if key[:key.index("_")] in self.levang:
                 self.levang[key[:key.index("_")]].append(key[key.index("_")+1:])
             else:
@@ -161,7 +161,12 @@ class LinkInfo(QWidget):
             popup("Points must be integers.\nNot saved.", "Critical")
             return
         self.link.save()
-        popup("Saved", "Information")
+        problems = feasibility.check(self.link)
+        if problems:
+            popup("Saved, but some of the link can't be reached:\n\n" + feasibility.formatReport(problems),
+                  "Information")
+        else:
+            popup("Saved", "Information")
 
     def endedit(self):
         """
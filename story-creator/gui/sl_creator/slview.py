@@ -3,11 +3,12 @@ Module for the pretty(ier) graph view of a social link cutscene and it's interde
 TODO replace w/ NodeGraphQT
 """
 #pylint: disable=no-name-in-module
-from PySide2.QtWidgets import QWidget, QGridLayout, QLabel, QPushButton, QHBoxLayout, QScrollArea
+from PySide2.QtWidgets import QWidget, QGridLayout, QLabel, QPushButton, QScrollArea
 from PySide2.QtGui import QPalette, QPen, QPainter
 from PySide2.QtCore import Qt, QPoint
 from gui.popup import popup
 from libs.action import Speak
+from libs.layout import layered
 
 class PrettySL(QWidget):
     """
@@ -21,7 +22,6 @@ class PrettySL(QWidget):
         self.mainframe = mainframe
         self.op = op
         self.graph = self.op.link
-        self.table = self.op.link.items
         self.lastButtonPressed = None
         self.needsRefresh = False
         self.tree = None
@@ -45,9 +45,8 @@ class PrettySL(QWidget):
         """
         self.lab = None
         self.actionIDs = self.graph.getIDs()
-        self.actionObjs = []
-        for act in self.table:
-            self.actionObjs.append(act[0])
+        self.actionObjs = [self.graph.getItem(index) if self.graph.hasItem(index) else None
+                           for index in range(self.graph.size())]
 
     def initUI(self):
         """
@@ -57,7 +56,7 @@ class PrettySL(QWidget):
         self.grid = QGridLayout()
         self.setLayout(self.grid)
 
-        self.tree = TreeWidget(self, self.actionObjs, self.actionIDs, self.table)
+        self.tree = TreeWidget(self, self.actionObjs, self.actionIDs)
 
 
         self.scrollArea = QScrollArea()
@@ -101,7 +100,10 @@ class PrettySL(QWidget):
         if not popup("Are you certain you want to delete this item and it's subtree?\n(Everything in red and"
                      " yellow will be deleted)", "Warning"):
             return
-        self.graph.delItem(self.lastButtonPressed)
+        remap = self.graph.delItem(self.lastButtonPressed)
+        # The current element may have moved down, or been deleted along with the subtree.
+        if self.op.i < len(remap):
+            self.op.i = max(remap[self.op.i], 0)
         self.lab.close()
         self.initData()
         self.lastButtonPressed = None
@@ -112,9 +114,9 @@ class PrettySL(QWidget):
         self.idLabel.close()
         self.edit.clicked.disconnect()
         self.edit.close()
-        self.op.linkstored.save()
+        self.op.saveCutscene()
         self.tree.close()
-        self.tree = TreeWidget(self, self.actionObjs, self.actionIDs, self.table)
+        self.tree = TreeWidget(self, self.actionObjs, self.actionIDs)
         self.grid.addWidget(self.tree, 0, 0, 10, 3)
 
     def initInfoUI(self, index):
@@ -127,11 +129,7 @@ class PrettySL(QWidget):
         if not self.lab:
             self.lab = QLabel(self, text="Selected element summary:")
             self.grid.addWidget(self.lab, 2, 3, 1, 2)
-            idt = ""
-            if isinstance(self.table[index][0], Speak):
-                idt += self.table[index][0].speaker + " says:\n\n"
-            idt += self.actionIDs[index]
-            self.idLabel = QLabel(self, text=idt)
+            self.idLabel = QLabel(self, text=self.summary(index))
             self.idLabel.setFixedSize(300, 40)
             self.idLabel.setWordWrap(True)
             self.grid.addWidget(self.idLabel, 3, 3, 1, 2)
@@ -142,21 +140,11 @@ class PrettySL(QWidget):
             self.grid.addWidget(self.lkst, 5, 3, 1, 2)
             self.rels = QLabel(self)
             self.rels.setMaximumWidth(300)
-            text = ""
-            for relation in self.table[index][1:len(self.table[index])]:
-                text += "(" + str(relation) + ") " + self.graph.getOneID(self.table[relation][0]) + "\n\n"
-            self.rels.setText(text)
+            self.rels.setText(self.relationsText(index))
             self.grid.addWidget(self.rels, 6, 3, 1, 2)
         else:
-            text = ""
-            idt = ""
-            if isinstance(self.table[index][0], Speak):
-                idt += self.table[index][0].speaker + " says:\n\n"
-            idt += self.actionIDs[index]
-            self.idLabel.setText(idt)
-            for relation in self.table[index][1:len(self.table[index])]:
-                text += "(" + str(relation) + ") " + self.graph.getOneID(self.table[relation][0]) + "\n\n"
-            self.rels.setText(text)
+            self.idLabel.setText(self.summary(index))
+            self.rels.setText(self.relationsText(index))
             self.edit.clicked.disconnect()
             self.edit.clicked.connect(lambda: self.enter(index))
         if not self.delete:
@@ -164,6 +152,35 @@ class PrettySL(QWidget):
             self.delete.clicked.connect(self.deleteSubtree)
             self.grid.addWidget(self.delete, 1, 3, 1, 2)
 
+    def summary(self, index):
+        """
+        Describe a node for the info view.
+
+        :param int index: index of the node
+
+        :returns: who speaks, if anyone, and the node's ID
+        :rtype: str
+        """
+        act = self.graph.getItem(index)
+        if isinstance(act, Speak):
+            return act.speaker + " says:\n\n" + self.actionIDs[index]
+        return self.actionIDs[index]
+
+    def relationsText(self, index):
+        """
+        List the nodes a node leads to for the info view.
+
+        :param int index: index of the node
+
+        :returns: index and ID of every node it leads to
+        :rtype: str
+        """
+        text = ""
+        for relation in self.graph.getRelations(index):
+            relationID = self.graph.getOneID(self.graph.getItem(relation)) or "(no action)"
+            text += "(" + str(relation) + ") " + relationID + "\n\n"
+        return text
+
     def enter(self, index):
         """
         Leave the graph view and edit a node.
@@ -216,6 +233,12 @@ class Legend(QWidget):
         self.leaf = QLabel(self, text="End(s) of cutscene:")
         self.grid.addWidget(self.leaf, 5, 0)
 
+        self.loop = QLabel(self, text="Loop:")
+        self.grid.addWidget(self.loop, 6, 0)
+
+        self.endless = QLabel(self, text="Loop without an end:")
+        self.grid.addWidget(self.endless, 7, 0)
+
         # Buffer zone, very dumb
         empty = QLabel(self)
         empty.setFixedSize(150, 20)
@@ -224,6 +247,8 @@ class Legend(QWidget):
         self.grid.addWidget(empty, 3, 1)
         self.grid.addWidget(empty, 4, 1)
         self.grid.addWidget(empty, 5, 1)
+        self.grid.addWidget(empty, 6, 1)
+        self.grid.addWidget(empty, 7, 1)
 
     def paintEvent(self, _):
         """
@@ -261,6 +286,12 @@ class Legend(QWidget):
         pen.setColor(Qt.green)
         qp.setPen(pen)
         qp.drawRect(self.leaf.x()+155, self.leaf.y(), 95, 20)
+        pen.setColor(Qt.blue)
+        qp.setPen(pen)
+        qp.drawRect(self.loop.x()+155, self.loop.y(), 95, 20)
+        pen.setColor(Qt.magenta)
+        qp.setPen(pen)
+        qp.drawRect(self.endless.x()+155, self.endless.y(), 95, 20)
 
 class TreeWidget(QWidget):
     """
@@ -272,15 +303,15 @@ class TreeWidget(QWidget):
     :param QWidget op: parent widget
     :param list actions: list of nodes to display
     :param list ids: list of ids of the action in the actions list, in the same order
-    :param list table: table of both the actions and the ids
     """
-    def __init__(self, op, actions, ids, table):
+    def __init__(self, op, actions, ids):
         QWidget.__init__(self)
         self.actions = actions
         self.ids = ids
-        self.table = table
+        self.ends = set() # Nodes without any relation, boxed in green
         self.op = op
         self.currentDepth = 0
+        self.graphLayout = None
         self.initUI()
 
 
@@ -292,56 +323,49 @@ class TreeWidget(QWidget):
         self.grid = QGridLayout()
         self.setLayout(self.grid)
 
-        self.processed = [0]
-        self.map = [(0, 0)]
+        self.map = []
         self.needsLine = []
         self.depthTracker = {}
         self.buttons = []
 
-        self.nextRow(self.table[0], 1)
+        self.nextRow()
 
         self.mapped = {}
         for element in self.map:
             self.mapped[element[0]] = element[1]
 
-        self.placedInLine = {}
-        self.lineWidgets = {}
         self.buttons = {}
 
         for element in self.map:
-            if element[1] not in self.lineWidgets:
-                self.lineWidgets[element[1]] = (QWidget(), QHBoxLayout())
-                self.lineWidgets[element[1]][0].setLayout(self.lineWidgets[element[1]][1])
-            tempB = QPushButton(self.lineWidgets[element[1]][0], text=self.ids[element[0]])
+            tempB = QPushButton(self, text=self.ids[element[0]])
             tempB.setFixedSize(150, 20)
             # Causes memory leak because lambda prevents button from being cleaned up.
             # _=False because PySide2 sends a state object to the connecting function as well.
             tempB.clicked.connect(lambda _=False, ind=element[0]: self.op.trackIndex(ind))
-            self.lineWidgets[element[1]][1].addWidget(tempB)
+            self.grid.addWidget(tempB, element[1], element[2])
             self.buttons[element[0]] = tempB
-        for lineNumber, widget in self.lineWidgets.items():
-            self.grid.addWidget(widget[0], lineNumber, 0)
+        # Keep room for the relations going through empty columns.
+        for column in range(self.graphLayout.width):
+            self.grid.setColumnMinimumWidth(column, 150)
 
 
-    def nextRow(self, currentAction, currentDepth):
+    def nextRow(self):
         """
-        Parse the next row's worth of buttons recursively.
-        Basically assumes that all rows should be sequential relative to the first caller's row.
-        OK in most situations, but can cause problems.
-
-        :param list currentAction: current entry in self.tables
-        :param int currentDepth: the current row number
+        Place every row's worth of buttons, following the layered layout of the graph (see libs/layout.py).
         """
-        for relation in currentAction[1:len(currentAction)]:
-            if relation not in self.processed:
-                self.processed.append(relation)
-                self.map.append((relation, currentDepth))
-                try:
-                    self.depthTracker[currentDepth] += 1
-                except KeyError:
-                    self.depthTracker[currentDepth] = 1
-                self.nextRow(self.table[relation], currentDepth + 1)
-            self.needsLine.append((self.actions.index(currentAction[0]), relation))
+        graph = self.op.graph
+        self.graphLayout = layered(graph)
+        for depth, row in enumerate(self.graphLayout.rows):
+            if depth and row:
+                self.depthTracker[depth] = len(row)
+            for index in row:
+                self.map.append((index, depth, self.graphLayout.column[index]))
+                relations = graph.getRelations(index)
+                if not relations:
+                    self.ends.add(index)
+                for relation in relations:
+                    if relation in self.graphLayout.rank:
+                        self.needsLine.append((index, relation))
 
     def paintEvent(self, _):
         """
@@ -379,6 +403,14 @@ class TreeWidget(QWidget):
             )
             pen.setColor(Qt.black)
             qp.setPen(pen)
+        for index, button in self.buttons.items():
+            if self.op.graph.inLoop(index):
+                pen.setColor(Qt.magenta if self.op.graph.inLoop(index, endless=True) else Qt.blue)
+                qp.setPen(pen)
+                point = self.mapToTree(index)
+                qp.drawRect(point.x()-4, point.y()-4, button.rect().width()+8, button.rect().height()+8)
+        pen.setColor(Qt.black)
+        qp.setPen(pen)
         for line in self.needsLine:
             width0 = self.buttons[line[0]].rect().width()
             height0 = self.buttons[line[0]].rect().height()
@@ -386,15 +418,15 @@ class TreeWidget(QWidget):
             height1 = self.buttons[line[1]].rect().height()
             ifrom = self.mapToTree(line[0])
             ito = self.mapToTree(line[1])
-            if len(self.table[line[0]]) == 1 or len(self.table[line[1]]) == 1:
+            if line[0] in self.ends or line[1] in self.ends:
                 pen.setColor(Qt.green)
                 qp.setPen(pen)
-                if len(self.table[line[0]]) == 1:
+                if line[0] in self.ends:
                     if line[0] in self.op.subtree or line[0] == self.op.lastButtonPressed:
                         qp.drawRect(ifrom.x() - 2, ifrom.y() - 2, width0 + 4, height0 + 4)
                     else:
                         qp.drawRect(ifrom.x(), ifrom.y(), width0, height0)
-                if len(self.table[line[1]]) == 1:
+                if line[1] in self.ends:
                     if line[1] in self.op.subtree:
                         qp.drawRect(ito.x()-2, ito.y()-2, width1+4, height1+4)
                     else:
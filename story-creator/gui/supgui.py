@@ -138,6 +138,7 @@ class SupportUI(QWidget):
             print("Cancelled")
             return
         print("Copying data to "+str(paths[0])+"/exportdata")
+        json_reader.compactAll()
         try:
             copytree(json_reader.buildPath("data"), str(paths[0])+"/exportdata")
         except OSError as e:
@@ -240,14 +241,18 @@ class EmailFrame(QWidget):
         msg['Subject'] = str(self.subject.text())
         if self.addFiles.isChecked():
             print("Adding files")
+            json_reader.compactAll()
             fileNames = glob(json_reader.buildPath("data/*.json")) + \
+                        [path for arcana in json_reader.listLinks() if json_reader.isShardedLink(arcana)
+                         for path in json_reader.linkFiles(arcana)] + \
                         glob(json_reader.buildPath("data/pers/*.json")) + \
                         glob(json_reader.buildPath("data/chars/*.json"))
             print(fileNames)
             for file in fileNames:
                 part = MIMEBase('application', "octet-stream")
                 part.set_payload(open(file, "rb").read())
-                part.add_header('Content-Disposition', 'attachment; filename="%s"' % file[file.rfind("/"):])
+                part.add_header('Content-Disposition', 'attachment; filename="%s"' %
+                                os.path.relpath(file, json_reader.buildPath("data")))
                 msg.attach(part)
 
         serv = smtplib.SMTP("smtp.live.com", 587)
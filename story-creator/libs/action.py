@@ -1,7 +1,6 @@
 """
 This module holds all the logic pertaining to what actions that can transpire within a cutscene represent.
 """
-#pylint: disable=dangerous-default-value
 def load(action):
     """
     Attempt to load a generic action dict into whatever Action type possible.
@@ -87,11 +86,11 @@ class Speak():
     :param dict angle: {arcana: amount} of angle degree to gain or lose
     :param str emotion: emotion for the sprite
     """
-    def __init__(self, text="", speaker="", points={}, angle={}, emotion=""):
+    def __init__(self, text="", speaker="", points=None, angle=None, emotion=""):
         self.text = text
         self.speaker = speaker
-        self.points = points
-        self.angle = angle
+        self.points = {} if points is None else points
+        self.angle = {} if angle is None else angle
         self.emotion = emotion
 
     def putPoints(self, arcana, points):
@@ -174,10 +173,10 @@ class Camera():
     :param list cameraPosition: xyz coordinates of the center of the camera itself
     :param list lookAt: xyz coordinates that the camera's focus should be centered on
     """
-    def __init__(self, place="", cameraPosition=[], lookAt=[]):
+    def __init__(self, place="", cameraPosition=None, lookAt=None):
         self.place = place
-        self.cameraPosition = cameraPosition
-        self.lookAt = lookAt
+        self.cameraPosition = [] if cameraPosition is None else cameraPosition
+        self.lookAt = [] if lookAt is None else lookAt
 
     def setPlace(self, placenew):
         """
@@ -0,0 +1,312 @@
+"""
+Compilation of social link cutscenes into a flat instruction stream, played by libs/playback.py and suited
+to exported runtimes.
+
+Every node of a cutscene becomes a block of ints, with every string, coordinate and point/angle table it uses
+interned once in a shared constant table. Blocks follow the playback rules (see libs/playback.py), worked out
+once at compile time rather than on every step:
+    action:     opcode, node index, operands (constant references)
+                    OP_INFO     text
+                    OP_SPEAK    speaker, text, emotion, points, angle (points/angle as [[arcana, amount]])
+                    OP_CAMERA   place, camera position, look at
+                    OP_MOVE     subject, animation, destination
+                    OP_EMPTY    (empty slot or missing node, stops playback with an error)
+    followed by control:
+                    OP_JUMP     address of the next block
+                    OP_CHOICE   number of options, then for each: option index, label reference, address of
+                                the reply played on the way (-1 if none), address of the block moved to
+                    OP_HALT     (end of the cutscene)
+
+Exported programs (see dumps) are laid out as (little-endian):
+    4 bytes         MAGIC
+    u8              format version
+    u32 + bytes     cutscene id and constant table, as a utf-8 JSON list [id, constants]
+    u32 + array     address of the block of every node
+    u32 + array     instruction stream
+Programs are cached until the graph changes.
+"""
+import json
+import struct
+from array import array
+from weakref import WeakKeyDictionary
+
+from libs.action import Info, Speak, Camera, Movement
+
+MAGIC = b"PXBC"
+VERSION = 1
+
+OP_INFO = 0
+OP_SPEAK = 1
+OP_CAMERA = 2
+OP_MOVE = 3
+OP_EMPTY = 4
+OP_JUMP = 5
+OP_CHOICE = 6
+OP_HALT = 7
+
+WIDTHS = (3, 7, 5, 5, 2) # Length of the action part of a block, by opcode
+
+_U32 = struct.Struct("<I")
+_SWAP = struct.pack("=I", 1) != _U32.pack(1)
+
+_CACHE = WeakKeyDictionary()
+
+
+def compiled(graph):
+    """
+    Get the program of a graph, compiling it if the graph changed since it was last compiled.
+
+    :param MathGraph graph: cutscene to compile
+
+    :returns: program of the cutscene
+    :rtype: Program
+    """
+    program = _CACHE.get(graph)
+    if program is None or program.version != graph.version:
+        program = _CACHE[graph] = Program(graph)
+    return program
+
+
+def transitions(graph, index):
+    """
+    Get every way of moving on from a node, see libs/playback.py.
+
+    :param MathGraph graph: cutscene being played
+    :param int index: index of the node being played
+
+    :returns: (target, played) of every way of moving on, in the order of the node's relations: target being
+              the next node played, played every node played on the way (replies), target included
+    :rtype: list[tuple(int, tuple)]
+    """
+    relations = graph.getRelations(index)
+    if len(relations) == 1:
+        return [(relations[0], (relations[0],))]
+    moves = []
+    for option in relations:
+        following = graph.getRelations(option)
+        if len(following) == 1 and following[0] != option:
+            moves.append((following[0], (option, following[0])))
+        else:
+            moves.append((option, (option,)))
+    return moves
+
+
+class Program():
+    """
+    Compiled cutscene, see module doc.
+    Prefer compiled, which caches programs.
+
+    :param MathGraph graph: cutscene to compile, None for an empty program (see loads)
+    """
+    def __init__(self, graph=None):
+        self.version = None
+        self.id = None
+        self.code = array('i')
+        self.constants = []
+        self.entries = array('i') # Address of the block of every node
+        self.actions = [] # Action of every node, None for empty slots
+        self._refs = {} # {(str, string) or (None, JSON): constant index}, only while compiling
+        if graph is None:
+            return
+
+        self.version = graph.version
+        self.id = graph.id
+        size = len(graph.nodes)
+        for index in range(size):
+            self.entries.append(len(self.code))
+            act = graph.getItem(index) if graph.hasItem(index) else None
+            self.actions.append(act)
+            self._emitAction(index, act)
+            if act is None:
+                self.code.append(OP_HALT)
+                continue
+            moves = transitions(graph, index)
+            if not moves:
+                self.code.append(OP_HALT)
+            elif len(moves) == 1:
+                self.code.extend((OP_JUMP, moves[0][0]))
+            else:
+                self.code.extend((OP_CHOICE, len(moves)))
+                for target, played in moves:
+                    option = played[0]
+                    self.code.extend((
+                        option, self._ref(graph.getOneID(graph.getItem(option))),
+                        option if target != option else -1, target
+                    ))
+
+        # Targets were emitted as node indexes, now that every block is placed they become addresses.
+        traps = {}
+        code = self.code
+        for start in self.entries:
+            address = start + WIDTHS[code[start]]
+            if code[address] == OP_JUMP:
+                code[address + 1] = self._resolve(code[address + 1], traps)
+            elif code[address] == OP_CHOICE:
+                for option in range(address + 2, address + 2 + 4*code[address + 1], 4):
+                    if code[option + 2] >= 0:
+                        code[option + 2] = self._resolve(code[option + 2], traps)
+                    code[option + 3] = self._resolve(code[option + 3], traps)
+        self._refs = {}
+
+    def address(self, index):
+        """
+        Get the address of the block of a node.
+
+        :param int index: index of the node
+
+        :returns: address, -1 if the node is out of the cutscene
+        :rtype: int
+        """
+        return self.entries[index] if 0 <= index < len(self.entries) else -1
+
+    def _emitAction(self, index, act):
+        """
+        Emit the action part of a node's block.
+
+        :param int index: index of the node
+        :param Action act: action of the node, None for an empty slot
+        """
+        if isinstance(act, Speak):
+            self.code.extend((OP_SPEAK, index, self._ref(act.speaker), self._ref(act.text),
+                              self._ref(act.emotion), self._ref(sorted(act.points.items())),
+                              self._ref(sorted(act.angle.items()))))
+        elif isinstance(act, Info):
+            self.code.extend((OP_INFO, index, self._ref(act.text)))
+        elif isinstance(act, Camera):
+            self.code.extend((OP_CAMERA, index, self._ref(act.place), self._ref(act.cameraPosition),
+                              self._ref(act.lookAt)))
+        elif isinstance(act, Movement):
+            self.code.extend((OP_MOVE, index, self._ref(act.subject), self._ref(act.animation),
+                              self._ref(act.destination)))
+        else:
+            self.code.extend((OP_EMPTY, index))
+
+    def _resolve(self, target, traps):
+        """
+        Get the address of the block a relation leads to, emitting an OP_EMPTY block for missing nodes.
+
+        :param int target: index of the node the relation leads to
+        :param dict traps: {index: address} of the blocks of missing nodes emitted so far
+
+        :returns: address
+        :rtype: int
+        """
+        if 0 <= target < len(self.entries):
+            return self.entries[target]
+        if target not in traps:
+            traps[target] = len(self.code)
+            self.code.extend((OP_EMPTY, target, OP_HALT))
+        return traps[target]
+
+    def _ref(self, value):
+        """
+        Get the constant table index of a value, adding it to the table if needed.
+
+        :param object value: JSON-compatible value to intern
+
+        :returns: constant index
+        :rtype: int
+        """
+        if isinstance(value, str):
+            key = (str, value)
+        else:
+            key = (None, json.dumps(value))
+        ref = self._refs.get(key)
+        if ref is None:
+            ref = self._refs[key] = len(self.constants)
+            # Stored as JSON would load it, so that exported programs play exactly the same.
+            self.constants.append(value if key[0] is str else json.loads(key[1]))
+        return ref
+
+
+def dumps(program):
+    """
+    Export a program as bytes, for runtimes playing cutscenes without the editor.
+
+    :param Program program: program to export
+
+    :returns: exported program
+    :rtype: bytes
+    """
+    table = json.dumps([program.id, program.constants], separators=(',', ':')).encode("utf-8")
+    body = bytearray(MAGIC + struct.pack("<B", VERSION))
+    body.extend(_U32.pack(len(table)) + table)
+    for values in (program.entries, program.code):
+        body.extend(_U32.pack(len(values)))
+        body.extend(_tobytes(values))
+    return bytes(body)
+
+
+def loads(data):
+    """
+    Load an exported program, rebuilding the action of every node from its operands.
+
+    :param bytes data: exported program
+
+    :raises ValueError: if the data is not an exported program of a supported version
+
+    :returns: program
+    :rtype: Program
+    """
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError("Not an exported cutscene")
+    version = data[len(MAGIC)]
+    if version != VERSION:
+        raise ValueError("Unsupported exported cutscene version: %s" % version)
+    body = memoryview(data)
+    pos = len(MAGIC) + 1
+    length = _U32.unpack_from(body, pos)[0]
+    program = Program()
+    program.id, program.constants = json.loads(str(body[pos + 4:pos + 4 + length], "utf-8"))
+    pos += 4 + length
+    for name in ("entries", "code"):
+        count = _U32.unpack_from(body, pos)[0]
+        values = array('i')
+        values.frombytes(body[pos + 4:pos + 4 + 4*count])
+        if _SWAP:
+            values.byteswap()
+        setattr(program, name, values)
+        pos += 4 + 4*count
+    program.actions = [_decode(program, address) for address in program.entries]
+    return program
+
+
+def _decode(program, address):
+    """
+    Rebuild the action of a block.
+
+    :param Program program: program holding the block
+    :param int address: address of the block
+
+    :returns: action, None for an empty slot
+    :rtype: Action|None
+    """
+    code, constants = program.code, program.constants
+    operands = [constants[ref] for ref in code[address + 2:address + WIDTHS[code[address]]]]
+    opcode = code[address]
+    if opcode == OP_SPEAK:
+        speaker, text, emotion, points, angle = operands
+        return Speak(text, speaker, dict(points), dict(angle), emotion)
+    if opcode == OP_INFO:
+        return Info(operands[0])
+    if opcode == OP_CAMERA:
+        return Camera(*operands)
+    if opcode == OP_MOVE:
+        subject, animation, destination = operands
+        return Movement(subject, destination, animation)
+    return None
+
+
+def _tobytes(values):
+    """
+    Get the little-endian bytes of an int array.
+
+    :param array values: array('i') to pack
+
+    :returns: packed array
+    :rtype: bytes
+    """
+    if _SWAP:
+        values = array('i', values)
+        values.byteswap()
+    return values.tobytes()
@@ -0,0 +1,155 @@
+"""
+Process-wide cache of the application's static data files (int/data.json and int/arcanaDescription.json).
+
+Each file is parsed once and kept in memory. The file's modification time is checked at most once every
+CHECK_INTERVAL seconds, and the file is reloaded if it changed on disk, so lookups are memory reads.
+Lists are returned as copies, so callers are free to modify what they get.
+"""
+import json
+import os
+import time
+from threading import Lock
+
+from libs import json_reader
+
+CHECK_INTERVAL = 2.0
+
+
+class Catalog():
+    """
+    Loaded-once view of a JSON data file.
+
+    :param str filename: path to the file, relative to the top-level of this application's package
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.data = None
+        self.mtime = None
+        self.checked = 0
+        self.lock = Lock()
+
+    def get(self):
+        """
+        Get the content of the file, (re)loading it if it was never loaded or changed on disk.
+
+        :returns: parsed file content
+        :rtype: dict
+        """
+        now = time.monotonic()
+        if self.data is not None and now - self.checked < CHECK_INTERVAL:
+            return self.data
+        with self.lock:
+            path = json_reader.buildPath(self.filename)
+            mtime = os.stat(path).st_mtime_ns
+            if self.data is None or mtime != self.mtime:
+                with open(path) as json_data:
+                    self.data = json.load(json_data)
+                self.mtime = mtime
+            self.checked = now
+        return self.data
+
+    def entry(self, key):
+        """
+        Get a single top-level entry of the file.
+
+        :param str key: entry to fetch
+
+        :returns: a copy of the entry
+        :rtype: list|dict|str
+        """
+        value = self.get()[key]
+        if isinstance(value, (list, dict)):
+            return value.copy()
+        return value
+
+    def invalidate(self):
+        """
+        Force the file to be reloaded on the next access.
+        """
+        self.data = None
+
+
+DATA = Catalog('int/data.json')
+ARCANA_DESCRIPTIONS = Catalog('int/arcanaDescription.json')
+
+
+def arcanas():
+    """
+    Get the names of every arcana.
+
+    :returns: arcana names
+    :rtype: list[str]
+    """
+    return DATA.entry("arcanas")
+
+
+def spells():
+    """
+    Get the names of every spell.
+
+    :returns: spell names, starting with an empty entry
+    :rtype: list[str]
+    """
+    return DATA.entry("spells")
+
+
+def resistances():
+    """
+    Get every possible elemental resistance.
+
+    :returns: resistance names
+    :rtype: list[str]
+    """
+    return DATA.entry("resistances")
+
+
+def elements():
+    """
+    Get every spell element.
+
+    :returns: element names
+    :rtype: list[str]
+    """
+    return DATA.entry("elements")
+
+
+def locations():
+    """
+    Get every location a camera can be placed in.
+
+    :returns: location names
+    :rtype: list[str]
+    """
+    return DATA.entry("locations")
+
+
+def animations():
+    """
+    Get every animation a movement can use.
+
+    :returns: animation names
+    :rtype: list[str]
+    """
+    return DATA.entry("animations")
+
+
+def spriteEmotions():
+    """
+    Get every emotion a speaker's sprite can show.
+
+    :returns: emotion names
+    :rtype: list[str]
+    """
+    return DATA.entry("sprite_emotions")
+
+
+def arcanaDescription(arcana):
+    """
+    Get the description of an arcana.
+
+    :param str arcana: arcana's description to fetch
+
+    :returns: arcana description
+    :rtype: str
+    """
+    return ARCANA_DESCRIPTIONS.entry(arcana)
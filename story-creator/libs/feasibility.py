@@ -0,0 +1,294 @@
+"""
+Check that every cutscene and final persona of a social link can actually be reached.
+
+A player goes through a link's levels 1 to 10 in order, playing one cutscene per level. The points and
+angle earned in a cutscene (see libs/ranges.py) add up to the player's totals for the link's arcana, which
+decide the next cutscene: at each level, the cutscene played is the one with the highest angle floor not
+above the player's angle, provided the player has the points it requires (SocialLink.requiredPoints).
+
+Totals are followed level by level as intervals: starting from 0 points and 0 angle, the totals a player can
+have when entering every cutscene are narrowed by its angle floor and required points, then widened by the
+lowest and highest totals the cutscene gives. The totals of every cutscene of a level are merged to enter the
+next level. Intervals can only over-estimate what a player can have, so anything found unreachable really is.
+Cutscene analyses are cached until they change, so checking a link after editing its information is cheap.
+"""
+from collections import namedtuple
+
+from libs import json_reader
+from libs.logictree import MathGraph
+from libs.ranges import analyse, INFINITY
+
+LEVELS = range(1, 11)
+STATS = ("courage", "charm", "acad")
+
+UNREACHABLE = "unreachable"
+DEAD_END = "dead-end"
+MISSING_LEVEL = "missing-level"
+STRAY_GATE = "stray-gate"
+BAD_STAT = "bad-stat"
+FINAL_PERSONA = "final-persona"
+MISSING_CUTSCENE = "missing-cutscene"
+
+Problem = namedtuple("Problem", ["level", "angle", "kind", "message"])
+
+# {(arcana, level_angle): (content hash, MathGraph)} of the cutscenes read for links that didn't load them.
+_GRAPHS = {}
+
+
+class Feasibility():
+    """
+    Totals a player can have throughout a social link, see module doc.
+
+    :param SocialLink link: social link to check
+    """
+    def __init__(self, link):
+        self.arcana = link.arcana
+        self.entries = {} # {level_angle: (points, angle) entering the cutscene, None if never played}
+        self.exits = {} # {level_angle: (points, angle) intervals after the cutscene, None if it can't end}
+        self.problems = []
+        self.stored = None # {level_angle: MathGraph} of the cutscenes the link didn't load, see _stored
+
+        floors = {}
+        for cid in link.cutsceneKeys():
+            level, _, angle = cid.partition("_")
+            try:
+                floors.setdefault(int(level), []).append(int(angle))
+            except ValueError:
+                continue
+
+        totals = ((0, 0), (0, 0))
+        missing = []
+        for level in LEVELS:
+            if level not in floors:
+                missing.append(level)
+                continue
+            if missing:
+                self._report(missing[0], None, MISSING_LEVEL, "no cutscene up to level " + str(missing[-1]) +
+                             ", the link can't go on to level " + str(level))
+                missing = []
+            angles = sorted(floors[level])
+            leaving = []
+            for position, floor in enumerate(angles):
+                ceiling = angles[position + 1] - 1 if position + 1 < len(angles) else INFINITY
+                cid = str(level) + "_" + str(floor)
+                entry = self._enter(level, floor, ceiling, totals, link.requiredPoints)
+                self.entries[cid] = entry
+                self.exits[cid] = None
+                if entry is None:
+                    continue
+                graph = self._graph(link, level, floor)
+                if graph is None:
+                    continue
+                ranges = analyse(graph)
+                if not ranges.paths:
+                    self._report(level, floor, DEAD_END, "no playthrough of the cutscene ends")
+                    continue
+                points = _add(entry[0], ranges.points.get(self.arcana, (0, 0)))
+                angle = _add(entry[1], ranges.angle.get(self.arcana, (0, 0)))
+                self.exits[cid] = (points, angle)
+                leaving.append((points, angle))
+            totals = (_hull(total[0] for total in leaving), _hull(total[1] for total in leaving)) \
+                if leaving else None
+
+        self._checkGates(link.requiredPoints)
+        self._checkFinalPersonas(link.finalpersona)
+
+    def _enter(self, level, floor, ceiling, totals, requiredPoints):
+        """
+        Narrow the totals a player can have to those that play a cutscene.
+
+        :param int level: level of the cutscene
+        :param int floor: angle floor of the cutscene
+        :param float ceiling: highest angle playing the cutscene rather than the next one at this level
+        :param tuple totals: (points, angle) intervals when entering the level, None if it can't be reached
+        :param dict requiredPoints: SocialLink.requiredPoints
+
+        :returns: (points, angle) intervals when entering the cutscene, None if it can't be
+        :rtype: tuple|None
+        """
+        if totals is None:
+            self._report(level, floor, UNREACHABLE, "no playthrough of the previous levels gets this far")
+            return None
+        points, angle = totals
+        if angle[1] < floor:
+            self._report(level, floor, UNREACHABLE, "needs an angle of " + str(floor) + ", at most " +
+                         _show(angle[1]) + " by then")
+            return None
+        if angle[0] > ceiling:
+            self._report(level, floor, UNREACHABLE, "the angle is at least " + _show(angle[0]) +
+                         " by then, the cutscene at angle " + str(ceiling + 1) + " is played instead")
+            return None
+        required = requiredPoints.get(str(level), {}).get(str(floor), {}).get("points")
+        if required is not None:
+            if points[1] < required:
+                self._report(level, floor, UNREACHABLE, "needs " + str(required) + " points, at most " +
+                             _show(points[1]) + " by then")
+                return None
+            points = (max(points[0], required), points[1])
+        return points, (max(angle[0], floor), min(angle[1], ceiling))
+
+    def _checkGates(self, requiredPoints):
+        """
+        Check the requirements of every cutscene.
+
+        :param dict requiredPoints: SocialLink.requiredPoints
+        """
+        for level, gates in sorted(requiredPoints.items()):
+            for angle, gate in sorted(gates.items()):
+                if level + "_" + angle not in self.entries:
+                    self._report(level, angle, STRAY_GATE, "requirements for a cutscene that doesn't exist")
+                for stat in STATS:
+                    if stat in gate and not 1 <= gate[stat] <= 5:
+                        self._report(level, angle, BAD_STAT, stat + " requirement " + str(gate[stat]) +
+                                     " is not between 1 and 5")
+
+    def _checkFinalPersonas(self, finalpersona):
+        """
+        Check that every final persona is given at the end of a level 10 cutscene that can be finished.
+
+        :param dict finalpersona: SocialLink.finalpersona, {angle: persona name}
+        """
+        for angle, persona in sorted(finalpersona.items()):
+            cid = "10_" + str(angle)
+            if cid not in self.exits:
+                self._report(10, angle, FINAL_PERSONA, persona + " is given at angle " + str(angle) +
+                             ", which has no level 10 cutscene")
+            elif self.exits[cid] is None:
+                self._report(10, angle, FINAL_PERSONA, persona + " can never be obtained")
+
+    def _graph(self, link, level, floor):
+        """
+        Get a cutscene of the link, from storage if the link was only partially loaded (see _stored).
+
+        :param SocialLink link: social link checked
+        :param int level: level of the cutscene
+        :param int floor: angle floor of the cutscene
+
+        :returns: cutscene, None if it can't be read
+        :rtype: MathGraph|None
+        """
+        cid = str(level) + "_" + str(floor)
+        graph = None
+        if cid in link.cutscenes:
+            try:
+                graph = link.cutscenes[cid]
+            except KeyError:
+                pass
+        else:
+            graph = self._stored(link).get(cid)
+        if graph is None:
+            self._report(level, floor, MISSING_CUTSCENE, "the cutscene can't be read")
+        return graph
+
+    def _stored(self, link):
+        """
+        Get every cutscene of the link that it didn't load.
+        They are kept in _GRAPHS rather than in the link, which is left as it is, so that their analyses stay
+        cached until they change in storage. Those not cached are read all at once, the first time one is
+        needed.
+
+        :param SocialLink link: social link checked
+
+        :returns: {level_angle: MathGraph} of every cutscene that could be read
+        :rtype: dict
+        """
+        if self.stored is not None:
+            return self.stored
+        self.stored = {}
+        entries = json_reader.readManifest(self.arcana)["cutscenes"]
+        hashes = {cid: entry["hash"] for cid, entry in entries.items()}
+        missing = []
+        for cid in link.cutsceneKeys():
+            if cid in link.cutscenes:
+                continue
+            cached = _GRAPHS.get((self.arcana, cid))
+            if cached is not None and hashes.get(cid) is not None and cached[0] == hashes[cid]:
+                self.stored[cid] = cached[1]
+            else:
+                missing.append(cid)
+        if not missing:
+            return self.stored
+        for cid, raw in json_reader.readCutscenes(self.arcana, missing).items():
+            graph = self.stored[cid] = MathGraph(raw["id"]).loadGraph(raw["items"])
+            if hashes.get(cid) is not None:
+                _GRAPHS[(self.arcana, cid)] = (hashes[cid], graph)
+        return self.stored
+
+    def _report(self, level, angle, kind, message):
+        """
+        Record a problem.
+
+        :param int level: level of the problem
+        :param int angle: angle of the problem, None for the whole level
+        :param str kind: kind of problem
+        :param str message: explanation
+        """
+        self.problems.append(Problem(str(level), None if angle is None else str(angle), kind, message))
+
+
+def check(link):
+    """
+    Check every cutscene and final persona of a social link can be reached, see module doc.
+
+    :param SocialLink link: social link to check
+
+    :returns: every problem found
+    :rtype: list[Problem]
+    """
+    return Feasibility(link).problems
+
+
+def formatReport(problems):
+    """
+    Format problems as a readable report, one line per problem.
+
+    :param list[Problem] problems: problems to report
+
+    :returns: report
+    :rtype: str
+    """
+    return "\n".join(
+        "Level " + problem.level + ("" if problem.angle is None else " angle " + problem.angle) + ": [" +
+        problem.kind + "] " + problem.message
+        for problem in problems
+    )
+
+
+def _add(interval, delta):
+    """
+    Add two intervals.
+
+    :param tuple interval: (low, high)
+    :param tuple delta: (low, high)
+
+    :returns: (low, high)
+    :rtype: tuple
+    """
+    return interval[0] + delta[0], interval[1] + delta[1]
+
+
+def _hull(intervals):
+    """
+    Get the smallest interval containing many intervals.
+
+    :param iterable intervals: (low, high) of every interval, at least one
+
+    :returns: (low, high)
+    :rtype: tuple
+    """
+    intervals = list(intervals)
+    return min(low for low, _ in intervals), max(high for _, high in intervals)
+
+
+def _show(value):
+    """
+    Format an interval bound.
+
+    :param int|float value: bound, possibly infinite
+
+    :returns: text of the bound
+    :rtype: str
+    """
+    if value in (INFINITY, -INFINITY):
+        return "unlimited" if value > 0 else "-unlimited"
+    return str(value)
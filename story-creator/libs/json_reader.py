@@ -1,11 +1,60 @@
 """
 Utility to facilitate loading from and saving to JSON files.
+
+Storage is pluggable: once a backend is set with useBackend (e.g. libs/sqlstore.py's SQLiteBackend), every
+function marked @pluggable is served by the backend's method of the same name instead of the files in data/.
 """
 import os
+import re
 import sys
-from glob import glob
+import hashlib
+import mmap
+import tempfile
+from functools import wraps
+from glob import glob, escape as glob_escape
+from copy import deepcopy
+from shutil import copymode, rmtree
 import json
 
+from libs import catalog, linkpack, nameindex
+
+BACKEND = None
+MANIFEST_VERSION = 1
+
+# {path: (content hash, mtime, size)} of every file as it was last read or written by this process.
+_DIGESTS = {}
+# {arcana: manifest} of every link manifest read or written by this process.
+_MANIFESTS = {}
+
+
+def useBackend(backend):
+    """
+    Set the storage backend serving every pluggable function of this module.
+    The backend must implement a method of the same name and signature for each of them.
+
+    :param object backend: storage backend to use, None to go back to the files in data/
+    """
+    global BACKEND  # pylint: disable=global-statement
+    BACKEND = backend
+
+
+def pluggable(func):
+    """
+    Decorator making a storage function defer to the current backend, if there is one.
+    The file-based implementation stays reachable as func.__wrapped__.
+
+    :param function func: file-based implementation
+
+    :returns: dispatching function
+    :rtype: function
+    """
+    @wraps(func)
+    def dispatch(*args, **kwargs):
+        if BACKEND is not None:
+            return getattr(BACKEND, func.__name__)(*args, **kwargs)
+        return func(*args, **kwargs)
+    return dispatch
+
 
 def buildPath(filename):
     """
@@ -23,34 +72,916 @@ def buildPath(filename):
     return os.path.abspath(os.path.join(os.path.dirname(__file__), "../", filename))
 
 
-def writeLink(link):
+def contentHash(doc):
+    """
+    Hash the content of a JSON-compatible document, regardless of key order.
+
+    :param dict doc: document to hash
+
+    :returns: hex digest
+    :rtype: str
+    """
+    return hashlib.sha1(json.dumps(doc, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _stamp(path, data):
+    """
+    Remember the content of a file as it currently is on disk.
+
+    :param str path: absolute path to the file
+    :param bytes data: full content of the file
+    """
+    stat = os.stat(path)
+    _DIGESTS[path] = (hashlib.sha1(data).hexdigest(), stat.st_mtime_ns, stat.st_size)
+
+
+def _readFile(path):
+    """
+    Read a whole file, remembering its content hash so that writing it back unchanged is skipped.
+
+    :param str path: absolute path to the file
+
+    :returns: content of the file
+    :rtype: bytes
+    """
+    with open(path, 'rb') as infile:
+        data = infile.read()
+    _stamp(path, data)
+    return data
+
+
+def _writeFile(path, data):
+    """
+    Write a whole file, unless it already holds exactly this content.
+    The content goes to a temporary file in the same directory first, which then replaces the file in a
+    single rename, so the file is never seen (or left) half-written.
+
+    :param str path: absolute path to the file
+    :param bytes data: full content of the file
+
+    :returns: whether the file was written
+    :rtype: bool
+    """
+    try:
+        stat = os.stat(path)
+        if _DIGESTS.get(path) == (hashlib.sha1(data).hexdigest(), stat.st_mtime_ns, stat.st_size):
+            return False
+    except FileNotFoundError:
+        stat = None
+    handle, tmpPath = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.' + os.path.basename(path),
+                                       suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'wb') as outfile:
+            outfile.write(data)
+            outfile.flush()
+            os.fsync(outfile.fileno())
+        if stat is not None:
+            copymode(path, tmpPath)
+        else:
+            os.chmod(tmpPath, 0o644)
+        os.replace(tmpPath, path)
+    except BaseException:
+        if os.path.exists(tmpPath):
+            os.remove(tmpPath)
+        raise
+    _stamp(path, data)
+    return True
+
+
+def _jsonBytes(doc, **kwargs):
+    """
+    Serialize a document the way json.dump writes it to file.
+
+    :param dict doc: document to serialize
+    :param kwargs: json.dumps formatting arguments
+
+    :returns: serialized document
+    :rtype: bytes
+    """
+    return json.dumps(doc, **kwargs).encode('utf-8')
+
+
+def linkPath(arcana):
+    """
+    Build the path to the file a social link is saved in.
+
+    :param str arcana: arcana of the social link
+
+    :returns: absolute path to the link file
+    :rtype: str
+    """
+    return buildPath('data/' + arcana + '_link.json')
+
+
+def shardPath(arcana, cid=None):
+    """
+    Build the path to one of the files of a sharded social link.
+    Sharded links are saved as one file per cutscene, data/{arcana}/{level}_{angle}.json, plus the link-level
+    information in data/{arcana}/link.json.
+
+    :param str arcana: arcana of the social link
+    :param str cid: level_angle of the cutscene. Defaults to the link-level information file
+
+    :returns: absolute path to the shard
+    :rtype: str
+    """
+    return buildPath('data/%s/%s.json' % (arcana, cid or 'link'))
+
+
+def linkToDict(link, unread=True):
+    """
+    Dump a social link as the document saved to file.
+    See SocialLink doc in libs/sls.py for format.
+
+    :param SocialLink link: social link to dump
+    :param bool unread: include the cutscenes that were never read from storage (they are read then).
+                        Defaults to True
+
+    :returns: link document
+    :rtype: dict
+    """
+    return {
+        "arcana": link.arcana,
+        "cutinfo": link.cutinfo,
+        "cutscenes": link.cutscenes.toDict(unread),
+        "finalpersona": link.finalpersona,
+        "info": link.info,
+        "pseudoname": link.pseudoname,
+        "requiredPoints": link.requiredPoints,
+    }
+
+
+@pluggable
+def isPackedLink(arcana):
+    """
+    Check whether a social link is saved in the packed binary format (see libs/linkpack.py) rather than JSON.
+
+    :param str arcana: arcana of the social link
+
+    :returns: whether the link file is packed. False if the link file doesn't exist
+    :rtype: bool
+    """
+    try:
+        with open(linkPath(arcana), 'rb') as linkfile:
+            return linkpack.isPacked(linkfile.read(len(linkpack.MAGIC)))
+    except FileNotFoundError:
+        return False
+
+
+@pluggable
+def isShardedLink(arcana):
+    """
+    Check whether a social link is saved as one file per cutscene.
+
+    :param str arcana: arcana of the social link
+
+    :returns: whether the link is sharded
+    :rtype: bool
+    """
+    return os.path.isfile(shardPath(arcana))
+
+
+@pluggable
+def listLinks():
+    """
+    List every arcana that has a saved social link, whatever its layout.
+
+    :returns: arcanas with a social link
+    :rtype: list[str]
+    """
+    arcanas = {os.path.basename(path)[:-len('_link.json')] for path in glob(buildPath('data/*_link.json'))}
+    arcanas.update(os.path.basename(os.path.dirname(path)) for path in glob(buildPath('data/*/link.json')))
+    return sorted(arcanas)
+
+
+@pluggable
+def linkFiles(arcana):
+    """
+    List every file a social link is saved in.
+
+    :param str arcana: arcana of the social link
+
+    :returns: absolute paths of the link's files
+    :rtype: list[str]
+    """
+    if isShardedLink(arcana):
+        return sorted(glob(os.path.join(glob_escape(os.path.dirname(shardPath(arcana))), '*.json')))
+    return [linkPath(arcana)] if os.path.exists(linkPath(arcana)) else []
+
+
+@pluggable
+def writeLink(link, packed=None, sharded=None):
     """
     Write a social link to a file on disk.
-    Saves to data/{link_name}/{arcana}_link.json
+    Saves to data/{arcana}_link.json, or to data/{arcana}/ if the link is sharded, in which case only the
+    cutscenes loaded in the link are written. Cutscenes that are not loaded in a partially loaded link are
+    kept as they are on disk.
+    Since the whole link is written, any pending journal for it is discarded.
 
     :param SocialLink link: social link to write.
+    :param bool packed: write the link in the packed binary format instead of JSON. Defaults to whatever
+                        format the link is currently saved in, JSON for new links. Shards are always JSON
+    :param bool sharded: write the link as one file per cutscene. Defaults to the link's current layout
     """
-    with open(buildPath('data/' + link.arcana + '_link.json'), 'w') as outfile:
-        json.dump(link, outfile, default=lambda o: o.__dict__, sort_keys=True, indent=4)
-    outfile.close()
+    wasSharded = isShardedLink(link.arcana)
+    if sharded is None:
+        sharded = wasSharded
+    # Cutscenes that were never read are unchanged, sharded links don't need them to be rewritten.
+    doc = linkToDict(link, unread=not (sharded and wasSharded))
+    if link.partial and not (sharded and wasSharded):
+        fullLink = readLink(link.arcana)
+        fullLink.setdefault("cutscenes", {}).update(doc["cutscenes"])
+        doc["cutscenes"] = fullLink["cutscenes"]
+    if sharded:
+        # Other cutscenes may have pending edits that are not loaded in this link.
+        compactLink(link.arcana)
+        _writeShards(link.arcana, doc)
+        if os.path.exists(linkPath(link.arcana)):
+            os.remove(linkPath(link.arcana))
+    else:
+        _writeLinkDict(link.arcana, doc, packed)
+        if wasSharded:
+            rmtree(os.path.dirname(shardPath(link.arcana)))
+            # The manifest was stamped with the shard directory, restamp it with the link file.
+            _saveManifest(link.arcana, _MANIFESTS[link.arcana])
+    clearJournal(link.arcana)
+
 
+def _writeLinkDict(arcana, doc, packed=None):
+    """
+    Write a link document to a single file on disk, along with its manifest.
+
+    :param str arcana: arcana of the social link
+    :param dict doc: link document
+    :param bool packed: see writeLink
+    """
+    if packed is None:
+        packed = isPackedLink(arcana)
+    offsets = {}
+    if packed:
+        _writeFile(linkPath(arcana), linkpack.dumps(doc))
+    else:
+        text, offsets = _dumpLinkJSON(doc)
+        _writeFile(linkPath(arcana), text.encode('utf-8'))
+    _saveManifest(arcana, _makeManifest(doc, offsets))
+
+
+def _dumpLinkJSON(doc):
+    """
+    Serialize a link document exactly like json.dump(doc, sort_keys=True, indent=4), keeping track of where
+    each cutscene lies in the output.
+    The output is pure ASCII, so character offsets are byte offsets.
+
+    :param dict doc: link document
+
+    :returns: serialized document, {level_angle: (offset, length)} of each cutscene in it
+    :rtype: tuple(str, dict)
+    """
+    parts = []
+    offsets = {}
+    pos = 0
+    for index, key in enumerate(sorted(doc)):
+        parts.append((',' if index else '{') + '\n    ' + json.dumps(key) + ': ')
+        if key != "cutscenes" or not doc[key]:
+            parts.append(_indented(doc[key], 1))
+            pos += len(parts[-2]) + len(parts[-1])
+            continue
+        pos += len(parts[-1])
+        for cindex, cid in enumerate(sorted(doc[key])):
+            parts.append((',' if cindex else '{') + '\n        ' + json.dumps(cid) + ': ')
+            parts.append(_indented(doc[key][cid], 2))
+            offsets[cid] = (pos + len(parts[-2]), len(parts[-1]))
+            pos += len(parts[-2]) + len(parts[-1])
+        parts.append('\n    }')
+        pos += len(parts[-1])
+    parts.append('\n}' if doc else '{}')
+    return ''.join(parts), offsets
+
+
+def _indented(value, depth):
+    """
+    Serialize a value the way json.dump(sort_keys=True, indent=4) writes it when nested at a given depth.
+
+    :param object value: JSON-compatible value
+    :param int depth: nesting depth of the value
+
+    :returns: serialized value
+    :rtype: str
+    """
+    return json.dumps(value, sort_keys=True, indent=4).replace('\n', '\n' + '    '*depth)
+
+
+def _writeShards(arcana, doc):
+    """
+    Write a link document as link-level information plus one file per cutscene it contains, then update the
+    link's manifest.
 
+    :param str arcana: arcana of the social link
+    :param dict doc: link document
+    """
+    manifest = _fileManifest(arcana) if isShardedLink(arcana) else _makeManifest({})
+    os.makedirs(os.path.dirname(shardPath(arcana)), exist_ok=True)
+    meta = {key: value for key, value in doc.items() if key != "cutscenes"}
+    _writeFile(shardPath(arcana), _jsonBytes(meta, sort_keys=True, indent=4))
+    for cid, graph in doc["cutscenes"].items():
+        _writeShard(arcana, cid, graph)
+    manifest["meta"] = meta
+    manifest["cutscenes"].update((cid, _manifestEntry(graph)) for cid, graph in doc["cutscenes"].items())
+    _saveManifest(arcana, manifest)
+
+
+def _writeShard(arcana, cid, graph):
+    """
+    Write a single cutscene of a sharded link.
+    The link's manifest is left to the caller to update.
+
+    :param str arcana: arcana of the social link
+    :param str cid: level_angle of the cutscene
+    :param dict graph: cutscene, as dumped by MathGraph.toDict
+    """
+    _writeFile(shardPath(arcana, cid), _jsonBytes(graph, sort_keys=True, indent=4))
+
+
+def _readShard(arcana, cid=None):
+    """
+    Read a single file of a sharded link.
+
+    :param str arcana: arcana of the social link
+    :param str cid: level_angle of the cutscene. Defaults to the link-level information
+
+    :returns: content of the shard, or None if it doesn't exist
+    :rtype: dict|None
+    """
+    try:
+        return json.loads(_readFile(shardPath(arcana, cid)).decode('utf-8'))
+    except FileNotFoundError:
+        return None
+
+
+@pluggable
 def readLink(arcana):
     """
     Loads a social link from a file on disk.
+    Both JSON and packed link files are supported, the format is detected from the file's content, as are
+    sharded links.
+    Cutscenes are read one at a time (see iterLink), so the raw file is never held in memory along with the
+    loaded document.
+    Edits recorded in the link's journal are replayed on top of the file.
 
     :param str arcana: arcana who's social link to load
 
     :return: social link json data
     :rtype: list
     """
+    doc = deepcopy(_fileManifest(arcana)["meta"])
+    if not doc and not _readJournal(arcana):
+        return doc
+    doc.setdefault("arcana", arcana)
+    doc["cutscenes"] = dict(iterLink(arcana))
+    return doc
+
+
+@pluggable
+def iterLink(arcana):
+    """
+    Load the cutscenes of a social link one at a time, with the edits recorded in the link's journal.
+    JSON link files are memory-mapped and only the bytes of the cutscene being loaded are decoded, so that
+    whatever is built out of a cutscene can be built before the next one is decoded.
+
+    :param str arcana: arcana of the social link
+
+    :returns: generator of (level_angle, {"id", "items"})
+    :rtype: generator
+    """
+    pending = {}
+    for record in _readJournal(arcana):
+        pending.setdefault(record["cutscene"], []).append(record)
+    for cid, graph in _iterLinkFile(arcana):
+        cutscenes = {cid: graph}
+        _applyJournal(arcana, cutscenes, pending.pop(cid, []))
+        yield cid, cutscenes[cid]
+    for cid, records in pending.items():
+        cutscenes = {}
+        _applyJournal(arcana, cutscenes, records)
+        yield cid, cutscenes[cid]
+
+
+def _iterLinkFile(arcana, only=None):
+    """
+    Load the cutscenes of a social link as saved on disk one at a time, ignoring the journal.
+    The link file is gone through once whatever the number of cutscenes loaded.
+
+    :param str arcana: arcana of the social link
+    :param set[str] only: level_angle of the only cutscenes to load. Defaults to every cutscene
+
+    :returns: generator of (level_angle, {"id", "items"})
+    :rtype: generator
+    """
+    if isShardedLink(arcana):
+        if only is None:
+            cids = [os.path.basename(path)[:-len('.json')] for path in linkFiles(arcana)]
+        else:
+            cids = sorted(only)
+        for cid in cids:
+            graph = _readShard(arcana, cid) if cid != 'link' else None
+            if graph is not None:
+                yield cid, graph
+        return
+    entries = _fileManifest(arcana)["cutscenes"]
+    if only is not None:
+        entries = {cid: entry for cid, entry in entries.items() if cid in only}
+    if not entries:
+        return
+    with open(linkPath(arcana), 'rb') as linkfile, \
+         mmap.mmap(linkfile.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        if linkpack.isPacked(buf[:len(linkpack.MAGIC)]):
+            yield from linkpack.loads(buf[:], None if only is None else set(entries))["cutscenes"].items()
+            return
+        if all(entry["offset"] is not None for entry in entries.values()):
+            spans = ((cid, entry["offset"], entry["offset"] + entry["length"])
+                     for cid, entry in entries.items())
+        else:
+            spans = (span for span in _scanCutscenes(buf) if span[0] in entries)
+        for cid, start, end in spans:
+            yield cid, json.loads(buf[start:end])
+
+
+_TOKENS = re.compile(rb'"(?:[^"\\]|\\.)*"|[{}\[\]]')
+_COLON = re.compile(rb'\s*:\s*')
+
+
+def _scanCutscenes(buf):
+    """
+    Locate every cutscene in a JSON link file without decoding anything, to build the manifest of a link or
+    for files the manifest has no offsets for.
+
+    :param bytes buf: content of the link file, or a memory map of it
+
+    :returns: generator of (level_angle, start offset, end offset)
+    :rtype: generator
+    """
+    depth = 0
+    pos = 0
+    inside = False
+    while True:
+        match = _TOKENS.search(buf, pos)
+        if match is None:
+            return
+        token, pos = match.group(), match.end()
+        if token in (b'{', b'['):
+            depth += 1
+        elif token in (b'}', b']'):
+            depth -= 1
+            if inside and depth < 2:
+                return
+        else:
+            colon = _COLON.match(buf, pos)
+            if colon is None:
+                continue
+            if depth == 1 and token == b'"cutscenes"':
+                inside = True
+            elif inside and depth == 2:
+                end = _valueEnd(buf, colon.end())
+                yield json.loads(token), colon.end(), end
+                pos = end
+
+
+def _valueEnd(buf, pos):
+    """
+    Find the end of the JSON object or array starting at an offset.
+
+    :param bytes buf: JSON content
+    :param int pos: offset of the opening bracket
+
+    :raises ValueError: if the value is not terminated
+
+    :returns: offset right after the closing bracket
+    :rtype: int
+    """
+    depth = 0
+    for match in _TOKENS.finditer(buf, pos):
+        token = match.group()
+        if token in (b'{', b'['):
+            depth += 1
+        elif token in (b'}', b']'):
+            depth -= 1
+            if not depth:
+                return match.end()
+    raise ValueError("Unterminated JSON value at %s" % pos)
+
+
+@pluggable
+def readLinkMeta(arcana):
+    """
+    Load the link-level information of a social link, without its cutscenes.
+    Served from the link's manifest, no cutscene is read.
+
+    :param str arcana: arcana of the social link
+
+    :returns: link document without the "cutscenes" key, empty if there is no link
+    :rtype: dict
+    """
+    return readManifest(arcana)["meta"]
+
+
+@pluggable
+def listCutscenes(arcana):
+    """
+    List the level_angle keys of every cutscene of a social link.
+    Served from the link's manifest, no cutscene is read.
+
+    :param str arcana: arcana of the social link
+
+    :returns: level_angle of every cutscene
+    :rtype: list[str]
+    """
+    return list(readManifest(arcana)["cutscenes"])
+
+
+@pluggable
+def readCutscene(arcana, cid):
+    """
+    Load a single cutscene of a social link.
+    For sharded links, only that cutscene's file is read. For JSON links, only that cutscene's bytes are
+    decoded from the link file.
+
+    :param str arcana: arcana of the social link
+    :param str cid: level_angle of the cutscene
+
+    :returns: cutscene as a {"id", "items"} dict, or None if it doesn't exist
+    :rtype: dict|None
+    """
+    return readCutscenes(arcana, [cid]).get(cid)
+
+
+@pluggable
+def readCutscenes(arcana, cids):
+    """
+    Load some cutscenes of a social link at once, going through the link file only once rather than once
+    per cutscene.
+
+    :param str arcana: arcana of the social link
+    :param list[str] cids: level_angle of the cutscenes
+
+    :returns: {level_angle: {"id", "items"}} of those cutscenes that exist
+    :rtype: dict
+    """
+    only = set(cids)
+    cutscenes = dict(_iterLinkFile(arcana, only))
+    records = [record for record in _readJournal(arcana) if record["cutscene"] in only]
+    _applyJournal(arcana, cutscenes, records)
+    return cutscenes
+
+
+@pluggable
+def deleteCutscene(arcana, cid):
+    """
+    Completely delete a single cutscene of a social link.
+
+    :param str arcana: arcana of the social link
+    :param str cid: level_angle of the cutscene
+    """
+    compactLink(arcana)
+    if isShardedLink(arcana):
+        manifest = _fileManifest(arcana)
+        if os.path.exists(shardPath(arcana, cid)):
+            os.remove(shardPath(arcana, cid))
+        manifest["cutscenes"].pop(cid, None)
+        _saveManifest(arcana, manifest)
+        return
+    doc = readLink(arcana)
+    if cid in doc.get("cutscenes", {}):
+        doc["cutscenes"].pop(cid)
+        _writeLinkDict(arcana, doc)
+
+
+def manifestPath(arcana):
+    """
+    Build the path to the manifest of a social link.
+
+    :param str arcana: arcana of the social link
+
+    :returns: absolute path to the manifest
+    :rtype: str
+    """
+    return buildPath('data/' + arcana + '_link.manifest')
+
+
+@pluggable
+def readManifest(arcana):
+    """
+    Read the manifest of a social link: everything about the link that doesn't require reading its nodes.
+    The manifest is kept next to the link file and rewritten along with it. If it is missing or out of date
+    (the link was changed by something else), it is rebuilt from the link once.
+    Cutscenes with pending journal edits are re-read so that the manifest always matches readLink.
+
+    {
+        "meta": {link document without the "cutscenes" key},
+        "cutscenes": {
+            level_angle: {
+                "id": graph id,
+                "nodes": number of nodes,
+                "edges": number of relations,
+                "hash": content hash (see contentHash),
+                "offset": byte offset of the cutscene in a JSON link file, None if not applicable,
+                "length": byte length of the cutscene in a JSON link file, None if not applicable
+            }
+        }
+    }
+
+    :param str arcana: arcana of the social link
+
+    :returns: link manifest, with empty "meta" and "cutscenes" if there is no link
+    :rtype: dict
+    """
+    manifest = deepcopy(_fileManifest(arcana))
+    records = _readJournal(arcana)
+    if not records:
+        return manifest
+    if not manifest["meta"]:
+        manifest["meta"] = {"arcana": arcana}
+    for cid in {record["cutscene"] for record in records}:
+        manifest["cutscenes"][cid] = _manifestEntry(readCutscene(arcana, cid))
+    return manifest
+
+
+def _linkStamp(arcana):
+    """
+    Identify the current state of a social link's files, to check whether its manifest is up to date.
+
+    :param str arcana: arcana of the social link
+
+    :returns: [mtime, size] of the link file or shard directory, None if there is no link
+    :rtype: list|None
+    """
+    path = os.path.dirname(shardPath(arcana)) if isShardedLink(arcana) else linkPath(arcana)
     try:
-        with open(buildPath('data/' + arcana + '_link.json')) as json_data:
-            array = json.load(json_data)
-        json_data.close()
-        return array
+        stat = os.stat(path)
     except FileNotFoundError:
-        return {}
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _fileManifest(arcana):
+    """
+    Get the manifest of the link as saved on disk, ignoring the journal, (re)building it if needed.
+
+    :param str arcana: arcana of the social link
+
+    :returns: link manifest (see readManifest), not to be modified
+    :rtype: dict
+    """
+    stamp = _linkStamp(arcana)
+    if stamp is None:
+        return _makeManifest({})
+    manifest = _MANIFESTS.get(arcana)
+    if manifest is None or manifest["source"] != stamp:
+        try:
+            manifest = json.loads(_readFile(manifestPath(arcana)).decode('utf-8'))
+        except (FileNotFoundError, ValueError):
+            manifest = None
+    if manifest is None or manifest.get("version") != MANIFEST_VERSION or manifest.get("source") != stamp:
+        manifest = _saveManifest(arcana, _buildManifest(arcana))
+    _MANIFESTS[arcana] = manifest
+    return dict(manifest, cutscenes=dict(manifest["cutscenes"]))
+
+
+def _buildManifest(arcana):
+    """
+    Build the manifest of a link by reading it entirely, one cutscene at a time.
+    JSON link files are memory-mapped and every cutscene located in them (see _scanCutscenes), so that only
+    one cutscene is decoded at a time and its offsets are known whoever wrote the file.
+
+    :param str arcana: arcana of the social link
+
+    :returns: link manifest (see readManifest)
+    :rtype: dict
+    """
+    if isShardedLink(arcana):
+        manifest = _makeManifest(_readShard(arcana))
+        for path in linkFiles(arcana):
+            cid = os.path.basename(path)[:-len('.json')]
+            if cid != 'link':
+                manifest["cutscenes"][cid] = _manifestEntry(_readShard(arcana, cid))
+        return manifest
+    try:
+        linkfile = open(linkPath(arcana), 'rb')
+    except FileNotFoundError:
+        return _makeManifest({})
+    with linkfile, mmap.mmap(linkfile.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        _stamp(linkPath(arcana), buf)
+        if linkpack.isPacked(buf[:len(linkpack.MAGIC)]):
+            return _makeManifest(linkpack.loads(buf[:]))
+        entries = {}
+        # Everything but the cutscenes, each cutscene being left out as null.
+        pieces = []
+        pos = 0
+        for cid, start, end in _scanCutscenes(buf):
+            entries[cid] = _manifestEntry(json.loads(buf[start:end]), start, end - start)
+            pieces.append(buf[pos:start])
+            pos = end
+        pieces.append(buf[pos:])
+    doc = json.loads(b'null'.join(pieces))
+    doc.pop("cutscenes", None)
+    manifest = _makeManifest(doc)
+    manifest["cutscenes"] = entries
+    return manifest
+
+
+def _makeManifest(doc, offsets=None):
+    """
+    Build the manifest of a link document.
+
+    :param dict doc: link document
+    :param dict offsets: {level_angle: (offset, length)} of cutscenes in the link file, if known
+
+    :returns: link manifest (see readManifest)
+    :rtype: dict
+    """
+    offsets = offsets or {}
+    return {
+        "version": MANIFEST_VERSION,
+        "source": None,
+        "meta": {key: value for key, value in doc.items() if key != "cutscenes"},
+        "cutscenes": {cid: _manifestEntry(graph, *offsets.get(cid, (None, None)))
+                      for cid, graph in doc.get("cutscenes", {}).items()}
+    }
+
+
+def _manifestEntry(graph, offset=None, length=None):
+    """
+    Build the manifest entry of a single cutscene.
+
+    :param dict graph: cutscene, as dumped by MathGraph.toDict
+    :param int offset: byte offset of the cutscene in the link file, if known
+    :param int length: byte length of the cutscene in the link file, if known
+
+    :returns: manifest entry (see readManifest)
+    :rtype: dict
+    """
+    return {
+        "id": graph["id"],
+        "nodes": len(graph["items"]),
+        "edges": sum(len(row) - 1 for row in graph["items"] if row),
+        "hash": contentHash(graph),
+        "offset": offset,
+        "length": length
+    }
+
+
+def _saveManifest(arcana, manifest):
+    """
+    Stamp a manifest with the current state of the link's files and save it next to them.
+
+    :param str arcana: arcana of the social link
+    :param dict manifest: link manifest
+
+    :returns: the saved manifest
+    :rtype: dict
+    """
+    manifest["source"] = _linkStamp(arcana)
+    if manifest["source"] is None:
+        _MANIFESTS.pop(arcana, None)
+        if os.path.exists(manifestPath(arcana)):
+            os.remove(manifestPath(arcana))
+        return manifest
+    _writeFile(manifestPath(arcana), _jsonBytes(manifest, sort_keys=True))
+    _MANIFESTS[arcana] = manifest
+    return manifest
+
+
+def journalPath(arcana):
+    """
+    Build the path to the edit journal of a social link.
+
+    :param str arcana: arcana of the social link
+
+    :returns: absolute path to the journal
+    :rtype: str
+    """
+    return buildPath('data/' + arcana + '_link.journal')
+
+
+@pluggable
+def appendJournal(arcana, record):
+    """
+    Record a single edit to a social link without rewriting the link file.
+    The journal is a JSON record per line, either:
+        {"cutscene": level_angle, "node": index, "row": [action, relations...]}
+    to (over)write a whole node,
+        {"cutscene": level_angle, "relation": [i, j]}
+    to add a relation from node i to node j, or
+        {"cutscene": level_angle, "graph": {"id": id, "items": [...]}}
+    to (over)write a whole cutscene.
+
+    :param str arcana: arcana of the social link
+    :param dict record: edit to record
+    """
+    with open(journalPath(arcana), 'a') as journal:
+        journal.write(json.dumps(record, sort_keys=True) + "\n")
+        journal.flush()
+        os.fsync(journal.fileno())
+
+
+@pluggable
+def clearJournal(arcana):
+    """
+    Discard the journal of a social link.
+
+    :param str arcana: arcana of the social link
+    """
+    try:
+        os.remove(journalPath(arcana))
+    except FileNotFoundError:
+        pass
+
+
+def _readJournal(arcana):
+    """
+    Read the edits recorded in a social link's journal.
+    A partially written last line (if the application died mid-write) is ignored.
+
+    :param str arcana: arcana of the social link
+
+    :returns: journal records, in order
+    :rtype: list[dict]
+    """
+    try:
+        with open(journalPath(arcana)) as journal:
+            lines = journal.readlines()
+    except FileNotFoundError:
+        return []
+    records = []
+    for line in lines:
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            print("Skipping corrupted journal record: " + line)
+    return records
+
+
+def _applyJournal(arcana, cutscenes, records):
+    """
+    Apply journal records to a set of cutscenes.
+
+    :param str arcana: arcana of the social link
+    :param dict cutscenes: {level_angle: {"id", "items"}} to update in place
+    :param list[dict] records: journal records
+    """
+    for record in records:
+        if "graph" in record:
+            cutscenes[record["cutscene"]] = record["graph"]
+            continue
+        graph = cutscenes.setdefault(
+            record["cutscene"], {"id": arcana + record["cutscene"], "items": []}
+        )
+        items = graph["items"]
+        if "node" in record:
+            items.extend([] for _ in range(record["node"] + 1 - len(items)))
+            items[record["node"]] = record["row"]
+        elif "relation" in record:
+            i, j = record["relation"]
+            if i < len(items) and items[i] and j not in items[i][1:]:
+                items[i].append(j)
+
+
+@pluggable
+def compactLink(arcana):
+    """
+    Fold a social link's journal back into its link file, keeping the file's format.
+    For sharded links, only the cutscenes with pending edits are rewritten.
+
+    :param str arcana: arcana of the social link
+    """
+    records = _readJournal(arcana)
+    if not records:
+        clearJournal(arcana)
+        return
+    if isShardedLink(arcana):
+        cutscenes = {}
+        for cid in {record["cutscene"] for record in records}:
+            graph = _readShard(arcana, cid)
+            if graph is not None:
+                cutscenes[cid] = graph
+        manifest = _fileManifest(arcana)
+        _applyJournal(arcana, cutscenes, records)
+        for cid, graph in cutscenes.items():
+            _writeShard(arcana, cid, graph)
+            manifest["cutscenes"][cid] = _manifestEntry(graph)
+        _saveManifest(arcana, manifest)
+    else:
+        _writeLinkDict(arcana, readLink(arcana))
+    clearJournal(arcana)
+    print("Compacted " + arcana + " link journal")
+
+
+@pluggable
+def compactAll():
+    """
+    Fold every pending social link journal back into its link file.
+    """
+    for journal in glob(buildPath('data/*_link.journal')):
+        compactLink(os.path.basename(journal)[:-len('_link.journal')])
 
 
 def readArcDesc(arcana):
@@ -62,26 +993,26 @@ def readArcDesc(arcana):
     :returns: arcana description
     :rtype: str
     """
-    with open(buildPath('int/' + 'arcanaDescription.json')) as json_data:
-        array = json.load(json_data)
-    json_data.close()
-    return array[arcana]
+    return catalog.arcanaDescription(arcana)
 
 
+@pluggable
 def writeOne(entity, creatureType):
     """
     Writes a single entity to disk.
     (Generally used for Personas and Characters)
     data/{type}/{name}.json
+    Nothing is written if the file already holds exactly this entity.
 
     :param Creature entity: entity to write
     :param str creatureType: type of creature, for filepath purposes
     """
-    with open(buildPath('data/%s/%s.json' % (creatureType, entity.getName())), 'w') as outfile:
-        json.dump(entity.__dict__, outfile, indent=4)
-    outfile.close()
+    if _writeFile(buildPath('data/%s/%s.json' % (creatureType, entity.getName())),
+                  _jsonBytes(entity.__dict__, indent=4)):
+        _nameIndex(creatureType).update(entity.getName(), entity.__dict__)
 
 
+@pluggable
 def readOne(name, creatureType):
     """
     Reads a single entity from disk.
@@ -92,12 +1023,22 @@ def readOne(name, creatureType):
     :returns: json load of the creature
     :rtype: dict
     """
-    with open(buildPath('data/%s/%s.json' % (creatureType, name))) as json_data:
-        entity = json.load(json_data)
-    json_data.close()
-    return entity
+    return json.loads(_readFile(buildPath('data/%s/%s.json' % (creatureType, name))).decode('utf-8'))
 
 
+def _nameIndex(creatureType):
+    """
+    Get the name index of a type of creature (see libs/nameindex.py).
+
+    :param str creatureType: type of creature, pers or chars
+
+    :returns: the type's name index
+    :rtype: NameIndex
+    """
+    return nameindex.PERSONAS if creatureType == 'pers' else nameindex.CHARACTERS
+
+
+@pluggable
 def readPerNames():
     """
     Read the caching file containing the names of all saved Personas.
@@ -105,10 +1046,21 @@ def readPerNames():
     :returns: names of all saved Personas
     :rtype: list[str]
     """
-    chars = glob(buildPath('data/pers/*.json'))
-    return [os.path.basename(charname.split('.')[0]) for charname in chars]
+    return nameindex.PERSONAS.names()
+
 
+@pluggable
+def readPerIndex():
+    """
+    Read the key fields of all saved Personas without loading them.
 
+    :returns: {name: {'arcana': arcana, 'level': level}} of all saved Personas
+    :rtype: dict
+    """
+    return {name: dict(fields) for name, fields in nameindex.PERSONAS.get().items()}
+
+
+@pluggable
 def deleteChar(name):
     """
     Delete the file of a single character.
@@ -116,8 +1068,10 @@ def deleteChar(name):
     :param str name: name of character to delete
     """
     os.remove(buildPath('data/chars/' + name + '.json'))
+    nameindex.CHARACTERS.remove(name)
 
 
+@pluggable
 def deletePer(name):
     """
     Delete the file of a single Persona.
@@ -125,8 +1079,10 @@ def deletePer(name):
     :param str name: name of Persona to delete
     """
     os.remove(buildPath('data/pers/' + name + '.json'))
+    nameindex.PERSONAS.remove(name)
 
 
+@pluggable
 def readCharNames():
     """
     Read the caching file containing the names of all saved characters.
@@ -134,21 +1090,28 @@ def readCharNames():
     :returns: names of all saved characters
     :rtype: list[str]
     """
-    chars = glob(buildPath('data/chars/*.json'))
-    return [os.path.basename(charname.split('.')[0]) for charname in chars]
+    return nameindex.CHARACTERS.names()
+
+
+@pluggable
+def readCharIndex():
+    """
+    Read the key fields of all saved characters without loading them.
+
+    :returns: {name: {'important': important}} of all saved characters
+    :rtype: dict
+    """
+    return {name: dict(fields) for name, fields in nameindex.CHARACTERS.get().items()}
 
 
 def data_list(fetch):
     """
     Fetch one of our data lists that are saved in the general data file.
+    Served from the in-memory catalog (see libs/catalog.py), prefer its typed accessors.
 
     :param str fetch: name of the list to fetch (dict index)
 
     :returns: entry in the general data file at the requested key
     :rtype: list|dict
     """
-    with open(buildPath('int/' + 'data.json')) as json_data:
-        temp = json.load(json_data)
-    json_data.close()
-    data = temp[fetch]
-    return data
+    return catalog.DATA.entry(fetch)
@@ -0,0 +1,175 @@
+"""
+Layered (Sugiyama-style) layout of a cutscene graph, for the graph view.
+
+Every node reachable from the start is laid out in rows (ranks) and columns, in three steps:
+    - rank assignment: relations leading back to a node being walked (loops) are set aside, and every other
+      relation leads at least one row down, each node being placed on the row after its lowest predecessor
+    - crossing reduction: relations spanning many rows are split by placeholder nodes, one per row, then rows
+      are reordered by the average position of each node's neighbours, sweeping down and up a few times
+    - coordinate assignment: nodes are given columns close to the median column of their neighbours,
+      keeping the order of every row
+Layouts are cached until the graph changes.
+"""
+from weakref import WeakKeyDictionary
+
+from libs.logictree import DFS, POSTORDER
+
+SWEEPS = 4
+
+_CACHE = WeakKeyDictionary()
+
+
+def layered(graph):
+    """
+    Get the layout of a graph, computing it if the graph changed since it was last laid out.
+
+    :param MathGraph graph: graph to lay out
+
+    :returns: layout of the graph
+    :rtype: Layout
+    """
+    layout = _CACHE.get(graph)
+    if layout is None or layout.version != graph.version:
+        layout = _CACHE[graph] = Layout(graph)
+    return layout
+
+
+class Layout():
+    """
+    Layered layout of every node reachable from the start of a graph, see module doc.
+    Prefer layered, which caches layouts.
+
+    :param MathGraph graph: graph to lay out
+    :param int sweeps: number of down and up sweeps to reduce crossings. Defaults to SWEEPS
+    """
+    def __init__(self, graph, sweeps=SWEEPS):
+        self.version = graph.version
+        self.rank = {} # Row of every node
+        self.column = {} # Column of every node
+        self.rows = [] # Nodes of every row, left to right
+        self.backEdges = set() # (i, j) of every relation leading back up, closing a loop
+        self.width = 0
+
+        order = graph.traverse(0, DFS)
+        if not order:
+            return
+        finish = {node: position for position, node in enumerate(graph.traverse(0, POSTORDER))}
+        start = {node: position for position, node in enumerate(order)}
+        forward = {}
+        for node in order:
+            forward[node] = []
+            for relation in graph.getRelations(node):
+                if relation not in start:
+                    continue
+                # A relation to a node still being walked when it was found leads back up a loop.
+                if start[relation] <= start[node] and finish[relation] >= finish[node]:
+                    self.backEdges.add((node, relation))
+                else:
+                    forward[node].append(relation)
+
+        rank = dict.fromkeys(order, 0)
+        for node in sorted(order, key=finish.get, reverse=True):
+            for relation in forward[node]:
+                rank[relation] = max(rank[relation], rank[node] + 1)
+
+        real = len(graph.nodes)
+        layers, up, down = self._split(order, forward, rank, real)
+        self._reduceCrossings(layers, up, down, sweeps)
+        column = self._assignColumns(layers, up, down)
+
+        self.rank = rank
+        self.column = {node: column[node] for node in order}
+        self.rows = [[node for node in layer if node < real] for layer in layers]
+        self.width = max(column.values()) + 1
+
+    @staticmethod
+    def _split(order, forward, rank, placeholder):
+        """
+        Place every node on its row, splitting relations that span many rows with placeholder nodes.
+        Placeholders are numbered after the last node of the graph.
+
+        :param list order: nodes in the order they were walked
+        :param dict forward: relations of every node, without those leading back up
+        :param dict rank: row of every node
+        :param int placeholder: number of the first placeholder, the size of the graph
+
+        :returns: layers (nodes and placeholders of every row), up and down (neighbours of every node and
+                  placeholder on the row above/below)
+        :rtype: tuple(list, dict, dict)
+        """
+        layers = [[] for _ in range(max(rank.values()) + 1)]
+        up = {node: [] for node in order}
+        down = {node: [] for node in order}
+        for node in order:
+            layers[rank[node]].append(node)
+        for node in order:
+            for relation in forward[node]:
+                previous = node
+                for row in range(rank[node] + 1, rank[relation]):
+                    layers[row].append(placeholder)
+                    up[placeholder] = [previous]
+                    down[placeholder] = []
+                    down[previous].append(placeholder)
+                    previous = placeholder
+                    placeholder += 1
+                down[previous].append(relation)
+                up[relation].append(previous)
+        return layers, up, down
+
+    @staticmethod
+    def _reduceCrossings(layers, up, down, sweeps):
+        """
+        Reorder rows in place with the barycenter heuristic.
+
+        :param list layers: nodes and placeholders of every row
+        :param dict up: neighbours of every node on the row above
+        :param dict down: neighbours of every node on the row below
+        :param int sweeps: number of down and up sweeps
+        """
+        position = {}
+        for layer in layers:
+            for index, node in enumerate(layer):
+                position[node] = index
+        for _ in range(sweeps):
+            for rows, neighbours in ((range(1, len(layers)), up), (range(len(layers) - 2, -1, -1), down)):
+                for row in rows:
+                    layer = layers[row]
+
+                    def barycenter(node, neighbours=neighbours):
+                        if not neighbours[node]:
+                            return position[node]
+                        return sum(position[other] for other in neighbours[node]) / len(neighbours[node])
+
+                    layer.sort(key=barycenter)
+                    for index, node in enumerate(layer):
+                        position[node] = index
+
+    @staticmethod
+    def _assignColumns(layers, up, down):
+        """
+        Give every node a column close to the median column of its neighbours, keeping the order of every row.
+
+        :param list layers: nodes and placeholders of every row, in order
+        :param dict up: neighbours of every node on the row above
+        :param dict down: neighbours of every node on the row below
+
+        :returns: column of every node and placeholder
+        :rtype: dict
+        """
+        column = {}
+        for layer in layers:
+            for index, node in enumerate(layer):
+                column[node] = index
+        for rows, neighbours in ((range(len(layers)), up), (range(len(layers) - 1, -1, -1), down)):
+            for row in rows:
+                last = None
+                for node in layers[row]:
+                    wanted = column[node]
+                    if neighbours[node]:
+                        columns = sorted(column[other] for other in neighbours[node])
+                        wanted = columns[(len(columns) - 1) // 2]
+                    if last is not None and wanted <= last:
+                        wanted = last + 1
+                    column[node] = last = wanted
+        shift = min(column.values())
+        return {node: value - shift for node, value in column.items()}
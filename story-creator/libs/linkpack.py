@@ -0,0 +1,291 @@
+"""
+Compact binary container format for social link files.
+
+A packed link holds exactly the same document as the JSON version of a link (see SocialLink doc in
+libs/sls.py), but every distinct value (string, number, coordinates...) is stored only once in a shared
+table, every node is stored as a reference to its set of keys plus one reference per value, relations are
+stored as two flat integer arrays (offsets/targets), and the whole body may be zlib-compressed.
+
+Layout (little-endian, every array being unsigned 32 bit ints):
+    header:
+        4 bytes         MAGIC
+        u8              format version
+        u8              flags (FLAG_ZLIB)
+    body (compressed if FLAG_ZLIB is set):
+        u32 + bytes     value table, as a utf-8 JSON list
+        u32             reference to the link metadata (every top-level key except "cutscenes")
+        u32             number of shapes, then each shape as u32 number of keys + key references
+        u32             number of cutscenes, each one being:
+            u32             key reference
+            u32             id reference
+            u32             number of nodes (n)
+            u32             number of value references (v)
+            array * n       node shapes, 0 for an empty node, i for the (i-1)th shape
+            array * v       value references
+            array * n+1     relation offsets
+            array * m       relation targets (m being the last offset)
+"""
+import json
+import struct
+import zlib
+from array import array
+from copy import deepcopy
+
+MAGIC = b"PXSL"
+VERSION = 1
+FLAG_ZLIB = 0x01
+
+_U32 = struct.Struct("<I")
+_SWAP = struct.pack("=I", 1) != _U32.pack(1)
+
+
+def isPacked(head):
+    """
+    Check if the first bytes of a file belong to a packed link.
+
+    :param bytes head: at least the first 4 bytes of a file
+
+    :returns: whether the bytes start with the packed link marker
+    :rtype: bool
+    """
+    return head[:len(MAGIC)] == MAGIC
+
+
+def dumps(doc, compress=True):
+    """
+    Pack a link document into bytes.
+
+    :param dict doc: link document, as it would be written to JSON
+    :param bool compress: whether to zlib-compress the body. Defaults to True
+
+    :returns: packed link
+    :rtype: bytes
+    """
+    table = _Table()
+    shapes = {}
+    body = bytearray()
+
+    body.extend(_U32.pack(table.ref({key: value for key, value in doc.items() if key != "cutscenes"})))
+    cutscenes = doc.get("cutscenes", {})
+    packedCutscenes = bytearray(_U32.pack(len(cutscenes)))
+    for key, graph in cutscenes.items():
+        nodes = array("I")
+        values = array("I")
+        offsets = array("I", [0])
+        targets = array("I")
+        for row in graph["items"]:
+            if row:
+                act = row[0]
+                shape = tuple(table.ref(str(field)) for field in act)
+                nodes.append(shapes.setdefault(shape, len(shapes) + 1))
+                values.extend(table.ref(value) for value in act.values())
+                targets.extend(int(relation) for relation in row[1:])
+            else:
+                nodes.append(0)
+            offsets.append(len(targets))
+        packedCutscenes.extend(struct.pack(
+            "<IIII", table.ref(key), table.ref(graph["id"]), len(nodes), len(values)
+        ))
+        for packedArray in (nodes, values, offsets, targets):
+            packedCutscenes.extend(_tobytes(packedArray))
+
+    body.extend(_U32.pack(len(shapes)))
+    for shape in sorted(shapes, key=shapes.get):
+        body.extend(_U32.pack(len(shape)))
+        body.extend(_tobytes(array("I", shape)))
+    body.extend(packedCutscenes)
+
+    values = json.dumps(table.values, separators=(',', ':')).encode("utf-8")
+    body = _U32.pack(len(values)) + values + body
+    head = MAGIC + struct.pack("<BB", VERSION, FLAG_ZLIB if compress else 0)
+    return head + (zlib.compress(body) if compress else bytes(body))
+
+
+def loads(data, only=None):
+    """
+    Unpack a packed link back into the same document its JSON version would load as.
+    Cutscenes that aren't asked for are skipped without building any of their nodes.
+
+    :param bytes data: full content of a packed link file
+    :param set[str] only: keys of the only cutscenes to unpack. Defaults to every cutscene
+
+    :raises ValueError: if the data is not a packed link of a supported version, or is truncated
+
+    :returns: link document
+    :rtype: dict
+    """
+    if not isPacked(data):
+        raise ValueError("Not a packed social link")
+    try:
+        return _unpack(data, only)
+    except (struct.error, zlib.error) as error:
+        raise ValueError("Truncated or corrupted packed social link: %s" % error) from error
+
+
+def _unpack(data, only=None):
+    """
+    Unpack the header and body of a packed link, see loads.
+
+    :param bytes data: full content of a packed link file
+    :param set[str] only: keys of the only cutscenes to unpack. Defaults to every cutscene
+
+    :raises ValueError: if the link is of an unsupported version or truncated
+    :raises struct.error: if the link is truncated
+    :raises zlib.error: if the compressed body is truncated or corrupted
+
+    :returns: link document
+    :rtype: dict
+    """
+    version, flags = struct.unpack_from("<BB", data, len(MAGIC))
+    if version != VERSION:
+        raise ValueError("Unsupported packed social link version: %s" % version)
+    body = memoryview(data)[len(MAGIC) + 2:]
+    if flags & FLAG_ZLIB:
+        body = memoryview(zlib.decompress(body))
+
+    pos = 4 + _U32.unpack_from(body, 0)[0]
+    table = json.loads(str(body[4:pos], "utf-8"))
+    # Containers are copied on the way out so that no two nodes end up sharing the same dict/list.
+    copiers = [_copier(value) for value in table]
+
+    doc = deepcopy(table[_U32.unpack_from(body, pos)[0]])
+    pos += 4
+    shapes = [()]
+    shapeCount = _U32.unpack_from(body, pos)[0]
+    pos += 4
+    for _ in range(shapeCount):
+        count = _U32.unpack_from(body, pos)[0]
+        shapes.append(tuple(table[ref] for ref in _fromBytes(body, pos + 4, count)))
+        pos += 4 + 4*count
+
+    cutscenes = {}
+    cutsceneCount = _U32.unpack_from(body, pos)[0]
+    pos += 4
+    for _ in range(cutsceneCount):
+        keyRef, idRef, count, valueCount = struct.unpack_from("<IIII", body, pos)
+        pos += 16
+        if only is not None and table[keyRef] not in only:
+            # Skip the nodes, values and offsets but the last one, which gives the number of targets.
+            pos += 4*(2*count + valueCount)
+            pos += 4 + 4*_U32.unpack_from(body, pos)[0]
+            continue
+        nodes = _fromBytes(body, pos, count)
+        pos += 4*count
+        values = [copiers[ref](table[ref]) if copiers[ref] else table[ref]
+                  for ref in _fromBytes(body, pos, valueCount)]
+        pos += 4*valueCount
+        offsets = _fromBytes(body, pos, count + 1)
+        pos += 4*(count + 1)
+        targets = _fromBytes(body, pos, offsets[-1]).tolist()
+        pos += 4*offsets[-1]
+
+        items = []
+        vindex = 0
+        for index, shape in enumerate(nodes):
+            if shape:
+                keys = shapes[shape]
+                items.append(
+                    [dict(zip(keys, values[vindex:vindex+len(keys)]))] +
+                    targets[offsets[index]:offsets[index+1]]
+                )
+                vindex += len(keys)
+            else:
+                items.append([])
+        cutscenes[table[keyRef]] = {"id": table[idRef], "items": items}
+    doc["cutscenes"] = cutscenes
+    return doc
+
+
+def _copier(value):
+    """
+    Get the cheapest way to copy a value out of the value table.
+
+    :param object value: value from the table
+
+    :returns: function copying the value, or None if the value is immutable
+    :rtype: function|None
+    """
+    if isinstance(value, dict):
+        nested = value.values()
+    elif isinstance(value, list):
+        nested = value
+    else:
+        return None
+    if any(isinstance(item, (dict, list)) for item in nested):
+        return deepcopy
+    return type(value).copy
+
+
+def _tobytes(values):
+    """
+    Get the little-endian bytes of an unsigned int array.
+
+    :param array values: array('I') to pack
+
+    :returns: packed array
+    :rtype: bytes
+    """
+    if _SWAP:
+        values = array("I", values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _fromBytes(body, pos, count):
+    """
+    Read an array of little-endian unsigned ints.
+
+    :param memoryview body: data to read from
+    :param int pos: offset of the array in the data
+    :param int count: number of ints in the array
+
+    :raises ValueError: if the data ends before the array does
+
+    :returns: array('I') read
+    :rtype: array
+    """
+    if pos + 4*count > len(body):
+        raise ValueError("Truncated packed social link")
+    values = array("I")
+    values.frombytes(body[pos:pos + 4*count])
+    if _SWAP:
+        values.byteswap()
+    return values
+
+
+class _Table():
+    """
+    Table of every distinct value in a packed link.
+    Values are interned by their JSON representation, so anything JSON considers identical is only stored
+    once.
+    """
+    def __init__(self):
+        self.values = []
+        self.strings = {}
+        self.others = {}
+
+    def ref(self, value):
+        """
+        Get the table index of a value, adding it to the table if needed.
+
+        :param object value: JSON-compatible value to intern
+
+        :returns: table index
+        :rtype: int
+        """
+        if isinstance(value, str):
+            refs, key = self.strings, value
+        elif isinstance(value, (dict, list, tuple)):
+            refs = self.others
+            if value:
+                key = json.dumps(value, sort_keys=True)
+            else:
+                key = "{}" if isinstance(value, dict) else "[]"
+        else:
+            refs, key = self.others, (type(value), value)
+        try:
+            return refs[key]
+        except KeyError:
+            refs[key] = len(self.values)
+            self.values.append(value)
+            return refs[key]
@@ -0,0 +1,128 @@
+"""
+Headless validation of social link cutscenes, to catch corrupted links before they reach the game build.
+
+Every cutscene is checked in a single pass over its nodes and relations, for:
+    - nodes that can't be reached from the start (node 0)
+    - relations leading past the last node, or to an empty slot
+    - nodes without an ID, which cut the ID list (see MathGraph.getIDs) short
+    - choices with an option that is itself a choice, which the simulation can't play
+Links are linted in parallel, one per process.
+
+Can be run directly to lint every saved link:
+    python -m libs.lint [arcana ...]
+"""
+import sys
+from collections import namedtuple
+from multiprocessing import Pool
+
+from libs import json_reader
+from libs.logictree import MathGraph
+
+UNREACHABLE = "unreachable"
+DANGLING = "dangling"
+EMPTY_TARGET = "empty-target"
+MISSING_ID = "missing-id"
+NESTED_CHOICE = "nested-choice"
+
+TRUNCATED = ", every node after it is missing from the ID list"
+
+Problem = namedtuple("Problem", ["arcana", "level", "angle", "index", "kind", "message"])
+
+
+def lintGraph(graph):
+    """
+    Find every problem in a single cutscene.
+
+    :param MathGraph graph: cutscene to lint
+
+    :returns: (index, kind, message) of every problem found, by index
+    :rtype: list[tuple]
+    """
+    problems = []
+    size = graph.size()
+    reached = bytearray(size)
+    for index in graph.traverse(0):
+        reached[index] = 1
+    truncated = False
+    for index in range(size):
+        node = graph.getItem(index)
+        if node == []:
+            if not truncated:
+                problems.append((index, MISSING_ID, "empty slot" + TRUNCATED))
+            truncated = True
+            continue
+        if graph.getOneID(node) is None:
+            problems.append((index, MISSING_ID, type(node).__name__ + " without an ID" +
+                             ("" if truncated else TRUNCATED)))
+            truncated = True
+        if index and not reached[index]:
+            problems.append((index, UNREACHABLE, "can't be reached from the start"))
+        relations = graph.getRelations(index)
+        for relation in relations:
+            if relation >= size:
+                problems.append((index, DANGLING, "leads to " + str(relation) + ", past the last node"))
+            elif not graph.hasItem(relation):
+                problems.append((index, EMPTY_TARGET, "leads to " + str(relation) + ", an empty slot"))
+            elif len(relations) > 1 and len(graph.getRelations(relation)) > 1:
+                problems.append((index, NESTED_CHOICE, "option " + str(relation) + " is itself a choice"))
+    return problems
+
+
+def lintLink(arcana):
+    """
+    Lint every cutscene of a social link, one cutscene at a time.
+
+    :param str arcana: arcana of the social link
+
+    :returns: every problem found, by cutscene
+    :rtype: list[Problem]
+    """
+    problems = []
+    for cid, graph in json_reader.iterLink(arcana):
+        level, _, angle = cid.partition("_")
+        built = MathGraph(graph["id"]).loadGraph(graph["items"])
+        for index, kind, message in lintGraph(built):
+            problems.append(Problem(arcana, level, angle, index, kind, message))
+    return problems
+
+
+def lintAll(arcanas=None, processes=None):
+    """
+    Lint many social links in parallel.
+
+    :param list[str] arcanas: arcanas of the links to lint. Defaults to every saved link
+    :param int processes: number of worker processes. Defaults to one per CPU
+
+    :returns: every problem found, by arcana
+    :rtype: list[Problem]
+    """
+    if arcanas is None:
+        arcanas = json_reader.listLinks()
+    if len(arcanas) < 2:
+        return [problem for arcana in arcanas for problem in lintLink(arcana)]
+    with Pool(processes) as pool:
+        results = pool.map(lintLink, arcanas)
+    return [problem for problems in results for problem in problems]
+
+
+def formatReport(problems):
+    """
+    Format problems as a readable report, one line per problem.
+
+    :param list[Problem] problems: problems to report
+
+    :returns: report
+    :rtype: str
+    """
+    return "\n".join(
+        "{arcana} level {level} angle {angle}, node {index}: [{kind}] {message}".format(**problem._asdict())
+        for problem in problems
+    )
+
+
+if __name__ == "__main__":
+    found = lintAll(sys.argv[1:] or None)
+    if found:
+        print(formatReport(found))
+    print(str(len(found)) + " problem(s) found")
+    sys.exit(1 if found else 0)
@@ -2,8 +2,18 @@
 This module defines the data structure used to handle the unidirectional, multi-input, potentially repeating
 graphs that are social links.
 """
+from array import array
+from collections.abc import Sequence
+from contextlib import contextmanager
+from itertools import chain as _chain
+
 from libs import action
 
+BFS = "bfs"
+DFS = "dfs"
+POSTORDER = "postorder"
+ACTIONS = (action.Info, action.Speak, action.Camera, action.Movement)
+
 class MathGraph:
     """
     Data struture representing a unidirectional, multi-input, potentially repeating graph.
@@ -12,11 +22,85 @@ class MathGraph:
     - Multi-input: many nodes may lead to the same node.
     - Potentially repeating: the graph may contain loops.
 
+    Nodes are stored in a table of actions (None for an empty slot), with each node's relations in its own
+    array('i'). A CSR (offsets/targets) snapshot of every relation is kept for traversals, rebuilt only after
+    the graph changes (see adjacency). Reads never grow the graph, only addItem and addRelation do.
+    A predecessor index (preds[j]: every node with a relation to j) is maintained along with the relations, or
+    once at the end of a batch of changes (see batch).
+
     :param str name: id of the graph (for PX, social link arcana)
     """
     def __init__(self, name):
         self.id = name
-        self.items = DynamicList()
+        self.nodes = []
+        self.edges = []
+        self.preds = []
+        self.version = 0 # Incremented on every change, for anything cached about the graph
+        self._csr = None
+        self._dominators = None
+        self._visited = bytearray()
+        self._labels = None
+        self._components = None
+        self._batch = 0
+        self._predsStale = False
+
+    @property
+    def items(self):
+        """
+        Read-only view of the graph as rows of [action, relations...], [None] for empty slots.
+        Kept for code written against the original list-of-lists storage, prefer the graph's methods.
+
+        :returns: rows of the graph
+        :rtype: GraphRows
+        """
+        return GraphRows(self)
+
+    def _touch(self):
+        """
+        Record that the graph changed.
+        """
+        self.version += 1
+        self._csr = None
+
+    def _grow(self, index):
+        """
+        Make sure there is a slot at an index, adding empty slots as needed.
+
+        :param int index: index that must exist
+        """
+        missing = index + 1 - len(self.nodes)
+        if missing > 0:
+            self.nodes.extend([None] * missing)
+            self.edges.extend(array('i') for _ in range(missing))
+
+    def hasItem(self, index):
+        """
+        Check whether there is a node at an index.
+
+        :param int index: index to check
+
+        :returns: whether a node exists there
+        :rtype: bool
+        """
+        return 0 <= index < len(self.nodes) and self.nodes[index] is not None
+
+    def adjacency(self):
+        """
+        Get every relation of the graph in CSR form: the relations of node i are
+        targets[offsets[i]:offsets[i+1]]. The snapshot is cached until the graph changes and must not be
+        modified.
+
+        :returns: offsets, targets
+        :rtype: tuple(array, array)
+        """
+        if self._csr is None:
+            offsets = array('i', [0])
+            targets = array('i')
+            for relations in self.edges:
+                targets.extend(relations)
+                offsets.append(len(targets))
+            self._csr = (offsets, targets)
+        return self._csr
 
     def loadGraph(self, value):
         """
@@ -28,19 +112,126 @@ class MathGraph:
         :returns: self, once the graph as been loaded.
         :rtype: MathGraph
         """
-        index = 0
-        jndex = 0
-        for io in value:
-            for jo in io:
-                if jndex == 0:
-                    self.addItem(action.load(jo), index)
-                else:
-                    self.addRelation(index, ((int)(jo)))
-                jndex += 1
-            index += 1
-            jndex = 0
+        for index, row in enumerate(value):
+            if not row:
+                continue
+            self.addItem(action.load(row[0]), index)
+            relations = self.edges[index]
+            for relation in row[1:]:
+                if int(relation) not in relations:
+                    relations.append(int(relation))
+        self._rebuildPredecessors()
         return self
 
+    def _rebuildPredecessors(self):
+        """
+        Rebuild the predecessor index from the relations, in a single pass.
+        """
+        preds = [array('i') for _ in self.edges]
+        for index, relations in enumerate(self.edges):
+            for relation in relations:
+                if relation >= len(preds):
+                    preds.extend(array('i') for _ in range(relation + 1 - len(preds)))
+                preds[relation].append(index)
+        self.preds = preds
+        self._predsStale = False
+
+    def _predecessors(self):
+        """
+        Get the predecessor index, rebuilding it first if it was left out of date by a batch.
+
+        :returns: preds, see MathGraph
+        :rtype: list[array]
+        """
+        if self._predsStale:
+            self._rebuildPredecessors()
+        return self.preds
+
+    @contextmanager
+    def batch(self):
+        """
+        Apply many changes to the graph as a single transaction:
+            with graph.batch():
+                graph.addItem(...)
+                graph.addRelation(...)
+        The predecessor index is only brought up to date once, and the graph is only validated once, when the
+        batch ends. If anything goes wrong, including the validation, every node and relation is put back as
+        it was before the batch (the actions themselves are not copied, so changes made to them directly
+        stay). Nested batches are part of the outermost one.
+
+        :raises ValueError: if the graph is left with a relation to a negative index or a node that isn't an
+                            Action
+        """
+        if self._batch:
+            yield self
+            return
+        snapshot = self.snapshot()
+        self._batch = 1
+        try:
+            yield self
+            self._batch = 0
+            self.validate()
+            self._predecessors()
+        except BaseException:
+            self._batch = 0
+            self.restore(snapshot)
+            raise
+
+    def validate(self):
+        """
+        Check that the graph is well-formed.
+
+        :raises ValueError: if a relation leads to a negative index or a node isn't an Action
+        """
+        for index, node in enumerate(self.nodes):
+            if node is not None and not isinstance(node, ACTIONS):
+                raise ValueError("Node " + str(index) + " of " + str(self.id) + " is not an Action")
+            if self.edges[index] and min(self.edges[index]) < 0:
+                raise ValueError("Node " + str(index) + " of " + str(self.id) + " leads to a negative index")
+
+    def snapshot(self):
+        """
+        Copy the nodes and relations of the graph, see batch.
+
+        :returns: opaque snapshot for restore
+        :rtype: tuple
+        """
+        return list(self.nodes), [array('i', relations) for relations in self.edges]
+
+    def restore(self, snapshot):
+        """
+        Put the nodes and relations of the graph back as they were in a snapshot.
+
+        :param tuple snapshot: snapshot from snapshot()
+        """
+        nodes, edges = snapshot
+        self.nodes = list(nodes)
+        self.edges = [array('i', relations) for relations in edges]
+        self._rebuildPredecessors()
+        self._touch()
+
+    def toDict(self):
+        """
+        Dump this graph as the dict (JSON) format loadGraph reads.
+
+        :returns: graph as a dict
+        :rtype: dict
+        """
+        return {"id": self.id, "items": [self.dumpRow(index) for index in range(len(self.nodes))]}
+
+    def dumpRow(self, index):
+        """
+        Dump a single node and its relations as the list format loadGraph reads.
+
+        :param int index: index of the node
+
+        :returns: [action, relations...], or an empty list if there is no node at this index
+        :rtype: list
+        """
+        if not self.hasItem(index):
+            return []
+        return [self.nodes[index].__dict__] + self.edges[index].tolist()
+
     def size(self):
         """
         Get the number of nodes in the graph.
@@ -49,25 +240,69 @@ class MathGraph:
         :returns: number of nodes
         :rtype: int
         """
-        return len(self.items)
+        return len(self.nodes)
 
-    def getIDs(self):  # Safe but UGLY AF
+    def getIDs(self):
         """
-        Get the IDs of every node in the graph, iteratively.
+        Get the IDs of every node in the graph, made unique by appending their index to repeated IDs.
+        Stops at the first node without an ID.
 
-        :returns: IDs of all graph nodes
+        :returns: IDs of all graph nodes, a copy the caller is free to modify
         :rtype: list
         """
-        temp = []
-        for e in self.items:
-            ret = self.getOneID(e[0])
-            if ret is None:
+        return list(self._labelTable()[0])
+
+    def getIndex(self, label):
+        """
+        Get the index of the node with a certain ID, as listed by getIDs.
+
+        :param str label: ID of the node
+
+        :raises ValueError: if no node has that ID
+
+        :returns: index of the node
+        :rtype: int
+        """
+        try:
+            return self._labelTable()[1][label]
+        except KeyError:
+            raise ValueError(str(label) + " is not the ID of any node") from None
+
+    def getLabel(self, index):
+        """
+        Get the ID of the node at a certain index, as listed by getIDs.
+
+        :param int index: index of the node
+
+        :returns: ID of the node, None if it isn't listed
+        :rtype: str|None
+        """
+        labels = self._labelTable()[0]
+        if 0 <= index < len(labels):
+            return labels[index]
+        return None
+
+    def _labelTable(self):
+        """
+        Get the IDs of the nodes along with the index of every ID, cached until the graph changes.
+
+        :returns: labels, indexes
+        :rtype: tuple(list, dict)
+        """
+        if self._labels is not None and self._labels[0] == self.version:
+            return self._labels[1]
+        labels = []
+        indexes = {}
+        for node in self.nodes:
+            label = self.getOneID(node)
+            if label is None:
                 break
-            if ret not in temp:
-                temp.append(ret)
-            else:
-                temp.append(ret+str(len(temp)))
-        return temp
+            if label in indexes:
+                label += str(len(labels))
+            indexes.setdefault(label, len(labels))
+            labels.append(label)
+        self._labels = (self.version, (labels, indexes))
+        return labels, indexes
 
     def getOneID(self, element):  # Safe but UGLY AF TODO
         """
@@ -94,10 +329,26 @@ class MathGraph:
 
         :param int index: index at which to fetch the node
 
-        :returns: action at the given index
-        :rtype: Action
+        :returns: action at the given index, or an empty list if there is none
+        :rtype: Action|list
+        """
+        if not self.hasItem(index):
+            return []
+        return self.nodes[index]
+
+    def getPredecessors(self, index):
         """
-        return self.items[index][0]
+        Get the index of every node with a relation leading to a specific index.
+
+        :param int index: index of an Action
+
+        :returns: index(es) of the nodes leading to it
+        :rtype: list
+        """
+        preds = self._predecessors()
+        if 0 <= index < len(preds):
+            return preds[index].tolist()
+        return []
 
     def getRelations(self, index):
         """
@@ -108,8 +359,8 @@ class MathGraph:
         :returns: Relational index(es)
         :rtype: list
         """
-        if len(self.items) != 0:
-            return self.items[index][1:len(self.items[index])]
+        if 0 <= index < len(self.edges):
+            return self.edges[index].tolist()
         return []
 
     def addItem(self, act, index):
@@ -119,9 +370,9 @@ class MathGraph:
         :param Action act: Action to set
         :param int index: index at which to set
         """
-        if not isinstance(self.items[index], DynamicList):
-            self.items[index] = DynamicList()
-        self.items[index][0] = act
+        self._grow(index)
+        self.nodes[index] = act
+        self._touch()
 
     def addRelation(self, i, j):
         """
@@ -130,8 +381,16 @@ class MathGraph:
         :param int i: index of item to add a relationship to
         :param int j: index the Action at i should link to
         """
-        if j not in self.items[i]:
-            self.items[i].append(j)
+        self._grow(i)
+        if j not in self.edges[i]:
+            self.edges[i].append(j)
+            if self._batch:
+                self._predsStale = True
+            elif not self._predsStale:
+                if j >= len(self.preds):
+                    self.preds.extend(array('i') for _ in range(j + 1 - len(self.preds)))
+                self.preds[j].append(i)
+            self._touch()
 
     def delRelation(self, i, j):
         """
@@ -140,188 +399,465 @@ class MathGraph:
 
         :param int i: index at which to remove a relationship
         :param int j: relationship index to remove
+
+        :returns: the index remapping if items were removed (see deleteNodes), None otherwise
+        :rtype: array|None
         """
-        self.items[i].remove(j)
-        jfound = False
-        for itemRelation in self.items:
-            if j in itemRelation:
-                jfound = True
-        if not jfound:
-            self.delItem(j)
+        preds = self._predecessors()
+        self.edges[i].remove(j)
+        preds[j].remove(i)
+        self._touch()
+        if not preds[j]:
+            return self.delItem(j)
+        return None
 
     def delItem(self, i):
         """
-        Deletes the item at a given index.
-        Also recusively removes the relationships, which may trigger further item removals.
-        Used to delete a unique subtree.
+        Deletes the item at a given index, along with its subtree (see subTree): everything that can only be
+        reached through it.
 
         :param int i: index of Action to remove
+
+        :returns: the index remapping, see deleteNodes
+        :rtype: array
         """
-        for relation in self.items[i][1:len(self.items[i])]:
-            self.delRelation(i, relation)
-        for itemRelation in self.items:
-            if i in itemRelation:
-                itemRelation.remove(i)
-        self.items.pop(i)
+        return self.deleteNodes(self.subTree(i))
+
+    def deleteNodes(self, indexes):
+        """
+        Delete many nodes at once, in a single pass over the graph.
+        Every node after a deleted one moves down to fill the gap, and every relation is renumbered to match.
+        Relations leading to a deleted node are removed.
+
+        :param iterable indexes: indexes of the nodes to delete
+
+        :returns: remap, where remap[i] is the new index of the node formerly at i, -1 if it was deleted
+        :rtype: array
+        """
+        size = len(self.nodes)
+        remap = array('i', [0]) * size
+        for index in indexes:
+            if 0 <= index < size:
+                remap[index] = -1
+        nodes = []
+        edges = []
+        kept = 0
+        for index in range(size):
+            if remap[index] == -1:
+                continue
+            remap[index] = kept
+            kept += 1
+            nodes.append(self.nodes[index])
+            edges.append(self.edges[index])
+        deleted = size - kept
+        for relations in edges:
+            renumbered = array('i')
+            for relation in relations:
+                if relation >= size:
+                    # Past the end: keep it past the end of the shortened graph.
+                    renumbered.append(relation - deleted)
+                elif remap[relation] != -1:
+                    renumbered.append(remap[relation])
+            relations[:] = renumbered
+        self.nodes = nodes
+        self.edges = edges
+        self._rebuildPredecessors()
+        self._touch()
+        return remap
 
     def subTree(self, i):
         """
-        Find the subtree of element at index i
-        Great, but we need to ensure that each element in the subtree is uniquely dependant on i, so:
-        for each element j in the subtree, compare:
-            The number of ways to reach j in the subtree
-        to
-            The global number of ways to reach j
-        If the number of global ways to reach j is equal to the number of ways in the subtree, that means
-        every single way of reaching j is encompassed by the subtree, thus element j is uniquely dependant on
-        element i.
-
-        ^ LMAO THAT'S SO WRONG ^
-        Following that logic will assume that any time two potential "paths" converge where a single element
-        is in the full subtree of i, any elements solely depending on the point of convergence will be
-        considered unique dependent, though they're not. Like so:
+        Find the subtree of element at index i, i.e. every element uniquely dependant on i: the elements that
+        can't be reached without going through i.
+
+        The original attempts at this compared the number of ways to reach each element of the full subtree of
+        i, then pruned the full subtree of anything with a predecessor outside of it. Both get convergent
+        paths wrong in some way, like so:
                 1       i
                 2       3
                 ->      4
                         5
-        Here 2 leads to 4, but 5 will be considered to be uniquly dependent on i because there's only one was
-        to reach it (through 4), despite it being reachable from 1/2 and i/3. To my former self's credit
-        though, it was a pretty good try at memeing the system.
-
-        Reimplemented, this algorithm parses over every element of the full subtree of i. If there are any
-        elements that lead to any member of the subtree, that themselves are not in the subtree, then the
-        full subtree of that element is removed from the full subtree of i.
-
-        There is however the issue of accidentally considering the root of the subtree to not being uniquly
-        dependent on itself, which is an oxymoron in all cases, so we must make sure that we're ignoring i 
-        while processing any of these elements, whether in the subtree or full tree.
+        where 4 and 5 are reachable from 2 and thus not uniquely dependant on i.
 
+        "Every path to j goes through i" is exactly "i dominates j", so this is a walk of the graph's
+        dominator tree (see dominatorTree), which is cached until the graph changes.
 
         :param int i: element of which to find the unique subtree
 
         :returns: UD, a list of the indexes of every element uniquely depedant on i, including i.
         :rtype: list
         """
-        processed = set()
-        fullsubtree = self.ywaysfromi(i, processed)
-
-        for sindex in list(fullsubtree):
-            if sindex == i:
-                continue
-            for gitem in self.items:
-                if gitem == i:
-                    continue
-                if sindex in gitem and self.items.index(gitem) not in fullsubtree:
-                    nonunique = self.ywaysfromi(sindex)
-                    for nonuniqueindex in nonunique:
-                        # This if statement exists because there's a very high chance that most of what
-                        # existed in the non-unique subtree already was not considered part of the i subtree.
-                        if nonuniqueindex in fullsubtree:
-                            fullsubtree.remove(nonuniqueindex)
-
-        return list(fullsubtree)
-
-    def ywaysfromi(self, i, processed=set()):  #pylint: disable=dangerous-default-value
+        if not 0 <= i < len(self.nodes):
+            return [i]
+        children = self.dominatorTree()[1]
+        subtree = [i]
+        for index in subtree:
+            subtree.extend(children[index])
+        return subtree
+
+    def dominatorTree(self):
+        """
+        Get the dominator tree of the graph, computed with the Cooper-Harvey-Kennedy iterative algorithm.
+
+        Node 0 is the entry of a cutscene, but nodes may also be orphaned (nothing leads to them) or only
+        reachable from orphans, so the tree is rooted on a virtual entry leading to node 0, to every orphan,
+        then to the first node of anything still unreachable. Relations leading past the last node are
+        ignored.
+
+        :returns: idom, children: idom[j] is the immediate dominator of node j (-1 for nodes only dominated by
+                  the virtual entry), children[j] the nodes j immediately dominates
+        :rtype: tuple(list, list)
+        """
+        if self._dominators is not None and self._dominators[0] == self.version:
+            return self._dominators[1]
+        size = len(self.nodes)
+        root = size
+
+        # Postorder of a depth-first search from the virtual entry, whose children are the search roots.
+        orphans = (index for index in range(size)
+                   if not any(pred < size for pred in self.getPredecessors(index)))
+        postorder = []
+        isEntry = bytearray(size + 1)
+        for node, depth in self.traverse(_chain([0], orphans, range(size)), POSTORDER, depths=True):
+            postorder.append(node)
+            if not depth:
+                isEntry[node] = 1
+        postorder.append(root)
+        number = [0] * (size + 1)
+        for index, node in enumerate(postorder):
+            number[node] = index
+
+        preds = self._predecessors()
+        idom = [-1] * (size + 1)
+        idom[root] = root
+        changed = True
+        while changed:
+            changed = False
+            for node in reversed(postorder[:-1]):
+                newIdom = root if isEntry[node] else -1
+                for pred in preds[node] if node < len(preds) else ():
+                    if pred >= size or idom[pred] == -1:
+                        continue
+                    if newIdom == -1:
+                        newIdom = pred
+                        continue
+                    finger = pred
+                    while finger != newIdom:
+                        while number[finger] < number[newIdom]:
+                            finger = idom[finger]
+                        while number[newIdom] < number[finger]:
+                            newIdom = idom[newIdom]
+                if idom[node] != newIdom:
+                    idom[node] = newIdom
+                    changed = True
+
+        children = [[] for _ in range(size)]
+        for node in range(size):
+            if idom[node] != root:
+                children[idom[node]].append(node)
+        idom = [-1 if dominator == root else dominator for dominator in idom[:size]]
+        self._dominators = (self.version, (idom, children))
+        return idom, children
+
+    def dominates(self, i, j):
+        """
+        Check whether every path to node j goes through node i (see dominatorTree).
+
+        :param int i: index of the dominating node
+        :param int j: index of the dominated node
+
+        :returns: whether i dominates j. Nodes dominate themselves
+        :rtype: bool
+        """
+        idom = self.dominatorTree()[0]
+        while j != -1:
+            if j == i:
+                return True
+            j = idom[j]
+        return False
+
+    def components(self):
+        """
+        Get the strongly connected components of the graph (Tarjan's algorithm), cached until the graph
+        changes. Nodes in the same component can all reach each other: any component of more than one node,
+        or of a node leading to itself, is a loop.
+        Components are numbered in reverse topological order: relations only ever lead to a component with the
+        same or a lower number. Relations leading past the last node are ignored.
+
+        :returns: component, members: component[i] is the component of node i, members[c] the nodes in c
+        :rtype: tuple(list, list)
+        """
+        return self._componentTable()[:2]
+
+    def condensation(self):
+        """
+        Get the condensation of the graph: the DAG of its components (see components), cached until the graph
+        changes.
+
+        :returns: successors, where successors[c] lists the components c has relations to, without c itself
+        :rtype: list[list]
+        """
+        return self._componentTable()[2]
+
+    def loops(self):
+        """
+        Get every loop of the graph.
+
+        :returns: nodes of every loop, one list per loop
+        :rtype: list[list]
+        """
+        _, members, _, cyclic, _ = self._componentTable()
+        return [members[comp] for comp in range(len(members)) if cyclic[comp]]
+
+    def endlessLoops(self):
+        """
+        Get every loop of the graph that can never reach an end node (a node without relations), i.e. a loop a
+        player could never leave.
+
+        :returns: nodes of every endless loop, one list per loop
+        :rtype: list[list]
+        """
+        _, members, _, cyclic, ending = self._componentTable()
+        return [members[comp] for comp in range(len(members)) if cyclic[comp] and not ending[comp]]
+
+    def inLoop(self, i, endless=False):
+        """
+        Check whether a node is part of a loop.
+
+        :param int i: index of the node
+        :param bool endless: only consider loops that can never reach an end node. Defaults to False
+
+        :returns: whether the node is in a (endless) loop
+        :rtype: bool
+        """
+        component, _, _, cyclic, ending = self._componentTable()
+        if not 0 <= i < len(component):
+            return False
+        return bool(cyclic[component[i]]) and not (endless and ending[component[i]])
+
+    def _componentTable(self):
+        """
+        Compute the components of the graph and what is known about them, cached until the graph changes.
+
+        :returns: component, members, successors (see condensation), cyclic[c] (whether c is a loop) and
+                  ending[c] (whether c can reach an end node)
+        :rtype: tuple
         """
-        Recusively find all nodes that are accessible in any number of steps from a certain node.
+        if self._components is not None and self._components[0] == self.version:
+            return self._components[1]
+        size = len(self.nodes)
+        offsets, targets = self.adjacency()
+        component, members = strongComponents(offsets, targets)
 
-        :param int i: index of node to find subtree of
-        :param set processed: set of already processed nodes, to avoid duplication or infinite recursion
+        successors = []
+        cyclic = bytearray(len(members))
+        ending = bytearray(len(members))
+        for comp, nodes in enumerate(members):
+            following = []
+            for node in nodes:
+                relations = targets[offsets[node]:offsets[node + 1]]
+                if not relations and self.nodes[node] is not None:
+                    ending[comp] = 1
+                for target in relations:
+                    if target >= size:
+                        continue
+                    other = component[target]
+                    if other == comp:
+                        cyclic[comp] = 1
+                    elif other not in following:
+                        following.append(other)
+                        # Lower numbered components are done already
+                        ending[comp] = ending[comp] or ending[other]
+            successors.append(following)
+        self._components = (self.version, (component, members, successors, cyclic, ending))
+        return self._components[1]
 
-        :returns: the full subtree of the given node
-        :rtype: set
+    def traverse(self, starts, order=DFS, skip=(), depths=False):
         """
-        sub = processed
-        if i not in sub:
-            sub = sub | set([i])
-            for relation in self.items[i][1:len(self.items[i])]:
-                sub = sub | self.ywaysfromi(relation, sub)
-        return sub
+        Walk the graph from one or more nodes, without recursion.
+        Every start is walked in turn, skipping anything an earlier start already reached. Relations leading
+        past the last node are ignored. The visited bitmap is kept on the graph and reused between walks.
 
+        :param int|iterable starts: index of the node to start from, or indexes of every node to start from
+        :param str order: BFS (breadth-first), DFS (depth-first, preorder) or POSTORDER (depth-first).
+                          Defaults to DFS
+        :param iterable skip: nodes to consider already visited, they are neither returned nor walked through
+        :param bool depths: whether to return the depth of each node along with it: its distance to its start
+                            for BFS, its depth in the search tree otherwise. Starts are at depth 0
 
-class DynamicList(list):#Needs relocating (theoretically)
-    """
-    Copy-pasted scalable array off the internet. Can't remember why I didn't just do something smarter
-    myself.
-    """
-    def __getslice__(self, i, j):
+        :returns: indexes of every node reached, in the order requested, or (index, depth) tuples
+        :rtype: list
         """
-        Force slice to pass by overloaded getitem.
-
-        :param int i: slice start
-        :param in j: slice end
-
-        :returns: self sliced to ij delimiters
-        :rtype: DynamicList
+        size = len(self.nodes)
+        offsets, targets = self.adjacency()
+        if isinstance(starts, int):
+            starts = (starts,)
+        visited = self._visited
+        if len(visited) < size:
+            visited.extend(bytes(size - len(visited)))
+        skip = [node for node in skip if 0 <= node < size]
+        for node in skip:
+            visited[node] = 1
+        found = []
+        try:
+            for start in starts:
+                if not 0 <= start < size or visited[start]:
+                    continue
+                visited[start] = 1
+                if order == BFS:
+                    position = len(found)
+                    found.append((start, 0))
+                    while position < len(found):
+                        node, depth = found[position]
+                        position += 1
+                        for target in targets[offsets[node]:offsets[node + 1]]:
+                            if target < size and not visited[target]:
+                                visited[target] = 1
+                                found.append((target, depth + 1))
+                    continue
+                preorder = order != POSTORDER
+                if preorder:
+                    found.append((start, 0))
+                stack = [[start, offsets[start]]]
+                while stack:
+                    top = stack[-1]
+                    node = top[0]
+                    if top[1] < offsets[node + 1]:
+                        target = targets[top[1]]
+                        top[1] += 1
+                        if target < size and not visited[target]:
+                            visited[target] = 1
+                            if preorder:
+                                found.append((target, len(stack)))
+                            stack.append([target, offsets[target]])
+                    else:
+                        stack.pop()
+                        if not preorder:
+                            found.append((node, len(stack)))
+        except BaseException:
+            self._visited = bytearray()
+            raise
+        for node, _ in found:
+            visited[node] = 0
+        for node in skip:
+            visited[node] = 0
+        if depths:
+            return found
+        return [node for node, _ in found]
+
+    def reachable(self, i):
+        """
+        Find all nodes that are accessible in any number of steps from a certain node.
+
+        :param int i: index of node to find the full subtree of
+
+        :returns: the full subtree of the given node, including it
+        :rtype: set
         """
-        return self.__getitem__(slice(i, j))
-
+        return set(self.traverse(i, BFS))
 
-    def __setslice__(self, i, j, seq):
+    def ywaysfromi(self, i, processed=None):
         """
-        Force slice to pass by overloaded setitem.
+        Find all nodes that are accessible in any number of steps from a certain node.
+        Kept for older callers, see reachable and traverse.
 
-        :param int i: slice start
-        :param in j: slice end
-        :param list seq: sequence to set to
+        :param int i: index of node to find subtree of
+        :param set processed: set of already processed nodes, those aren't walked through
 
-        :returns: self with sliced to ij delimiters replaced
-        :rtype: DynamicList
+        :returns: the full subtree of the given node, along with the processed nodes
+        :rtype: set
         """
-        return self.__setitem__(slice(i, j), seq)
+        processed = set(processed or ())
+        return processed | set(self.traverse(i, BFS, skip=processed))
 
 
-    def __delslice__(self, i, j):
-        """
-        Force slice to pass by overloaded delitem.
-
-        :param int i: slice start
-        :param in j: slice end
+def strongComponents(offsets, targets):
+    """
+    Find the strongly connected components of a graph in CSR form (see MathGraph.adjacency), with an iterative
+    version of Tarjan's algorithm.
+    Components are numbered in reverse topological order: relations only ever lead to a component with the
+    same or a lower number. Relations leading past the last node are ignored.
 
-        :returns: self with ij sliced out
-        :rtype: DynamicList
-        """
-        return self.__delitem__(slice(i, j))
+    :param array offsets: relations of node i are targets[offsets[i]:offsets[i+1]]
+    :param array targets: targets of every relation
 
+    :returns: component, members: component[i] is the component of node i, members[c] the nodes in c
+    :rtype: tuple(list, list)
+    """
+    size = len(offsets) - 1
+    order = [-1] * size # Discovery order of each node
+    low = [0] * size
+    component = [-1] * size
+    members = []
+    stack = []
+    found = 0
+    for start in range(size):
+        if order[start] != -1:
+            continue
+        order[start] = low[start] = found
+        found += 1
+        stack.append(start)
+        walk = [[start, offsets[start]]]
+        while walk:
+            top = walk[-1]
+            node = top[0]
+            if top[1] < offsets[node + 1]:
+                target = targets[top[1]]
+                top[1] += 1
+                if target >= size:
+                    continue
+                if order[target] == -1:
+                    order[target] = low[target] = found
+                    found += 1
+                    stack.append(target)
+                    walk.append([target, offsets[target]])
+                elif component[target] == -1 and order[target] < low[node]:
+                    low[node] = order[target]
+                continue
+            walk.pop()
+            if walk and low[node] < low[walk[-1][0]]:
+                low[walk[-1][0]] = low[node]
+            if low[node] == order[node]:
+                comp = len(members)
+                nodes = []
+                while True:
+                    member = stack.pop()
+                    component[member] = comp
+                    nodes.append(member)
+                    if member == node:
+                        break
+                nodes.reverse()
+                members.append(nodes)
+    return component, members
+
+
+class GraphRows(Sequence):
+    """
+    Read-only view of a MathGraph as rows of [action, relations...], see MathGraph.items.
+    Empty slots are rows of their own, [None], so that row[0] is always the slot's action. Reading past the
+    end gives the same, without growing the graph.
+    Every row is built on access, code going through many nodes should use the graph's methods instead.
 
-    def _resize(self, index):
-        """
-        Resizes self as requested by a setitem.
-        Very stupid.
+    :param MathGraph graph: graph to view
+    """
+    def __init__(self, graph):
+        self.graph = graph
 
-        :param int index: index reference for how far self needs to be rezised
-        """
-        #pylint: disable=invalid-name
-        n = len(self)
-        if isinstance(index, slice):
-            m = max(abs(index.start), abs(index.stop))
-        else:
-            m = index + 1
-        if m > n:
-            self.extend([self.__class__() for i in range(m - n)])
-        #pylint: enable=invalid-name
+    def __len__(self):
+        return len(self.graph.nodes)
 
     def __getitem__(self, index):
-        """
-        Make sure to always be able to serve a requested index using _resize.
-
-        :param int index: list index
-
-        :return: guarenteed to return without error self at index
-        :rtype: object
-        """
-        self._resize(index)
-        return list.__getitem__(self, index)
-
-
-    def __setitem__(self, index, item):
-        """
-        Make sure to always be able to set a value in self for a given index.
-
-        :param int index: index to set
-        :param object item: object to put at index
-        """
-        self._resize(index)
-        if isinstance(item, list):
-            item = self.__class__(item)
-        list.__setitem__(self, index, item)
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not self.graph.hasItem(index):
+            return [None]
+        return [self.graph.nodes[index]] + self.graph.edges[index].tolist()
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __repr__(self):
+        return repr(list(self))
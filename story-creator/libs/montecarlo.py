@@ -0,0 +1,242 @@
+"""
+Monte Carlo playthroughs of social link cutscenes, for questions exact bounds (see libs/ranges.py) can't
+answer, like "how often does a player picking at random reach 5 angle?".
+
+Every cutscene is played many times with libs/playback.py, a policy picking the options of every choice, and
+the totals of points and angle of every playthrough are gathered into histograms.
+Runs are split in chunks of CHUNK playthroughs spread over a process pool, or played in this process when
+there is a single chunk or process. Every chunk has its own random generator, seeded from the seed along with
+the arcana, cutscene and chunk number, so results only depend on the seed, never on the number of processes
+or the order chunks finish in.
+
+Can be run directly to simulate every saved link:
+    python -m libs.montecarlo [runs] [seed]
+"""
+import random
+import sys
+from collections import Counter
+from multiprocessing import Pool
+
+from libs import json_reader
+from libs.logictree import MathGraph
+from libs.playback import Playback
+from libs.ranges import POINTS, ANGLE
+
+CHUNK = 500
+LIMIT = 10000
+
+_GRAPHS = {} # Cutscenes already built by this process, {(arcana, level_angle): MathGraph}
+
+
+def uniform(step, rng):
+    """
+    Policy picking any option with the same probability.
+
+    :param Step step: choice to make
+    :param Random rng: random generator of the playthrough
+
+    :returns: position of the option picked
+    :rtype: int
+    """
+    return rng.randrange(len(step.choices))
+
+
+def first(step, rng): #pylint: disable=unused-argument
+    """
+    Policy always picking the first option.
+
+    :param Step step: choice to make
+    :param Random rng: random generator of the playthrough
+
+    :returns: position of the option picked
+    :rtype: int
+    """
+    return 0
+
+
+class Distribution():
+    """
+    Totals of many playthroughs of a cutscene.
+
+    :param str arcana: arcana of the social link
+    :param str cutscene: level_angle of the cutscene
+    """
+    def __init__(self, arcana, cutscene):
+        self.arcana = arcana
+        self.cutscene = cutscene
+        self.runs = 0
+        self.unfinished = 0 # Playthroughs stopped by the step limit, left out of the histograms
+        self.histograms = {} # {(kind, arcana): Counter({total: playthroughs})}
+
+    def add(self, other):
+        """
+        Add the playthroughs of another distribution of the same cutscene to this one.
+
+        :param Distribution other: distribution to add
+        """
+        self.runs += other.runs
+        self.unfinished += other.unfinished
+        for key, histogram in other.histograms.items():
+            self.histograms.setdefault(key, Counter()).update(histogram)
+
+    def share(self, kind, arcana, atLeast):
+        """
+        Get the share of finished playthroughs reaching a total.
+
+        :param str kind: POINTS or ANGLE
+        :param str arcana: arcana of the total
+        :param int atLeast: total to reach
+
+        :returns: share of playthroughs, between 0 and 1
+        :rtype: float
+        """
+        finished = self.runs - self.unfinished
+        if not finished:
+            return 0.0
+        histogram = self.histograms.get((kind, arcana), Counter({0: finished}))
+        return sum(count for total, count in histogram.items() if total >= atLeast) / finished
+
+
+def simulateCutscene(graph, runs, rng, policy=uniform, limit=LIMIT, arcana="", cutscene=""):
+    """
+    Play a cutscene many times.
+
+    :param MathGraph graph: cutscene to play
+    :param int runs: number of playthroughs
+    :param Random rng: random generator, handed to the policy
+    :param function policy: (Step, Random) -> position of the option to pick. Defaults to uniform
+    :param int limit: maximum number of steps of a playthrough. Defaults to LIMIT
+    :param str arcana: arcana of the social link, for the distribution
+    :param str cutscene: level_angle of the cutscene, for the distribution
+
+    :returns: totals of the playthroughs
+    :rtype: Distribution
+    """
+    distribution = Distribution(arcana, cutscene)
+    chooser = lambda step: policy(step, rng)
+    found = {(POINTS, name) for name in _arcanas(graph, POINTS)}
+    found.update((ANGLE, name) for name in _arcanas(graph, ANGLE))
+    for key in found:
+        distribution.histograms[key] = Counter()
+    for _ in range(runs):
+        distribution.runs += 1
+        try:
+            playback = Playback(graph).run(chooser, limit)
+        except ValueError:
+            # Ran into an empty slot
+            distribution.unfinished += 1
+            continue
+        if not playback.finished:
+            distribution.unfinished += 1
+            continue
+        for kind, name in found:
+            totals = playback.points if kind == POINTS else playback.angle
+            distribution.histograms[(kind, name)][totals.get(name, 0)] += 1
+    return distribution
+
+
+def simulateAll(runs=1000, seed=0, policy=uniform, arcanas=None, processes=None, limit=LIMIT):
+    """
+    Play every cutscene of many social links many times, in parallel unless there is a single chunk to play or
+    a single process to play it with.
+
+    :param int runs: number of playthroughs of every cutscene. Defaults to 1000
+    :param int seed: seed of the random generators. Defaults to 0
+    :param function policy: (Step, Random) -> position of the option to pick, must be picklable (defined at
+                            the top level of a module). Defaults to uniform
+    :param list[str] arcanas: arcanas of the links to simulate. Defaults to every saved link
+    :param int processes: number of worker processes. Defaults to one per CPU
+    :param int limit: maximum number of steps of a playthrough. Defaults to LIMIT
+
+    :returns: {(arcana, level_angle): Distribution}
+    :rtype: dict
+    """
+    if arcanas is None:
+        arcanas = json_reader.listLinks()
+    tasks = []
+    for arcana in arcanas:
+        for cutscene in json_reader.listCutscenes(arcana):
+            for chunk, start in enumerate(range(0, runs, CHUNK)):
+                tasks.append((arcana, cutscene, chunk, min(CHUNK, runs - start), seed, policy, limit))
+    if len(tasks) < 2 or processes == 1:
+        try:
+            chunks = [_simulateChunk(task) for task in tasks]
+        finally:
+            # Unlike workers, this process outlives the simulation: its links may change before the next one
+            _GRAPHS.clear()
+    else:
+        with Pool(processes) as pool:
+            # Chunks of looping cutscenes take far longer, hand them out one at a time to keep workers busy
+            chunks = pool.map(_simulateChunk, tasks, chunksize=1)
+    results = {}
+    for distribution in chunks:
+        key = (distribution.arcana, distribution.cutscene)
+        if key in results:
+            results[key].add(distribution)
+        else:
+            results[key] = distribution
+    return results
+
+
+def formatReport(results):
+    """
+    Format distributions as a readable report.
+
+    :param dict results: {(arcana, level_angle): Distribution}
+
+    :returns: report
+    :rtype: str
+    """
+    lines = []
+    for (arcana, cutscene), distribution in sorted(results.items()):
+        level, _, angle = cutscene.partition("_")
+        lines.append("{} level {} angle {}: {} playthroughs, {} unfinished".format(
+            arcana, level, angle, distribution.runs, distribution.unfinished
+        ))
+        for (kind, name), histogram in sorted(distribution.histograms.items()):
+            lines.append("    " + name + " " + kind + ": " + ", ".join(
+                str(total) + " x" + str(count) for total, count in sorted(histogram.items())
+            ))
+    return "\n".join(lines)
+
+
+def _simulateChunk(task):
+    """
+    Play one chunk of the playthroughs of a cutscene, in a worker process.
+
+    :param tuple task: arcana, level_angle, chunk number, number of playthroughs, seed, policy and step limit
+
+    :returns: totals of the playthroughs
+    :rtype: Distribution
+    """
+    arcana, cutscene, chunk, runs, seed, policy, limit = task
+    graph = _GRAPHS.get((arcana, cutscene))
+    if graph is None:
+        raw = json_reader.readCutscene(arcana, cutscene)
+        graph = _GRAPHS[(arcana, cutscene)] = MathGraph(raw["id"]).loadGraph(raw["items"])
+    # Seeding from a string keeps every (seed, arcana, cutscene, chunk) apart, negative seeds included
+    rng = random.Random("{}:{}:{}:{}".format(seed, arcana, cutscene, chunk))
+    return simulateCutscene(graph, runs, rng, policy, limit, arcana, cutscene)
+
+
+def _arcanas(graph, kind):
+    """
+    Find every arcana a cutscene gives points or angle to.
+
+    :param MathGraph graph: cutscene to look into
+    :param str kind: POINTS or ANGLE
+
+    :returns: arcanas
+    :rtype: set[str]
+    """
+    found = set()
+    for node in graph.nodes:
+        found.update(getattr(node, kind, None) or ())
+    return found
+
+
+if __name__ == "__main__":
+    print(formatReport(simulateAll(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 1000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    )))
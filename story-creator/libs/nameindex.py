@@ -0,0 +1,169 @@
+"""
+Persistent index of the names (and a few key fields) of every saved Persona and Character.
+
+Listing entities used to glob and read the whole data/pers or data/chars directory every time. Instead, each
+directory keeps an index file (data/{type}/.index.json) mapping every entity name to its key fields, along
+with the modification time of the entity's file when it was last indexed. json_reader keeps the index up to
+date on every write/delete, and the directory is listed on read so that files added, removed or edited behind
+the application's back are picked up: only those files are (re)read.
+"""
+import json
+import os
+from threading import Lock
+
+from libs import json_reader
+
+INDEX_NAME = '.index.json'
+
+
+class NameIndex():
+    """
+    Name index of one entity directory.
+
+    :param str creatureType: type of creature, for filepath purposes (pers or chars)
+    :param tuple fields: entity fields to keep in the index
+    """
+    def __init__(self, creatureType, fields):
+        self.creatureType = creatureType
+        self.fields = fields
+        self.entries = None
+        self.mtimes = {} # {name: mtime of the entity's file when it was indexed}
+        self.lock = Lock()
+
+    def directory(self):
+        """
+        Get the directory this index covers.
+
+        :returns: absolute path to the directory
+        :rtype: str
+        """
+        return json_reader.buildPath('data/' + self.creatureType)
+
+    def path(self):
+        """
+        Get the path to the index file.
+
+        :returns: absolute path to the index file
+        :rtype: str
+        """
+        return os.path.join(self.directory(), INDEX_NAME)
+
+    def get(self):
+        """
+        Get every indexed entity, syncing the index with the directory first.
+
+        :returns: {name: {field: value}}, empty if the directory doesn't exist (yet)
+        :rtype: dict
+        """
+        with self.lock:
+            try:
+                found = self._listFiles()
+            except FileNotFoundError:
+                self.entries = {}
+                self.mtimes = {}
+                return self.entries
+            if self.entries is None:
+                self._load()
+            if found != self.mtimes:
+                self._sync(found)
+            return self.entries
+
+    def names(self):
+        """
+        Get the names of every indexed entity.
+
+        :returns: names, sorted
+        :rtype: list[str]
+        """
+        return sorted(self.get())
+
+    def update(self, name, entity):
+        """
+        Add or refresh an entity in the index.
+
+        :param str name: name of the entity
+        :param dict entity: the entity as written to disk
+        """
+        entries = self.get()
+        with self.lock:
+            entries[name] = {field: entity.get(field) for field in self.fields}
+            self.mtimes[name] = os.stat(os.path.join(self.directory(), name + '.json')).st_mtime_ns
+            self._save()
+
+    def remove(self, name):
+        """
+        Remove an entity from the index.
+
+        :param str name: name of the entity
+        """
+        entries = self.get()
+        with self.lock:
+            entries.pop(name, None)
+            self.mtimes.pop(name, None)
+            self._save()
+
+    def _load(self):
+        """
+        Load the index file, if there is a valid one.
+        """
+        self.entries = {}
+        self.mtimes = {}
+        try:
+            with open(self.path()) as index:
+                saved = json.load(index)
+            if saved.get("fields") == list(self.fields):
+                entries, mtimes = saved["entries"], saved["mtimes"]
+                self.entries, self.mtimes = entries, mtimes
+        except (OSError, ValueError, KeyError):
+            print("No valid " + self.creatureType + " index, rebuilding it")
+
+    def _listFiles(self):
+        """
+        List the entity files of the directory.
+
+        :raises FileNotFoundError: if the directory doesn't exist
+
+        :returns: {name: mtime} of every entity file
+        :rtype: dict
+        """
+        found = {}
+        with os.scandir(self.directory()) as entries:
+            for entry in entries:
+                name, ext = os.path.splitext(entry.name)
+                if ext == '.json' and entry.name != INDEX_NAME and entry.is_file():
+                    found[name] = entry.stat().st_mtime_ns
+        return found
+
+    def _sync(self, found):
+        """
+        Bring the index up to date with the directory, reading only the files that are new or changed since
+        they were indexed.
+
+        :param dict found: {name: mtime} of every entity file, see _listFiles
+        """
+        for name in set(self.entries) - set(found):
+            self.entries.pop(name)
+            self.mtimes.pop(name, None)
+        for name, mtime in found.items():
+            if name in self.entries and self.mtimes.get(name) == mtime:
+                continue
+            try:
+                entity = json_reader.readOne(name, self.creatureType)
+            except (OSError, ValueError):
+                entity = {}
+            self.entries[name] = {field: entity.get(field) for field in self.fields}
+            self.mtimes[name] = mtime
+        self._save()
+
+    def _save(self):
+        """
+        Persist the index, along with the mtime of every indexed file. The index file is replaced atomically,
+        so that an interrupted save never leaves a corrupted index behind.
+        """
+        json_reader._writeFile(self.path(), json.dumps({ #pylint: disable=protected-access
+            "fields": list(self.fields), "mtimes": self.mtimes, "entries": self.entries
+        }, sort_keys=True).encode('utf-8'))
+
+
+PERSONAS = NameIndex('pers', ('arcana', 'level'))
+CHARACTERS = NameIndex('chars', ('important',))
@@ -0,0 +1,247 @@
+"""
+Headless playback of social link cutscenes.
+
+A cutscene is played from its start (node 0), one node at a time:
+    - a node with a single relation simply leads to the next node
+    - a node with many relations is a choice, each relation being an option. An option with a single relation
+      is the player's reply: picking it plays the reply without stopping on it, then moves on to what it leads
+      to. Any other option is moved to directly
+    - a node without relations ends the cutscene
+Points and angle given by every Speak action played, replies included, are totalled per arcana.
+"""
+from collections import namedtuple
+from weakref import WeakKeyDictionary
+
+from libs.action import Info, Speak, Camera, Movement
+from libs.bytecode import Program, compiled, WIDTHS, OP_SPEAK, OP_EMPTY, OP_JUMP, OP_CHOICE
+
+NEXT = "next"
+CHOICE = "choice"
+END = "end"
+
+_STEPS = WeakKeyDictionary() # {Program: {address: Step}}, steps being the same for every playback
+
+Step = namedtuple("Step", ["index", "action", "kind", "choices"])
+Step.__doc__ = """
+A node being played.
+
+:param int index: index of the node
+:param Action action: action of the node
+:param str kind: NEXT, CHOICE or END
+:param list[Choice] choices: options of a choice, empty for anything else
+"""
+
+Choice = namedtuple("Choice", ["option", "target", "label"])
+Choice.__doc__ = """
+One option of a choice.
+
+:param int option: index of the option node
+:param int target: index of the node picking this option moves to
+:param str label: ID of the option node, as shown to the player
+"""
+
+
+class Playback():
+    """
+    Stepper over a cutscene, with running point and angle totals.
+    Cutscenes are played from their compiled program (see libs/bytecode.py).
+
+        playback = Playback(graph)
+        while not playback.finished:
+            step = playback.step()
+            playback.advance(0 if step.kind == CHOICE else None)
+
+    :param MathGraph|Program graph: cutscene to play, or its program (for exported cutscenes)
+    :param int start: index of the node to start from. Defaults to 0
+    """
+    def __init__(self, graph, start=0):
+        self.graph = graph
+        self.program = graph if isinstance(graph, Program) else compiled(graph)
+        self.index = start
+        self.points = {} # {arcana: total points}
+        self.angle = {} # {arcana: total angle}
+        self.history = [] # Index of every node played, replies included
+        self.finished = False
+        self._current = None
+        self._steps = _STEPS.setdefault(self.program, {})
+        self._address = self.program.address(start)
+        if self._address < 0:
+            self.history.append(start)
+        else:
+            self._enter(self._address)
+
+    def step(self):
+        """
+        Get the node being played.
+
+        :raises ValueError: if the node being played is an empty slot or out of the graph
+
+        :returns: current step
+        :rtype: Step
+        """
+        if self._current is None:
+            self._current = self._makeStep()
+        return self._current
+
+    def _makeStep(self):
+        """
+        Build the step of the node being played, see step. Steps are built once per program.
+
+        :returns: current step
+        :rtype: Step
+        """
+        program = self.program
+        code = program.code
+        address = self._address
+        if address < 0 or code[address] == OP_EMPTY:
+            raise ValueError("No action at index " + str(self.index) + " of " + str(program.id))
+        step = self._steps.get(address)
+        if step is not None:
+            return step
+        act = program.actions[self.index]
+        control = address + WIDTHS[code[address]]
+        if code[control] == OP_JUMP:
+            step = Step(self.index, act, NEXT, [])
+        elif code[control] != OP_CHOICE:
+            step = Step(self.index, act, END, [])
+        else:
+            choices = []
+            for option in range(control + 2, control + 2 + 4*code[control + 1], 4):
+                label = program.constants[code[option + 1]]
+                choices.append(Choice(code[option], code[code[option + 3] + 1], label))
+            step = Step(self.index, act, CHOICE, choices)
+        self._steps[address] = step
+        return step
+
+    def advance(self, choice=None):
+        """
+        Move on to the next node.
+
+        :param int choice: position of the option picked in the current step's choices, for choices only
+
+        :raises ValueError: if a choice is missing, given when there is none, or not one of the options
+
+        :returns: the new step, None if the cutscene ended
+        :rtype: Step|None
+        """
+        if self.finished:
+            return None
+        current = self.step()
+        if current.kind == END:
+            self.finished = True
+            return None
+        code = self.program.code
+        control = self._address + WIDTHS[code[self._address]]
+        if current.kind == NEXT:
+            if choice is not None:
+                raise ValueError("Node " + str(self.index) + " is not a choice")
+            self._enter(code[control + 1])
+            return self.step()
+        self._pick(control, choice)
+        return self.step()
+
+    def run(self, chooser, limit=10000):
+        """
+        Play the rest of the cutscene, picking options with a function.
+        Only choices go through steps, every other node is played straight from the program.
+
+        :param function chooser: Step -> position of the option to pick, called on every choice
+        :param int limit: maximum number of steps, so that endless loops end. Defaults to 10000
+
+        :raises ValueError: if an empty slot or a node out of the graph is reached
+
+        :returns: self, once the cutscene ended or the limit was reached
+        :rtype: Playback
+        """
+        code, constants = self.program.code, self.program.constants
+        history, points, angle = self.history, self.points, self.angle
+        for _ in range(limit):
+            address = self._address
+            if address < 0 or code[address] == OP_EMPTY:
+                self.step()
+            control = address + WIDTHS[code[address]]
+            if code[control] == OP_JUMP:
+                # Inlined _enter, most steps just move on to the next node
+                address = self._address = code[control + 1]
+                self.index = code[address + 1]
+                self._current = None
+                history.append(self.index)
+                if code[address] == OP_SPEAK:
+                    for arcana, amount in constants[code[address + 5]]:
+                        points[arcana] = points.get(arcana, 0) + amount
+                    for arcana, amount in constants[code[address + 6]]:
+                        angle[arcana] = angle.get(arcana, 0) + amount
+                elif code[address] == OP_EMPTY:
+                    self.step()
+            elif code[control] == OP_CHOICE:
+                self._pick(control, chooser(self.step()))
+                if code[self._address] == OP_EMPTY:
+                    self.step()
+            else:
+                self.finished = True
+                break
+        return self
+
+    def _pick(self, control, choice):
+        """
+        Play the reply of an option, if any, and move on to where the option leads.
+
+        :param int control: address of the OP_CHOICE instruction
+        :param int choice: position of the option picked
+
+        :raises ValueError: if the choice is not one of the options
+        """
+        code = self.program.code
+        if choice is None or not 0 <= choice < code[control + 1]:
+            raise ValueError("Pick one of the " + str(code[control + 1]) + " options of node " +
+                             str(self.index))
+        option = control + 2 + 4*choice
+        if code[option + 2] >= 0:
+            self._play(code[option + 2])
+        self._enter(code[option + 3])
+
+    def _enter(self, address):
+        """
+        Make a node the one being played.
+
+        :param int address: address of the node's block
+        """
+        self._address = address
+        self.index = self.program.code[address + 1]
+        self._current = None
+        self._play(address)
+
+    def _play(self, address):
+        """
+        Record a node as played, adding up the points and angle it gives.
+
+        :param int address: address of the node's block
+        """
+        code = self.program.code
+        self.history.append(code[address + 1])
+        if code[address] == OP_SPEAK:
+            constants = self.program.constants
+            for arcana, amount in constants[code[address + 5]]:
+                self.points[arcana] = self.points.get(arcana, 0) + amount
+            for arcana, amount in constants[code[address + 6]]:
+                self.angle[arcana] = self.angle.get(arcana, 0) + amount
+
+
+def describe(act):
+    """
+    Get the text shown to a player for an action.
+
+    :param Action act: action to describe
+
+    :returns: text of the action
+    :rtype: str
+    """
+    if isinstance(act, Info):
+        return act.text
+    if isinstance(act, Speak):
+        return act.speaker + ":\n\n" + act.text
+    if isinstance(act, Camera):
+        return "Camera is being changed in/to " + act.place
+    if isinstance(act, Movement):
+        return act.subject + " is performing a " + act.animation + " action"
+    return "ERROR READING SOCIAL LINK"
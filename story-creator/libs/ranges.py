@@ -0,0 +1,237 @@
+"""
+Exact analysis of the point and angle totals a cutscene can give, over every complete playthrough: every way
+of playing it from the start to an end node, following the rules of libs/playback.py.
+
+The cutscene is turned into the graph of the moves a player can make, each move carrying the points and angle
+it gives. The strongly connected components of that graph are then walked from the ends up:
+    - outside of loops, the best total from a node is the best of its moves plus the best total from where
+      they lead
+    - inside a loop, the same is repeated until nothing changes (Bellman-Ford). If a total keeps changing, the
+      loop can be played again and again for more, and the total is unbounded (infinite)
+Ties are broken by the number of moves left, so the best playthrough found is always the shortest of the best.
+Analyses are cached until the graph changes.
+"""
+from array import array
+from weakref import WeakKeyDictionary
+
+from libs.action import Speak
+from libs.logictree import strongComponents
+from libs.bytecode import transitions
+
+POINTS = "points"
+ANGLE = "angle"
+INFINITY = float("inf")
+
+_CACHE = WeakKeyDictionary()
+
+
+def analyse(graph):
+    """
+    Get the analysis of a graph, computing it if the graph changed since it was last analysed.
+
+    :param MathGraph graph: cutscene to analyse
+
+    :returns: analysis of the cutscene
+    :rtype: Ranges
+    """
+    ranges = _CACHE.get(graph)
+    if ranges is None or ranges.version != graph.version:
+        ranges = _CACHE[graph] = Ranges(graph)
+    return ranges
+
+
+class Ranges():
+    """
+    Point and angle totals of every complete playthrough of a cutscene, see module doc.
+    Prefer analyse, which caches analyses.
+
+    :param MathGraph graph: cutscene to analyse
+    """
+    def __init__(self, graph):
+        self.version = graph.version
+        self.points = {} # {arcana: (min, max)} total points
+        self.angle = {} # {arcana: (min, max)} total angle
+        self.paths = 0 # Number of distinct complete playthroughs, INFINITY if a loop can be played forever
+
+        size = len(graph.nodes)
+        self.size = size
+        self.offsets = array('i', [0])
+        self.targets = array('i')
+        self.gains = [] # {(kind, arcana): delta} of every move
+        self.ending = bytearray(size)
+        for index in range(size):
+            if graph.hasItem(index):
+                moves = transitions(graph, index)
+                if not moves:
+                    self.ending[index] = 1
+                for target, played in moves:
+                    self.targets.append(target if graph.hasItem(target) else size)
+                    self.gains.append(self._gain(graph, played))
+            self.offsets.append(len(self.targets))
+        self.component, self.members = strongComponents(self.offsets, self.targets)
+        self.start = self._gain(graph, (0,))
+        self._values = {}
+        if not graph.hasItem(0):
+            return
+
+        self.paths = self._countPaths()[0]
+        keys = set(self.start)
+        for gain in self.gains:
+            keys.update(gain)
+        for kind, arcana in sorted(keys):
+            highest = self._longest((kind, arcana), 1)[0]
+            if highest is None:
+                continue
+            lowest = self._longest((kind, arcana), -1)[0]
+            offset = self.start.get((kind, arcana), 0)
+            getattr(self, kind)[arcana] = (offset - lowest[0], offset + highest[0])
+
+    def best(self, kind, arcana):
+        """
+        Get the choices of a playthrough giving the highest total.
+
+        :param str kind: POINTS or ANGLE
+        :param str arcana: arcana of the total
+
+        :returns: position of the option picked at every choice, in order (see libs/playback.py), None if no
+                  playthrough ends or the total is unbounded
+        :rtype: list[int]|None
+        """
+        return self._choices((kind, arcana), 1)
+
+    def worst(self, kind, arcana):
+        """
+        Get the choices of a playthrough giving the lowest total.
+
+        :param str kind: POINTS or ANGLE
+        :param str arcana: arcana of the total
+
+        :returns: position of the option picked at every choice, in order (see libs/playback.py), None if no
+                  playthrough ends or the total is unbounded
+        :rtype: list[int]|None
+        """
+        return self._choices((kind, arcana), -1)
+
+    @staticmethod
+    def _gain(graph, played):
+        """
+        Add up the points and angle given by nodes.
+
+        :param MathGraph graph: cutscene being analysed
+        :param tuple played: indexes of the nodes played
+
+        :returns: {(kind, arcana): delta}
+        :rtype: dict
+        """
+        gain = {}
+        for index in played:
+            act = graph.getItem(index)
+            if isinstance(act, Speak):
+                for arcana, amount in act.points.items():
+                    gain[(POINTS, arcana)] = gain.get((POINTS, arcana), 0) + amount
+                for arcana, amount in act.angle.items():
+                    gain[(ANGLE, arcana)] = gain.get((ANGLE, arcana), 0) + amount
+        return gain
+
+    def _countPaths(self):
+        """
+        Count the complete playthroughs from every node.
+
+        :returns: number of playthroughs from every node, INFINITY if a loop on the way can be played forever
+        :rtype: list
+        """
+        count = [0] * self.size
+        offsets, targets = self.offsets, self.targets
+        for nodes in self.members:
+            comp = self.component[nodes[0]]
+            looping = len(nodes) > 1
+            for node in nodes:
+                count[node] = self.ending[node]
+                for target in targets[offsets[node]:offsets[node + 1]]:
+                    if target >= self.size:
+                        continue
+                    if self.component[target] == comp:
+                        looping = True
+                    else:
+                        count[node] += count[target]
+            if looping and any(count[node] for node in nodes):
+                # Every node of a loop can reach every other, so all of them can reach an end
+                for node in nodes:
+                    count[node] = INFINITY
+        return count
+
+    def _longest(self, key, sign):
+        """
+        Find the highest total from every node to an end node, see module doc.
+
+        :param tuple key: (kind, arcana) of the total
+        :param int sign: 1 for the highest total, -1 for the highest negated total (the lowest total)
+
+        :returns: (total, -moves) from every node, None for nodes from which no playthrough ends
+        :rtype: list
+        """
+        if (key, sign) in self._values:
+            return self._values[(key, sign)]
+        weights = [sign * gain.get(key, 0) for gain in self.gains]
+        offsets, targets = self.offsets, self.targets
+        size = self.size
+        best = [None] * size
+        for nodes in self.members:
+            rounds = 0
+            changed = True
+            while changed:
+                changed = False
+                rounds += 1
+                if rounds > len(nodes) + 1:
+                    # Still improving after every simple path was tried: a loop adds up forever
+                    for node in nodes:
+                        if best[node] is not None:
+                            best[node] = (INFINITY, 0)
+                    break
+                for node in nodes:
+                    candidate = (0, 0) if self.ending[node] else None
+                    for move in range(offsets[node], offsets[node + 1]):
+                        target = targets[move]
+                        if target >= size or best[target] is None:
+                            continue
+                        total, moves = best[target]
+                        option = (weights[move] + total, moves - 1)
+                        if candidate is None or option > candidate:
+                            candidate = option
+                    if candidate != best[node]:
+                        best[node] = candidate
+                        changed = True
+        self._values[(key, sign)] = best
+        return best
+
+    def _choices(self, key, sign):
+        """
+        Follow the moves giving the highest total from the start, see best/worst.
+
+        :param tuple key: (kind, arcana) of the total
+        :param int sign: 1 for the highest total, -1 for the lowest
+
+        :returns: position of the option picked at every choice, None if no playthrough ends or the total is
+                  unbounded
+        :rtype: list[int]|None
+        """
+        if not self.size:
+            return None
+        best = self._longest(key, sign)
+        if best[0] is None or best[0][0] == INFINITY:
+            return None
+        choices = []
+        node = 0
+        while not self.ending[node]:
+            first, last = self.offsets[node], self.offsets[node + 1]
+            for move in range(first, last):
+                target = self.targets[move]
+                if target >= self.size or best[target] is None:
+                    continue
+                total, moves = best[target]
+                if (sign * self.gains[move].get(key, 0) + total, moves - 1) == best[node]:
+                    break
+            if last - first > 1:
+                choices.append(move - first)
+            node = target
+        return choices
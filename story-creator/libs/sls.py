@@ -2,25 +2,142 @@
 Container module for the social link class.
 """
 #pylint: disable=no-name-in-module
+from collections.abc import MutableMapping
+from contextlib import ExitStack, contextmanager
+from copy import deepcopy
+from functools import partial
+
 from libs.logictree import MathGraph
 from libs import json_reader
 
+
+class LazyCutscenes(MutableMapping):
+    """
+    Cutscenes of a social link, {level_angle: MathGraph}.
+    Cutscenes are only read from storage and built into a MathGraph the first time they are accessed, so that
+    a link can be opened without reading or building any of its cutscenes. A cutscene's decoded data is
+    dropped as soon as its graph is built.
+
+    :param dict raw: {level_angle: {"id", "items"}} of the cutscenes, None for those to read on first access
+    :param function loader: reads cutscenes from storage, list[level_angle] -> {level_angle: {"id", "items"}}
+                            of those that exist
+    :param dict stored: {level_angle: content hash} of the cutscenes as they are in storage, if known
+    """
+    def __init__(self, raw=None, loader=None, stored=None):
+        self.entries = dict(raw or {})
+        self.loader = loader
+        self.stored = dict(stored or {})
+
+    def __getitem__(self, cid):
+        entry = self.entries[cid]
+        if not isinstance(entry, MathGraph):
+            graph = self._raw(cid)
+            entry = self.entries[cid] = MathGraph(graph["id"]).loadGraph(graph["items"])
+        return entry
+
+    def __setitem__(self, cid, graph):
+        self.entries[cid] = graph
+
+    def __delitem__(self, cid):
+        del self.entries[cid]
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __repr__(self):
+        return "LazyCutscenes(%s)" % list(self.entries)
+
+    def _raw(self, cid):
+        """
+        Get a cutscene as loaded from storage, reading it if needed.
+
+        :param str cid: level_angle of the cutscene
+
+        :raises KeyError: if the cutscene doesn't exist (anymore)
+
+        :returns: {"id", "items"}
+        :rtype: dict
+        """
+        graph = self.entries[cid]
+        if graph is None:
+            graph = self.loader([cid]).get(cid) if self.loader else None
+            if graph is None:
+                raise KeyError(cid)
+        return graph
+
+    def isBuilt(self, cid):
+        """
+        Check whether a cutscene has been built into a MathGraph yet.
+
+        :param str cid: level_angle of the cutscene
+
+        :returns: whether the cutscene was accessed
+        :rtype: bool
+        """
+        return isinstance(self.entries.get(cid), MathGraph)
+
+    def toDict(self, unread=True):
+        """
+        Dump every cutscene as saved to file. Cutscenes that were never accessed are dumped as they are in
+        storage, without being built, all read from storage at once.
+
+        :param bool unread: include the cutscenes that were never read from storage. Defaults to True
+
+        :returns: {level_angle: {"id", "items"}}
+        :rtype: dict
+        """
+        dump = {}
+        missing = []
+        for cid, entry in self.entries.items():
+            if isinstance(entry, MathGraph):
+                dump[cid] = entry.toDict()
+            elif entry is not None:
+                dump[cid] = entry
+            else:
+                missing.append(cid)
+        if unread and missing and self.loader:
+            dump.update(self.loader(missing))
+        return dump
+
+    def contentHashes(self):
+        """
+        Hash every cutscene, without reading those that were never accessed.
+
+        :returns: {level_angle: content hash}, the stored hash (if known) for cutscenes never accessed
+        :rtype: dict
+        """
+        return {
+            cid: self.stored.get(cid) if entry is None else
+            json_reader.contentHash(entry.toDict() if isinstance(entry, MathGraph) else entry)
+            for cid, entry in self.entries.items()
+        }
+
+
 class SocialLink():
     """
     Social link class. Contains all information related to each social link, as well as the cutscenes for
     each level of the link.
 
     :param str arcana: This Social Link's Arcana
+    :param list[str] cutscenes: level_angle of the only cutscenes to load, an empty list to only load the
+                                link-level information. Defaults to loading every cutscene
     """
-    def __init__(self, arcana):
+    def __init__(self, arcana, cutscenes=None):
         self.arcana = arcana
-        self.cutscenes = {}#[level][angle]
+        self.cutscenes = LazyCutscenes()#[level][angle]
         self.cutinfo = {}#{level_angle:"Info"}
         self.info = ""
         self.pseudoname = ""
         self.finalpersona = {} #Angle: Persona Name
         self.requiredPoints = {} #Level#:{Angle#: {'points':#, 'courage':#, 'charm':#, 'acad':#} }
-        self.loadLinks()
+        self.partial = False # Whether only some of the cutscenes were loaded
+        self.digest = None # Content hash of the link as last loaded/saved
+        self.batching = False # Whether changes are being grouped into a single save, see batch
+        self.loadLinks(cutscenes)
+        self.digest = self.contentHash()
 
     def setLink(self, graph, level, angle):
         """
@@ -32,19 +149,30 @@ class SocialLink():
         """
         self.cutscenes[str(level)+"_"+str(angle)] = graph
 
-    def loadLinks(self):
+    def loadLinks(self, cutscenes=None):
         """
-        Load each cutscene of this Social Link's arcana from file.
+        Load this Social Link's arcana from file.
+        Only the link-level information is read, cutscenes are read on first access (see LazyCutscenes).
+        Only some cutscenes may be requested so that no other cutscene is ever read.
+
+        :param list[str] cutscenes: level_angle of the only cutscenes to load. Defaults to every cutscene
         """
+        manifest = json_reader.readManifest(self.arcana)
+        fullLink = manifest["meta"]
         try:
-            fullLink = json_reader.readLink(self.arcana)
             assert fullLink
         except AssertionError:
             print("No existing link")
             return
-        tempdic = fullLink["cutscenes"]
-        for cid, graph in tempdic.items():
-            self.cutscenes[cid] = MathGraph(graph["id"]).loadGraph(graph["items"])
+        stored = manifest["cutscenes"]
+        if cutscenes is not None:
+            self.partial = True
+            stored = {cid: stored[cid] for cid in cutscenes if cid in stored}
+        self.cutscenes = LazyCutscenes(
+            {cid: None for cid in stored},
+            partial(json_reader.readCutscenes, self.arcana),
+            {cid: entry["hash"] for cid, entry in stored.items()}
+        )
 
         # If statements necessary for backwards-compatibility
         if 'pseudoname' in fullLink:
@@ -57,9 +185,30 @@ class SocialLink():
             self.info = fullLink['info']
         if 'cutinfo' in fullLink:
             self.cutinfo = fullLink['cutinfo']
-        print(self.cutscenes)
         print("Loaded")
 
+    def contentHash(self):
+        """
+        Hash the current content of this Social Link, as it would be saved.
+
+        :returns: hex digest
+        :rtype: str
+        """
+        doc = json_reader.linkToDict(self, unread=False)
+        doc["cutscenes"] = self.cutscenes.contentHashes()
+        return json_reader.contentHash(doc)
+
+    def cutsceneKeys(self):
+        """
+        Get the level_angle keys of every cutscene of this Social Link, including those not loaded.
+
+        :returns: level_angle keys
+        :rtype: list[str]
+        """
+        if self.partial:
+            return sorted(set(json_reader.listCutscenes(self.arcana)) | set(self.cutscenes))
+        return list(self.cutscenes)
+
     def startLink(self, level, angle):
         """
         Fetch the link for a given point/angle combination, creating a new one if necessary.
@@ -80,9 +229,109 @@ class SocialLink():
 
         return toreturn
 
-    def save(self):
+    @contextmanager
+    def batch(self):
         """
-        Save this Social Link (self) to file as JSON.
+        Group many changes to this Social Link and its cutscenes into a single transaction:
+            with link.batch():
+                graph = link.startLink(1, 0)
+                graph.addItem(...)
+        Every cutscene changed is validated once and the link is saved once, when the batch ends. Nothing is
+        journaled in the meantime. If anything goes wrong, the link and every cutscene it had built are put
+        back as they were before the batch, and nothing is saved.
+        Nested batches are part of the outermost one.
         """
-        json_reader.writeLink(self)
+        if self.batching:
+            yield self
+            return
+        meta = deepcopy((self.cutinfo, self.info, self.pseudoname, self.finalpersona, self.requiredPoints))
+        entries = dict(self.cutscenes.entries)
+        snapshots = {cid: graph.snapshot() for cid, graph in entries.items() if isinstance(graph, MathGraph)}
+        self.batching = True
+        try:
+            with ExitStack() as stack:
+                for cid in self.cutscenes:
+                    if self.cutscenes.isBuilt(cid):
+                        stack.enter_context(self.cutscenes[cid].batch())
+                yield self
+                # Cutscenes built or added during the batch still need to be checked.
+                for cid in self.cutscenes:
+                    if self.cutscenes.isBuilt(cid):
+                        self.cutscenes[cid].validate()
+        except BaseException:
+            self.cutinfo, self.info, self.pseudoname, self.finalpersona, self.requiredPoints = meta
+            self.cutscenes.entries = entries
+            for cid, snapshot in snapshots.items():
+                entries[cid].restore(snapshot)
+            raise
+        finally:
+            self.batching = False
+        self.save()
+
+    def saveNode(self, level, angle, index):
+        """
+        Save a single node of a cutscene by appending it to this Social Link's journal, rather than rewriting
+        the whole link.
+
+        :param int level: social link level of the cutscene
+        :param int angle: angle of the cutscene
+        :param int index: index of the node to save
+        """
+        if self.batching:
+            return
+        lid = "{level}_{angle}".format(level=level, angle=angle)
+        json_reader.appendJournal(self.arcana, {
+            "cutscene": lid,
+            "node": index,
+            "row": self.cutscenes[lid].dumpRow(index)
+        })
+
+    def saveRelation(self, level, angle, i, j):
+        """
+        Save a new relation of a cutscene by appending it to this Social Link's journal.
+
+        :param int level: social link level of the cutscene
+        :param int angle: angle of the cutscene
+        :param int i: index of the node the relation starts from
+        :param int j: index of the node the relation leads to
+        """
+        if self.batching:
+            return
+        json_reader.appendJournal(self.arcana, {
+            "cutscene": "{level}_{angle}".format(level=level, angle=angle),
+            "relation": [i, j]
+        })
+
+    def saveCutscene(self, level, angle):
+        """
+        Save a whole cutscene by appending it to this Social Link's journal, rather than rewriting the whole
+        link. Used for edits that renumber nodes, like deletions.
+
+        :param int level: social link level of the cutscene
+        :param int angle: angle of the cutscene
+        """
+        if self.batching:
+            return
+        lid = "{level}_{angle}".format(level=level, angle=angle)
+        json_reader.appendJournal(self.arcana, {
+            "cutscene": lid,
+            "graph": self.cutscenes[lid].toDict()
+        })
+
+    def save(self, packed=None, sharded=None):
+        """
+        Save this Social Link (self) to file as JSON, or in the packed binary format.
+        Sharded links only write the cutscenes that are loaded.
+        Nothing is written if the link is unchanged since it was loaded or last saved, unless its format or
+        layout is being changed.
+
+        :param bool packed: whether to save in the packed format. Defaults to the format already on disk
+        :param bool sharded: whether to save as one file per cutscene. Defaults to the layout already on disk
+        """
+        digest = self.contentHash()
+        if digest == self.digest and packed is None and sharded is None:
+            print("No changes to save")
+            return
+        json_reader.writeLink(self, packed, sharded)
+        self.digest = digest
         print("Saved to to file")
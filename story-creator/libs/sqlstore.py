@@ -0,0 +1,512 @@
+"""
+SQLite storage backend for json_reader (see json_reader.useBackend).
+
+Characters, Personas, social link metadata and cutscene nodes/relations are held in indexed tables of a single
+database file instead of one JSON file per entity/link, so that large data sets get indexed lookups and
+single-row updates. Every write is one transaction, and the database runs in WAL mode so that other
+processes can keep reading while the application writes.
+
+Documents go in and out in exactly the same shape as the JSON files: entities and actions are stored as
+JSON text, link structure (cutscenes, nodes, relations) is stored relationally.
+"""
+import json
+import os
+import sqlite3
+from threading import RLock
+
+from libs import json_reader
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entities (
+    type TEXT NOT NULL,
+    name TEXT NOT NULL,
+    arcana TEXT,
+    level,
+    important INTEGER,
+    data TEXT NOT NULL,
+    PRIMARY KEY (type, name)
+);
+CREATE INDEX IF NOT EXISTS entities_arcana ON entities (type, arcana);
+CREATE TABLE IF NOT EXISTS links (
+    arcana TEXT PRIMARY KEY,
+    meta TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cutscenes (
+    arcana TEXT NOT NULL,
+    cid TEXT NOT NULL,
+    gid TEXT NOT NULL,
+    PRIMARY KEY (arcana, cid)
+);
+CREATE TABLE IF NOT EXISTS nodes (
+    arcana TEXT NOT NULL,
+    cid TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    action TEXT,
+    PRIMARY KEY (arcana, cid, idx)
+);
+CREATE TABLE IF NOT EXISTS edges (
+    arcana TEXT NOT NULL,
+    cid TEXT NOT NULL,
+    src INTEGER NOT NULL,
+    pos INTEGER NOT NULL,
+    dst INTEGER NOT NULL,
+    PRIMARY KEY (arcana, cid, src, pos)
+);
+CREATE INDEX IF NOT EXISTS edges_dst ON edges (arcana, cid, dst);
+"""
+
+INDEX_FIELDS = {
+    'pers': ('arcana', 'level'),
+    'chars': ('important',),
+}
+
+
+class SQLiteBackend():
+    """
+    Storage backend keeping all application data in an SQLite database.
+    Implements every pluggable json_reader function, with the same signatures and return values.
+
+    :param str path: path to the database file, created if it doesn't exist
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = RLock()
+        self._conn = None
+        self._pid = None
+
+    def connection(self):
+        """
+        Get the database connection of the current process, opening it if needed.
+        Connections are not shared with forked processes.
+
+        :returns: database connection
+        :rtype: sqlite3.Connection
+        """
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+            self._pid = os.getpid()
+        return self._conn
+
+    def close(self):
+        """
+        Close the database connection of the current process.
+        """
+        with self.lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+
+    def isEmpty(self):
+        """
+        Check whether the database holds no data at all.
+
+        :returns: whether there are no entities and no links
+        :rtype: bool
+        """
+        with self.lock:
+            conn = self.connection()
+            return not (conn.execute("SELECT 1 FROM entities LIMIT 1").fetchone() or
+                        conn.execute("SELECT 1 FROM links LIMIT 1").fetchone())
+
+    def importFiles(self):
+        """
+        Copy every entity and social link saved as files in data/ into the database, in a single transaction.
+        Files are left untouched.
+        """
+        with self.lock, self.connection() as conn:
+            for creatureType in INDEX_FIELDS:
+                for path in json_reader.glob(json_reader.buildPath('data/%s/*.json' % creatureType)):
+                    with open(path) as json_data:
+                        entity = json.load(json_data)
+                    name = os.path.basename(path)[:-len('.json')]
+                    self._writeEntity(conn, creatureType, name, entity)
+            for arcana in json_reader.listLinks.__wrapped__():
+                self._writeLinkDict(conn, arcana, json_reader.readLink.__wrapped__(arcana))
+
+    # Entities
+
+    def writeOne(self, entity, creatureType):
+        """
+        See json_reader.writeOne.
+        """
+        with self.lock, self.connection() as conn:
+            self._writeEntity(conn, creatureType, entity.getName(), entity.__dict__)
+
+    def _writeEntity(self, conn, creatureType, name, entity):
+        """
+        Insert or replace an entity.
+
+        :param sqlite3.Connection conn: database connection, in a transaction
+        :param str creatureType: type of creature, pers or chars
+        :param str name: name of the entity
+        :param dict entity: entity document
+        """
+        conn.execute(
+            "INSERT OR REPLACE INTO entities (type, name, arcana, level, important, data) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (creatureType, name, entity.get('arcana'), entity.get('level'), entity.get('important'),
+             json.dumps(entity))
+        )
+
+    def readOne(self, name, creatureType):
+        """
+        See json_reader.readOne.
+
+        :raises FileNotFoundError: if there is no such entity, like its file-based counterpart
+        """
+        with self.lock:
+            row = self.connection().execute(
+                "SELECT data FROM entities WHERE type = ? AND name = ?", (creatureType, name)
+            ).fetchone()
+        if row is None:
+            raise FileNotFoundError("No saved %s named %s" % (creatureType, name))
+        return json.loads(row[0])
+
+    def _deleteOne(self, name, creatureType):
+        """
+        Delete an entity.
+
+        :param str name: name of the entity
+        :param str creatureType: type of creature, pers or chars
+
+        :raises FileNotFoundError: if there is no such entity, like its file-based counterparts
+        """
+        with self.lock, self.connection() as conn:
+            cursor = conn.execute("DELETE FROM entities WHERE type = ? AND name = ?", (creatureType, name))
+        if not cursor.rowcount:
+            raise FileNotFoundError("No saved %s named %s" % (creatureType, name))
+
+    def deleteChar(self, name):
+        """
+        See json_reader.deleteChar.
+        """
+        self._deleteOne(name, 'chars')
+
+    def deletePer(self, name):
+        """
+        See json_reader.deletePer.
+        """
+        self._deleteOne(name, 'pers')
+
+    def _names(self, creatureType):
+        """
+        Get the names of every entity of a type.
+
+        :param str creatureType: type of creature, pers or chars
+
+        :returns: names, sorted
+        :rtype: list[str]
+        """
+        with self.lock:
+            rows = self.connection().execute(
+                "SELECT name FROM entities WHERE type = ? ORDER BY name", (creatureType,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def _index(self, creatureType):
+        """
+        Get the key fields of every entity of a type.
+
+        :param str creatureType: type of creature, pers or chars
+
+        :returns: {name: {field: value}}
+        :rtype: dict
+        """
+        fields = INDEX_FIELDS[creatureType]
+        with self.lock:
+            rows = self.connection().execute(
+                "SELECT name, %s FROM entities WHERE type = ?" % ", ".join(fields), (creatureType,)
+            ).fetchall()
+        if creatureType == 'chars':
+            return {row[0]: {'important': None if row[1] is None else bool(row[1])} for row in rows}
+        return {row[0]: dict(zip(fields, row[1:])) for row in rows}
+
+    def readPerNames(self):
+        """
+        See json_reader.readPerNames.
+        """
+        return self._names('pers')
+
+    def readPerIndex(self):
+        """
+        See json_reader.readPerIndex.
+        """
+        return self._index('pers')
+
+    def readCharNames(self):
+        """
+        See json_reader.readCharNames.
+        """
+        return self._names('chars')
+
+    def readCharIndex(self):
+        """
+        See json_reader.readCharIndex.
+        """
+        return self._index('chars')
+
+    # Social links
+
+    def isPackedLink(self, arcana):
+        """
+        See json_reader.isPackedLink. Links in the database are never packed files.
+        """
+        return False
+
+    def isShardedLink(self, arcana):
+        """
+        See json_reader.isShardedLink.
+        Every cutscene is stored separately, so any existing link can be partially loaded and saved.
+        """
+        with self.lock:
+            return self.connection().execute(
+                "SELECT 1 FROM links WHERE arcana = ?", (arcana,)
+            ).fetchone() is not None
+
+    def listLinks(self):
+        """
+        See json_reader.listLinks.
+        """
+        with self.lock:
+            rows = self.connection().execute("SELECT arcana FROM links ORDER BY arcana").fetchall()
+        return [row[0] for row in rows]
+
+    def linkFiles(self, arcana):
+        """
+        See json_reader.linkFiles. Links in the database have no files.
+        """
+        return []
+
+    def writeLink(self, link, packed=None, sharded=None):
+        """
+        See json_reader.writeLink.
+        Only the cutscenes loaded in the link are written, other cutscenes are kept as they are. Like a link
+        file, a link that was fully loaded no longer holds the cutscenes it doesn't have anymore.
+        The file format arguments are meaningless for the database and are ignored.
+        """
+        with self.lock, self.connection() as conn:
+            self._writeLinkDict(conn, link.arcana, json_reader.linkToDict(link, unread=False))
+            if not link.partial:
+                self._dropCutscenes(conn, link.arcana, set(link.cutscenes))
+
+    def _dropCutscenes(self, conn, arcana, keep):
+        """
+        Delete every cutscene of a link but some.
+
+        :param sqlite3.Connection conn: database connection, in a transaction
+        :param str arcana: arcana of the social link
+        :param set[str] keep: level_angle of the cutscenes to keep
+        """
+        rows = conn.execute("SELECT cid FROM cutscenes WHERE arcana = ?", (arcana,)).fetchall()
+        for (cid,) in rows:
+            if cid not in keep:
+                self._deleteCutscene(conn, arcana, cid)
+
+    def _writeLinkDict(self, conn, arcana, doc):
+        """
+        Write a link document's metadata and every cutscene it contains.
+
+        :param sqlite3.Connection conn: database connection, in a transaction
+        :param str arcana: arcana of the social link
+        :param dict doc: link document
+        """
+        meta = {key: value for key, value in doc.items() if key != "cutscenes"}
+        conn.execute("INSERT OR REPLACE INTO links (arcana, meta) VALUES (?, ?)", (arcana, json.dumps(meta)))
+        for cid, graph in doc.get("cutscenes", {}).items():
+            self._writeCutscene(conn, arcana, cid, graph)
+
+    def _writeCutscene(self, conn, arcana, cid, graph):
+        """
+        Replace a whole cutscene.
+
+        :param sqlite3.Connection conn: database connection, in a transaction
+        :param str arcana: arcana of the social link
+        :param str cid: level_angle of the cutscene
+        :param dict graph: cutscene, as dumped by MathGraph.toDict
+        """
+        conn.execute("INSERT OR REPLACE INTO cutscenes (arcana, cid, gid) VALUES (?, ?, ?)",
+                     (arcana, cid, graph["id"]))
+        conn.execute("DELETE FROM nodes WHERE arcana = ? AND cid = ?", (arcana, cid))
+        conn.execute("DELETE FROM edges WHERE arcana = ? AND cid = ?", (arcana, cid))
+        conn.executemany(
+            "INSERT INTO nodes (arcana, cid, idx, action) VALUES (?, ?, ?, ?)",
+            ((arcana, cid, index, json.dumps(row[0]) if row else None)
+             for index, row in enumerate(graph["items"]))
+        )
+        conn.executemany(
+            "INSERT INTO edges (arcana, cid, src, pos, dst) VALUES (?, ?, ?, ?, ?)",
+            ((arcana, cid, index, pos, int(target))
+             for index, row in enumerate(graph["items"]) for pos, target in enumerate(row[1:]))
+        )
+
+    def readLink(self, arcana):
+        """
+        See json_reader.readLink.
+        """
+        doc = self.readLinkMeta(arcana)
+        if not doc:
+            return doc
+        doc["cutscenes"] = {}
+        for cid in self.listCutscenes(arcana):
+            doc["cutscenes"][cid] = self.readCutscene(arcana, cid)
+        return doc
+
+    def iterLink(self, arcana):
+        """
+        See json_reader.iterLink.
+        """
+        for cid in self.listCutscenes(arcana):
+            yield cid, self.readCutscene(arcana, cid)
+
+    def readLinkMeta(self, arcana):
+        """
+        See json_reader.readLinkMeta.
+        """
+        with self.lock:
+            row = self.connection().execute("SELECT meta FROM links WHERE arcana = ?", (arcana,)).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def listCutscenes(self, arcana):
+        """
+        See json_reader.listCutscenes.
+        """
+        with self.lock:
+            rows = self.connection().execute(
+                "SELECT cid FROM cutscenes WHERE arcana = ? ORDER BY cid", (arcana,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def readManifest(self, arcana):
+        """
+        See json_reader.readManifest.
+        Counts come from the indexes, hashes and offsets are not tracked in the database and are None.
+        """
+        with self.lock:
+            conn = self.connection()
+            rows = conn.execute(
+                "SELECT c.cid, c.gid, "
+                "(SELECT COUNT(*) FROM nodes n WHERE n.arcana = c.arcana AND n.cid = c.cid), "
+                "(SELECT COUNT(*) FROM edges e WHERE e.arcana = c.arcana AND e.cid = c.cid) "
+                "FROM cutscenes c WHERE c.arcana = ? ORDER BY c.cid", (arcana,)
+            ).fetchall()
+        return {
+            "meta": self.readLinkMeta(arcana),
+            "cutscenes": {cid: {"id": gid, "nodes": nodes, "edges": edges, "hash": None, "offset": None,
+                                "length": None}
+                          for cid, gid, nodes, edges in rows}
+        }
+
+    def readCutscene(self, arcana, cid):
+        """
+        See json_reader.readCutscene.
+        """
+        with self.lock:
+            conn = self.connection()
+            row = conn.execute(
+                "SELECT gid FROM cutscenes WHERE arcana = ? AND cid = ?", (arcana, cid)
+            ).fetchone()
+            if row is None:
+                return None
+            nodes = conn.execute(
+                "SELECT idx, action FROM nodes WHERE arcana = ? AND cid = ? ORDER BY idx", (arcana, cid)
+            ).fetchall()
+            edges = conn.execute(
+                "SELECT src, dst FROM edges WHERE arcana = ? AND cid = ? ORDER BY src, pos", (arcana, cid)
+            ).fetchall()
+        items = [[] for _ in range(nodes[-1][0] + 1 if nodes else 0)]
+        for index, action in nodes:
+            if action is not None:
+                items[index].append(json.loads(action))
+        for src, dst in edges:
+            if items[src]:
+                items[src].append(dst)
+        return {"id": row[0], "items": items}
+
+    def readCutscenes(self, arcana, cids):
+        """
+        See json_reader.readCutscenes.
+        """
+        cutscenes = {cid: self.readCutscene(arcana, cid) for cid in cids}
+        return {cid: graph for cid, graph in cutscenes.items() if graph is not None}
+
+    def deleteCutscene(self, arcana, cid):
+        """
+        See json_reader.deleteCutscene.
+        """
+        with self.lock, self.connection() as conn:
+            self._deleteCutscene(conn, arcana, cid)
+
+    def _deleteCutscene(self, conn, arcana, cid):
+        """
+        Delete a cutscene along with its nodes and relations.
+
+        :param sqlite3.Connection conn: database connection, in a transaction
+        :param str arcana: arcana of the social link
+        :param str cid: level_angle of the cutscene
+        """
+        for table in ("cutscenes", "nodes", "edges"):
+            conn.execute("DELETE FROM %s WHERE arcana = ? AND cid = ?" % table, (arcana, cid))
+
+    def appendJournal(self, arcana, record):
+        """
+        See json_reader.appendJournal.
+        The database is updated in place, so the edit is applied straight away rather than journaled.
+        """
+        cid = record["cutscene"]
+        with self.lock, self.connection() as conn:
+            conn.execute("INSERT OR IGNORE INTO links (arcana, meta) VALUES (?, ?)",
+                         (arcana, json.dumps({"arcana": arcana})))
+            if "graph" in record:
+                self._writeCutscene(conn, arcana, cid, record["graph"])
+                return
+            conn.execute("INSERT OR IGNORE INTO cutscenes (arcana, cid, gid) VALUES (?, ?, ?)",
+                         (arcana, cid, arcana + cid))
+            if "node" in record:
+                row = record["row"]
+                conn.execute("INSERT OR REPLACE INTO nodes (arcana, cid, idx, action) VALUES (?, ?, ?, ?)",
+                             (arcana, cid, record["node"], json.dumps(row[0]) if row else None))
+                # Keep the node indexes contiguous, like the items of a graph.
+                last = conn.execute("SELECT MAX(idx) FROM nodes WHERE arcana = ? AND cid = ?",
+                                    (arcana, cid)).fetchone()[0]
+                conn.executemany(
+                    "INSERT OR IGNORE INTO nodes (arcana, cid, idx, action) VALUES (?, ?, ?, NULL)",
+                    ((arcana, cid, index) for index in range(last))
+                )
+                conn.execute("DELETE FROM edges WHERE arcana = ? AND cid = ? AND src = ?",
+                             (arcana, cid, record["node"]))
+                conn.executemany(
+                    "INSERT INTO edges (arcana, cid, src, pos, dst) VALUES (?, ?, ?, ?, ?)",
+                    ((arcana, cid, record["node"], pos, int(target)) for pos, target in enumerate(row[1:]))
+                )
+            elif "relation" in record:
+                i, j = record["relation"]
+                node = conn.execute("SELECT action FROM nodes WHERE arcana = ? AND cid = ? AND idx = ?",
+                                    (arcana, cid, i)).fetchone()
+                exists = conn.execute(
+                    "SELECT 1 FROM edges WHERE arcana = ? AND cid = ? AND src = ? AND dst = ?",
+                    (arcana, cid, i, j)
+                ).fetchone()
+                if node and node[0] is not None and not exists:
+                    conn.execute(
+                        "INSERT INTO edges (arcana, cid, src, pos, dst) "
+                        "SELECT ?, ?, ?, COALESCE(MAX(pos) + 1, 0), ? "
+                        "FROM edges WHERE arcana = ? AND cid = ? AND src = ?",
+                        (arcana, cid, i, j, arcana, cid, i)
+                    )
+
+    def clearJournal(self, arcana):
+        """
+        See json_reader.clearJournal. Edits are never journaled in the database.
+        """
+
+    def compactLink(self, arcana):
+        """
+        See json_reader.compactLink. Edits are never journaled in the database.
+        """
+
+    def compactAll(self):
+        """
+        See json_reader.compactAll. Edits are never journaled in the database.
+        """
@@ -2,12 +2,22 @@
 Main entry module for the application.
 """
 #pylint: disable=no-name-in-module
+import os
 import sys
 from PySide2.QtWidgets import QApplication
 from PySide2.QtGui import QIcon
 from libs import json_reader
+from libs.sqlstore import SQLiteBackend
 from qtmainframe import MainFrame
 
+# Set STORY_CREATOR_DB to the path of an SQLite database to use it instead of the files in data/.
+# A new database is seeded with whatever is currently saved in data/.
+if os.environ.get('STORY_CREATOR_DB'):
+    BACKEND = SQLiteBackend(os.environ['STORY_CREATOR_DB'])
+    if BACKEND.isEmpty():
+        BACKEND.importFiles()
+    json_reader.useBackend(BACKEND)
+
 APP = QApplication(sys.argv)
 APP.setWindowIcon(QIcon(json_reader.buildPath('icon.gif')))
 MAINF = MainFrame(APP)
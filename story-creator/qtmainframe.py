@@ -5,6 +5,7 @@ between GUIs based on the user's input in the app.
 #pylint: disable=no-name-in-module
 from PySide2.QtWidgets import QWidget, QGridLayout, QLayout, QDesktopWidget
 from gui.qtop import OP
+from libs import json_reader
 
 
 class MainFrame(QWidget):
@@ -42,6 +43,15 @@ class MainFrame(QWidget):
         newWidgetState.show()
         self.center()
 
+    def closeEvent(self, event):
+        """
+        Make sure every pending social link journal is folded back into its link file before quitting.
+
+        :param QCloseEvent event: close event
+        """
+        json_reader.compactAll()
+        event.accept()
+
     def center(self):
         """
         Force the window to center itself.
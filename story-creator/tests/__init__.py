@@ -0,0 +1,6 @@
+"""
+Unit tests, run from the story-creator directory with:
+    python -m unittest discover tests
+or:
+    python -m pytest tests
+"""
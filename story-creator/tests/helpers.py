@@ -0,0 +1,32 @@
+"""
+Shared test fixtures.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from glob import glob
+from unittest import mock
+
+from libs import json_reader
+
+
+class TempDataTestCase(unittest.TestCase):
+    """
+    Test case whose data/ directory is a temporary copy of the saved links, so that nothing a test reads or
+    writes (manifests, journals...) touches the real data/.
+    """
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.root, 'data'))
+        for path in glob(json_reader.buildPath('data/*_link.json')):
+            shutil.copy(path, os.path.join(self.root, 'data'))
+        patcher = mock.patch.object(json_reader, 'buildPath',
+                                    lambda filename: os.path.join(self.root, filename))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(shutil.rmtree, self.root)
+        self.addCleanup(json_reader.useBackend, None)
+        for cache in (json_reader._DIGESTS, json_reader._MANIFESTS): #pylint: disable=protected-access
+            cache.clear()
+            self.addCleanup(cache.clear)
@@ -0,0 +1,47 @@
+"""
+Tests for the cutscene actions, libs/action.py.
+"""
+import unittest
+
+from libs import action
+
+
+class TestDefaults(unittest.TestCase):
+    """
+    Actions built with the default arguments don't share anything.
+    """
+    def testSpeak(self):
+        """
+        Points and angle put on one Speak stay on it.
+        """
+        first = action.Speak()
+        first.putPoints("Void", 2)
+        first.putAngle("Void", 5)
+        second = action.Speak()
+        self.assertEqual(second.getPoints(), {})
+        self.assertEqual(second.getAngle(), {})
+
+    def testCamera(self):
+        """
+        Coordinates changed in place on one Camera stay on it.
+        """
+        first = action.Camera()
+        first.getCameraPosition().extend([1, 2, 3])
+        first.getLookAt().extend([4, 5, 6])
+        second = action.Camera()
+        self.assertEqual(second.getCameraPosition(), [])
+        self.assertEqual(second.getLookAt(), [])
+
+    def testLoadedSpeak(self):
+        """
+        Loaded Speak actions only have the points and angle of their own dict.
+        """
+        first = action.load({"text": "Hi", "speaker": "Boy", "points": {"Void": 1}, "angle": {"Void": 3}})
+        second = action.load({"text": "Bye", "speaker": "Boy", "points": {}, "angle": {}})
+        self.assertEqual(first.getPoints(), {"Void": 1})
+        self.assertEqual(second.getPoints(), {})
+        self.assertEqual(second.getAngle(), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,310 @@
+"""
+Tests for compiled cutscenes, libs/bytecode.py, as played by libs/playback.py.
+"""
+import json
+import random
+import unittest
+from glob import glob
+
+from libs import bytecode, json_reader
+from libs.action import Info, Speak, Camera, Movement
+from libs.logictree import MathGraph
+from libs.playback import Playback, Step, Choice, NEXT, CHOICE, END
+
+LIMIT = 200
+
+
+def reference(graph, chooser, start=0, limit=LIMIT):
+    """
+    Play a cutscene straight from its graph, following the rules of libs/playback.py the way it did before
+    cutscenes were compiled.
+
+    :param MathGraph graph: cutscene to play
+    :param function chooser: Step -> position of the option to pick, called on every choice
+    :param int start: index of the node to start from. Defaults to 0
+    :param int limit: maximum number of steps. Defaults to LIMIT
+
+    :returns: steps, history, points, angle, finished and the error raised (None if there was none)
+    :rtype: tuple
+    """
+    steps, history, points, angle = [], [], {}, {}
+
+    def play(index):
+        """
+        Record a node as played, adding up the points and angle it gives.
+
+        :param int index: index of the node
+        """
+        history.append(index)
+        act = graph.getItem(index)
+        if isinstance(act, Speak):
+            for arcana, amount in act.points.items():
+                points[arcana] = points.get(arcana, 0) + amount
+            for arcana, amount in act.angle.items():
+                angle[arcana] = angle.get(arcana, 0) + amount
+
+    index = start
+    play(index)
+    for _ in range(limit):
+        if not graph.hasItem(index):
+            error = "No action at index " + str(index) + " of " + str(graph.id)
+            return steps, history, points, angle, False, error
+        moves = bytecode.transitions(graph, index)
+        act = graph.getItem(index)
+        if not moves:
+            steps.append(Step(index, act, END, []))
+            return steps, history, points, angle, True, None
+        if len(moves) == 1:
+            steps.append(Step(index, act, NEXT, []))
+            target, played = moves[0]
+        else:
+            choices = [Choice(played[0], target, graph.getOneID(graph.getItem(played[0])))
+                       for target, played in moves]
+            step = Step(index, act, CHOICE, choices)
+            steps.append(step)
+            target, played = moves[chooser(step)]
+        for node in played:
+            play(node)
+        index = target
+    return steps, history, points, angle, False, None
+
+
+def compiledRun(cutscene, chooser, start=0, limit=LIMIT):
+    """
+    Play a cutscene with Playback.run.
+
+    :param MathGraph|Program cutscene: cutscene to play
+    :param function chooser: Step -> position of the option to pick
+    :param int start: index of the node to start from. Defaults to 0
+    :param int limit: maximum number of steps. Defaults to LIMIT
+
+    :returns: history, points, angle, finished and the error raised (None if there was none)
+    :rtype: tuple
+    """
+    playback = Playback(cutscene, start)
+    error = None
+    try:
+        playback.run(chooser, limit)
+    except ValueError as raised:
+        error = str(raised)
+    return playback.history, playback.points, playback.angle, playback.finished, error
+
+
+def compiledSteps(cutscene, chooser, start=0, limit=LIMIT):
+    """
+    Play a cutscene one step at a time, with Playback.step and Playback.advance.
+
+    :param MathGraph|Program cutscene: cutscene to play
+    :param function chooser: Step -> position of the option to pick
+    :param int start: index of the node to start from. Defaults to 0
+    :param int limit: maximum number of steps. Defaults to LIMIT
+
+    :returns: steps, history, points, angle, finished and the error raised (None if there was none)
+    :rtype: tuple
+    """
+    playback = Playback(cutscene, start)
+    steps = []
+    error = None
+    try:
+        for _ in range(limit):
+            step = playback.step()
+            steps.append(step)
+            if playback.advance(chooser(step) if step.kind == CHOICE else None) is None:
+                break
+    except ValueError as raised:
+        error = str(raised)
+    return steps, playback.history, playback.points, playback.angle, playback.finished, error
+
+
+def randomGraph(rng):
+    """
+    Make a random cutscene of every kind of action, with empty slots, relations past the end and loops.
+
+    :param Random rng: random number generator
+
+    :returns: the cutscene
+    :rtype: MathGraph
+    """
+    size = rng.randint(1, 10)
+    graph = MathGraph("Random")
+    with graph.batch():
+        for index in range(size):
+            kind = rng.random()
+            if kind < 0.08:
+                continue
+            if kind < 0.5:
+                act = Speak("Line " + str(index), rng.choice(["Boy", "Girl"]),
+                            {"Aeon": rng.randint(-3, 3)} if rng.random() < 0.6 else {},
+                            {"Void": rng.randint(-2, 2)} if rng.random() < 0.3 else {}, "happy")
+            elif kind < 0.75:
+                act = Info("Info " + str(index % 3))
+            elif kind < 0.88:
+                act = Camera("Room", [index, 1.5, 0], [0, 0, index])
+            else:
+                act = Movement("Boy", [index, 2], "walk")
+            graph.addItem(act, index)
+            for _ in range(rng.choice([0, 1, 1, 2, 3])):
+                graph.addRelation(index, rng.randrange(size + 2))
+    return graph
+
+
+def savedGraphs():
+    """
+    Build every cutscene of the saved links.
+
+    :returns: {(arcana file, level_angle): MathGraph}
+    :rtype: dict
+    """
+    graphs = {}
+    for path in sorted(glob(json_reader.buildPath('data/*_link.json'))):
+        with open(path) as linkfile:
+            doc = json.load(linkfile)
+        for cid, raw in doc.get("cutscenes", {}).items():
+            graphs[(path, cid)] = MathGraph(raw["id"]).loadGraph(raw["items"])
+    return graphs
+
+
+def stepSummary(steps):
+    """
+    Get what matters of steps for comparisons, actions rebuilt from an exported program being new objects.
+
+    :param list[Step] steps: steps played
+
+    :returns: (index, action attributes, kind, choices) of every step
+    :rtype: list[tuple]
+    """
+    return [(step.index, vars(step.action), step.kind, step.choices) for step in steps]
+
+
+class TestPlayback(unittest.TestCase):
+    """
+    Compiled cutscenes play exactly like their graphs.
+    """
+    def assertSamePlay(self, graph, seed, start=0):
+        """
+        Check that a cutscene plays the same from its graph, its program and its exported program.
+
+        :param MathGraph graph: cutscene to play
+        :param int seed: seed of the random choices
+        :param int start: index of the node to start from. Defaults to 0
+        """
+        choosers = [random.Random(seed) for _ in range(5)]
+        expected = reference(graph, lambda step: choosers[0].randrange(len(step.choices)), start)
+        exported = bytecode.loads(bytecode.dumps(bytecode.compiled(graph)))
+        for position, cutscene in enumerate((graph, exported)):
+            rng = choosers[1 + 2*position]
+            self.assertEqual(compiledRun(cutscene, lambda step: rng.randrange(len(step.choices)), start),
+                             expected[1:])
+            rng = choosers[2 + 2*position]
+            steps = compiledSteps(cutscene, lambda step: rng.randrange(len(step.choices)), start)
+            self.assertEqual(steps[1:], expected[1:])
+            self.assertEqual(stepSummary(steps[0]), stepSummary(expected[0]))
+
+    def testSavedCutscenes(self):
+        """
+        Every saved cutscene plays the same compiled, exported or not, whatever the choices.
+        """
+        graphs = savedGraphs()
+        self.assertTrue(graphs)
+        for key, graph in graphs.items():
+            for seed in range(5):
+                with self.subTest(cutscene=key, seed=seed):
+                    self.assertSamePlay(graph, seed)
+
+    def testRandomCutscenes(self):
+        """
+        Random cutscenes play the same compiled, exported or not, errors and loops included.
+        """
+        rng = random.Random(25)
+        for case in range(400):
+            graph = randomGraph(rng)
+            start = rng.choice([0, 0, 0, rng.randrange(graph.size() + 2)])
+            with self.subTest(case=case, items=graph.toDict()["items"], start=start):
+                self.assertSamePlay(graph, case, start)
+
+    def testRoundTrip(self):
+        """
+        Exported programs load back to the same instructions, constants and actions.
+        """
+        rng = random.Random(7)
+        graphs = list(savedGraphs().values()) + [randomGraph(rng) for _ in range(50)]
+        for graph in graphs:
+            program = bytecode.compiled(graph)
+            loaded = bytecode.loads(bytecode.dumps(program))
+            with self.subTest(cutscene=graph.id):
+                self.assertEqual(loaded.id, program.id)
+                self.assertEqual(loaded.code, program.code)
+                self.assertEqual(loaded.entries, program.entries)
+                self.assertEqual(loaded.constants, json.loads(json.dumps(program.constants)))
+                self.assertEqual([None if act is None else vars(act) for act in loaded.actions],
+                                 [None if act is None else vars(act) for act in program.actions])
+
+    def testBadChoices(self):
+        """
+        Choices are only taken on choices, and only among their options.
+        """
+        graph = MathGraph("Choices").loadGraph([
+            [{"text": "Start"}, 1], [{"text": "Pick"}, 2, 3], [{"text": "Left"}], [{"text": "Right"}]
+        ])
+        playback = Playback(graph)
+        with self.assertRaises(ValueError):
+            playback.advance(0)
+        playback.advance()
+        for choice in (None, -1, 2):
+            with self.assertRaises(ValueError):
+                playback.advance(choice)
+        self.assertEqual(playback.advance(1).index, 3)
+
+
+class TestTraps(unittest.TestCase):
+    """
+    Relations to missing nodes compile to trap blocks that stop playback with an error.
+    """
+    def testJumpPastTheEnd(self):
+        """
+        Moving on to a node past the end raises, naming the missing node.
+        """
+        graph = MathGraph("Trap").loadGraph([[{"text": "Start"}, 5], [{"text": "Other"}, 5]])
+        program = bytecode.compiled(graph)
+        trap = program.code[program.entries[0] + bytecode.WIDTHS[bytecode.OP_INFO] + 1]
+        self.assertEqual(program.code[trap:trap + 3].tolist(), [bytecode.OP_EMPTY, 5, bytecode.OP_HALT])
+        self.assertEqual(program.code[program.entries[1] + bytecode.WIDTHS[bytecode.OP_INFO] + 1], trap)
+        self.assertEqual(program.address(5), -1)
+        for cutscene in (graph, bytecode.loads(bytecode.dumps(program))):
+            playback = Playback(cutscene)
+            with self.assertRaisesRegex(ValueError, "No action at index 5 of Trap"):
+                playback.advance()
+            self.assertEqual(playback.history, [0, 5])
+            self.assertFalse(playback.finished)
+            with self.assertRaisesRegex(ValueError, "index 5"):
+                Playback(cutscene).run(lambda step: 0)
+
+    def testChoiceOfMissingNode(self):
+        """
+        An option leading to a missing node can be listed and picked, and raises once moved to.
+        """
+        graph = MathGraph("Trap").loadGraph([[{"text": "Start"}, 1, 7], [{"text": "Stay"}]])
+        step = Playback(graph).step()
+        self.assertEqual([choice.target for choice in step.choices], [1, 7])
+        playback = Playback(graph)
+        with self.assertRaisesRegex(ValueError, "index 7"):
+            playback.advance(1)
+        self.assertEqual(playback.history, [0, 7])
+
+    def testEmptySlot(self):
+        """
+        Empty slots inside the cutscene are traps too, as is starting outside of it.
+        """
+        graph = MathGraph("Trap").loadGraph([[{"text": "Start"}, 2], [], [{"text": "End"}, 1]])
+        playback = Playback(graph)
+        with self.assertRaisesRegex(ValueError, "index 1"):
+            playback.run(lambda step: 0)
+        self.assertEqual(playback.history, [0, 2, 1])
+        playback = Playback(graph, 9)
+        self.assertEqual(playback.history, [9])
+        with self.assertRaisesRegex(ValueError, "index 9"):
+            playback.step()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+"""
+Tests for the cached static data files, libs/catalog.py.
+"""
+import json
+import os
+import unittest
+from unittest import mock
+
+from libs import catalog, json_reader
+from tests.helpers import TempDataTestCase
+
+
+class TestCatalog(TempDataTestCase):
+    """
+    A catalog over a data file of the temporary data directory.
+    """
+    def setUp(self):
+        super().setUp()
+        self.path = json_reader.buildPath('data/catalog.json')
+        self.write({"names": ["a", "b"], "title": "First"}, 1000000000)
+        self.catalog = catalog.Catalog('data/catalog.json')
+
+    def write(self, doc, mtime):
+        """
+        Write the data file with a given modification time.
+
+        :param dict doc: content of the file
+        :param int mtime: modification time, in nanoseconds
+        """
+        with open(self.path, 'w') as datafile:
+            json.dump(doc, datafile)
+        os.utime(self.path, ns=(mtime, mtime))
+
+    def testLoadedOnce(self):
+        """
+        The file is only parsed again once it changed.
+        """
+        data = self.catalog.get()
+        with mock.patch.object(catalog, "CHECK_INTERVAL", 0):
+            self.assertIs(self.catalog.get(), data)
+
+    def testMtimeChangeReloads(self):
+        """
+        A file changed on disk is reloaded on the next check.
+        """
+        self.assertEqual(self.catalog.entry("title"), "First")
+        self.write({"names": ["c"], "title": "Second"}, 2000000000)
+        with mock.patch.object(catalog, "CHECK_INTERVAL", 0):
+            self.assertEqual(self.catalog.entry("title"), "Second")
+            self.assertEqual(self.catalog.entry("names"), ["c"])
+
+    def testChecksAreThrottled(self):
+        """
+        The file isn't looked at again before CHECK_INTERVAL seconds passed.
+        """
+        self.assertEqual(self.catalog.entry("title"), "First")
+        self.write({"names": [], "title": "Second"}, 2000000000)
+        with mock.patch.object(catalog, "CHECK_INTERVAL", 3600):
+            self.assertEqual(self.catalog.entry("title"), "First")
+        self.catalog.invalidate()
+        self.assertEqual(self.catalog.entry("title"), "Second")
+
+    def testEntriesAreCopies(self):
+        """
+        Changing an entry doesn't change what the next caller gets.
+        """
+        names = self.catalog.entry("names")
+        names.append("c")
+        self.assertEqual(self.catalog.entry("names"), ["a", "b"])
+        self.assertIsNot(self.catalog.entry("names"), self.catalog.entry("names"))
+
+
+class TestAccessors(unittest.TestCase):
+    """
+    Typed accessors over the application's data files.
+    """
+    def testAccessorsReturnCopies(self):
+        """
+        Lists handed out by the catalog, directly or through json_reader, are the caller's own.
+        """
+        arcanas = catalog.arcanas()
+        self.assertTrue(arcanas)
+        arcanas.clear()
+        self.assertTrue(catalog.arcanas())
+        spells = json_reader.data_list("spells")
+        spells.append("Not a spell")
+        self.assertNotIn("Not a spell", catalog.spells())
+
+    def testArcanaDescription(self):
+        """
+        Arcana descriptions come from int/arcanaDescription.json.
+        """
+        with open(json_reader.buildPath('int/arcanaDescription.json')) as descfile:
+            descriptions = json.load(descfile)
+        arcana = sorted(descriptions)[0]
+        self.assertEqual(catalog.arcanaDescription(arcana), descriptions[arcana])
+        self.assertEqual(json_reader.readArcDesc(arcana), descriptions[arcana])
+
+
+if __name__ == "__main__":
+    unittest.main()
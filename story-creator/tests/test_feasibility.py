@@ -0,0 +1,80 @@
+"""
+Tests for the social link feasibility check, libs/feasibility.py.
+"""
+import unittest
+from unittest import mock
+
+from libs import feasibility, json_reader, ranges
+from libs.action import Info
+from libs.sls import SocialLink
+from tests.helpers import TempDataTestCase
+
+
+class TestFeasibility(TempDataTestCase):
+    """
+    Checking saved links, fully or partially loaded.
+    """
+    def setUp(self):
+        super().setUp()
+        feasibility._GRAPHS.clear() #pylint: disable=protected-access
+        self.addCleanup(feasibility._GRAPHS.clear) #pylint: disable=protected-access
+
+    def testPartialLinkUnchanged(self):
+        """
+        Cutscenes a partially loaded link didn't have are read without being added to the link, and only read
+        and analysed once.
+        """
+        expected = feasibility.check(SocialLink("Empress"))
+        link = SocialLink("Empress", [])
+        self.assertEqual(feasibility.check(link), expected)
+        self.assertEqual(link.cutscenes.entries, {})
+        self.assertEqual(link.digest, link.contentHash())
+        with mock.patch.object(ranges, "Ranges", wraps=ranges.Ranges) as analysed, \
+             mock.patch.object(json_reader, "readCutscenes", wraps=json_reader.readCutscenes) as reader:
+            self.assertEqual(feasibility.check(link), expected)
+        analysed.assert_not_called()
+        reader.assert_not_called()
+
+    def testStoredCutsceneChanged(self):
+        """
+        A cutscene changed in storage since it was last checked is read again.
+        """
+        link = SocialLink("Empress", [])
+        feasibility.check(link)
+        full = SocialLink("Empress")
+        full.cutscenes["2_0"].addItem(Info("Edited"), 0)
+        full.save()
+        with mock.patch.object(json_reader, "readCutscenes", wraps=json_reader.readCutscenes) as reader:
+            self.assertEqual(feasibility.check(link), feasibility.check(full))
+        reader.assert_called_once_with("Empress", ["2_0"])
+
+    def testMissingCutsceneOfPartialLink(self):
+        """
+        A cutscene that can't be read is reported, and treated as never ending.
+        """
+        link = SocialLink("Empress", ["1_0"])
+        reader = json_reader.readCutscenes
+        with mock.patch.object(json_reader, "readCutscenes",
+                               lambda arcana, cids: {cid: graph for cid, graph in reader(arcana, cids).items()
+                                                     if cid != "2_0"}):
+            problems = feasibility.check(link)
+        self.assertIn(("2", "0", feasibility.MISSING_CUTSCENE), [problem[:3] for problem in problems])
+        self.assertNotIn("2_0", link.cutscenes)
+
+    def testMissingCutsceneOfFullLink(self):
+        """
+        A cutscene listed by a fully loaded link but gone from storage is reported too.
+        """
+        reader = json_reader.readCutscenes
+        with mock.patch.object(json_reader, "readCutscenes",
+                               lambda arcana, cids: {cid: graph for cid, graph in reader(arcana, cids).items()
+                                                     if cid != "1_0"}):
+            link = SocialLink("Empress")
+            problems = feasibility.check(link)
+        kinds = [problem[:3] for problem in problems]
+        self.assertIn(("1", "0", feasibility.MISSING_CUTSCENE), kinds)
+        self.assertIn(("2", "0", feasibility.UNREACHABLE), kinds)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,266 @@
+"""
+Tests for the link journal and manifest of libs/json_reader.py.
+"""
+import io
+import json
+import os
+import unittest
+from contextlib import redirect_stdout
+from copy import deepcopy
+from unittest import mock
+
+from libs import json_reader
+from libs.action import Info
+from libs.sls import SocialLink
+from tests.helpers import TempDataTestCase
+
+
+class TestJournal(TempDataTestCase):
+    """
+    Edits journaled instead of rewriting the link file.
+    """
+    def setUp(self):
+        super().setUp()
+        with open(json_reader.linkPath("Void")) as linkfile:
+            self.saved = json.load(linkfile)
+
+    def expected(self, cid):
+        """
+        Get a copy of a cutscene as saved in the link file.
+
+        :param str cid: level_angle of the cutscene
+
+        :returns: {"id", "items"}
+        :rtype: dict
+        """
+        return deepcopy(self.saved["cutscenes"][cid])
+
+    def testNodeRecord(self):
+        """
+        Node records overwrite a node, growing the cutscene if needed.
+        """
+        graph = self.expected("1_0")
+        row = [{"text": "Changed"}, 0]
+        json_reader.appendJournal("Void", {"cutscene": "1_0", "node": 1, "row": row})
+        json_reader.appendJournal("Void", {"cutscene": "1_0", "node": 7, "row": [{"text": "Far"}]})
+        graph["items"][1] = row
+        graph["items"].extend([[], [], [{"text": "Far"}]])
+        self.assertEqual(json_reader.readCutscene("Void", "1_0"), graph)
+        self.assertEqual(json_reader.readLink("Void")["cutscenes"]["1_0"], graph)
+        self.assertEqual(dict(json_reader.iterLink("Void"))["1_0"], graph)
+        entry = json_reader.readManifest("Void")["cutscenes"]["1_0"]
+        self.assertEqual(entry["nodes"], 8)
+        self.assertEqual(entry["hash"], json_reader.contentHash(graph))
+
+    def testRelationRecord(self):
+        """
+        Relation records add a relation once, and only from an existing node.
+        """
+        graph = self.expected("1_0")
+        for record in ([0, 3], [0, 3], [40, 1]):
+            json_reader.appendJournal("Void", {"cutscene": "1_0", "relation": record})
+        graph["items"][0].append(3)
+        self.assertEqual(json_reader.readCutscene("Void", "1_0"), graph)
+
+    def testCutsceneRecord(self):
+        """
+        Cutscene records replace a whole cutscene, or add a new one.
+        """
+        replaced = {"id": "Void1_0", "items": [[{"text": "Only"}]]}
+        added = {"id": "Void3_0", "items": [[{"text": "New"}]]}
+        json_reader.appendJournal("Void", {"cutscene": "1_0", "graph": replaced})
+        json_reader.appendJournal("Void", {"cutscene": "3_0", "graph": added})
+        cutscenes = dict(json_reader.iterLink("Void"))
+        self.assertEqual(cutscenes["1_0"], replaced)
+        self.assertEqual(cutscenes["3_0"], added)
+        self.assertIn("3_0", json_reader.listCutscenes("Void"))
+        self.assertEqual(json_reader.readCutscene("Void", "3_0"), added)
+
+    def testNewCutsceneFromNodeRecord(self):
+        """
+        A node record for a cutscene that doesn't exist creates it, named after the link.
+        """
+        json_reader.appendJournal("Void", {"cutscene": "4_0", "node": 0, "row": [{"text": "Start"}]})
+        self.assertEqual(json_reader.readCutscene("Void", "4_0"),
+                         {"id": "Void4_0", "items": [[{"text": "Start"}]]})
+
+    def testCorruptedTrailingLine(self):
+        """
+        A record left half-written is skipped, every record before it still applies.
+        """
+        graph = self.expected("1_0")
+        json_reader.appendJournal("Void", {"cutscene": "1_0", "relation": [0, 3]})
+        with open(json_reader.journalPath("Void"), 'a') as journal:
+            journal.write('{"cutscene": "1_0", "node": 0, "ro')
+        graph["items"][0].append(3)
+        output = io.StringIO()
+        with redirect_stdout(output):
+            self.assertEqual(json_reader.readCutscene("Void", "1_0"), graph)
+        self.assertIn("Skipping corrupted journal record", output.getvalue())
+
+    def testCompaction(self):
+        """
+        Compacting folds the journal into the link file and removes it, without changing the link.
+        """
+        json_reader.appendJournal("Void", {"cutscene": "1_0", "relation": [0, 3]})
+        json_reader.appendJournal("Void", {"cutscene": "3_0", "graph": {"id": "Void3_0", "items": []}})
+        before = json_reader.readLink("Void")
+        with redirect_stdout(io.StringIO()):
+            json_reader.compactLink("Void")
+        self.assertFalse(os.path.exists(json_reader.journalPath("Void")))
+        self.assertEqual(json_reader.readLink("Void"), before)
+        with open(json_reader.linkPath("Void")) as linkfile:
+            self.assertEqual(json.load(linkfile), before)
+        manifest = json_reader.readManifest("Void")
+        self.assertEqual(manifest["cutscenes"]["1_0"]["hash"],
+                         json_reader.contentHash(before["cutscenes"]["1_0"]))
+        self.assertIsNotNone(manifest["cutscenes"]["1_0"]["offset"])
+
+
+class TestLinkSaves(TempDataTestCase):
+    """
+    Node, relation and cutscene saves of a social link go to its journal, the link file is left alone.
+    """
+    def setUp(self):
+        super().setUp()
+        with open(json_reader.linkPath("Void"), 'rb') as linkfile:
+            self.original = linkfile.read()
+
+    def assertLinkFileUnchanged(self):
+        """
+        Check that the link file still holds exactly what it held before the test.
+        """
+        with open(json_reader.linkPath("Void"), 'rb') as linkfile:
+            self.assertEqual(linkfile.read(), self.original)
+
+    def testSaveNode(self):
+        """
+        A saved node is journaled and read back by a new link.
+        """
+        link = SocialLink("Void")
+        link.cutscenes["1_0"].addItem(Info("Edited"), 1)
+        link.saveNode(1, 0, 1)
+        self.assertLinkFileUnchanged()
+        self.assertEqual(len(json_reader._readJournal("Void")), 1) #pylint: disable=protected-access
+        reloaded = SocialLink("Void")
+        self.assertEqual(reloaded.cutscenes["1_0"].getItem(1).text, "Edited")
+        self.assertEqual(reloaded.cutscenes["1_0"].toDict(), link.cutscenes["1_0"].toDict())
+
+    def testSaveRelation(self):
+        """
+        A saved relation is journaled and read back by a new link.
+        """
+        link = SocialLink("Void")
+        graph = link.cutscenes["1_0"]
+        target = next(index for index in range(graph.size()) if index not in graph.getRelations(0))
+        graph.addRelation(0, target)
+        link.saveRelation(1, 0, 0, target)
+        self.assertLinkFileUnchanged()
+        self.assertIn(target, SocialLink("Void").cutscenes["1_0"].getRelations(0))
+
+    def testSaveCutscene(self):
+        """
+        A saved cutscene replaces the whole cutscene, deletions included.
+        """
+        link = SocialLink("Void")
+        graph = link.cutscenes["1_0"]
+        graph.delItem(graph.size() - 1)
+        link.saveCutscene(1, 0)
+        self.assertLinkFileUnchanged()
+        self.assertEqual(SocialLink("Void").cutscenes["1_0"].toDict(), graph.toDict())
+
+    def testBatchedSavesAreNotJournaled(self):
+        """
+        Saves made during a batch are left to the single save that ends it.
+        """
+        link = SocialLink("Void")
+        with link.batch():
+            link.cutscenes["1_0"].addItem(Info("Batched"), 1)
+            link.saveNode(1, 0, 1)
+            self.assertFalse(os.path.exists(json_reader.journalPath("Void")))
+        self.assertEqual(SocialLink("Void").cutscenes["1_0"].getItem(1).text, "Batched")
+
+    def testFullSaveClearsJournal(self):
+        """
+        Saving the whole link writes the journaled edits to the link file and discards the journal.
+        """
+        link = SocialLink("Void")
+        link.cutscenes["1_0"].addItem(Info("Edited"), 1)
+        link.saveNode(1, 0, 1)
+        link.info = "Changed"
+        link.save()
+        self.assertFalse(os.path.exists(json_reader.journalPath("Void")))
+        with open(json_reader.linkPath("Void")) as linkfile:
+            self.assertEqual(json.load(linkfile)["cutscenes"]["1_0"], link.cutscenes["1_0"].toDict())
+
+
+class TestManifest(TempDataTestCase):
+    """
+    Manifests kept next to link files.
+    """
+    def testMatchesLink(self):
+        """
+        The manifest describes every cutscene as readLink loads it.
+        """
+        for arcana in json_reader.listLinks():
+            doc = json_reader.readLink(arcana)
+            manifest = json_reader.readManifest(arcana)
+            with self.subTest(arcana=arcana):
+                self.assertEqual(manifest["meta"], {k: v for k, v in doc.items() if k != "cutscenes"})
+                self.assertEqual(sorted(manifest["cutscenes"]), sorted(doc["cutscenes"]))
+                for cid, graph in doc["cutscenes"].items():
+                    self.assertEqual(manifest["cutscenes"][cid]["hash"], json_reader.contentHash(graph))
+
+    def testStaleAfterFileChange(self):
+        """
+        A link file changed by something else is noticed, and its manifest rebuilt, locating cutscenes even in
+        compact JSON.
+        """
+        json_reader.readManifest("Void")
+        with open(json_reader.linkPath("Void")) as linkfile:
+            doc = json.load(linkfile)
+        doc["cutscenes"]["5_0"] = {"id": "Void5_0", "items": [[{"text": "Added"}]]}
+        doc["info"] = "Changed elsewhere"
+        with open(json_reader.linkPath("Void"), 'w') as linkfile:
+            json.dump(doc, linkfile)
+
+        manifest = json_reader.readManifest("Void")
+        self.assertEqual(manifest["meta"]["info"], "Changed elsewhere")
+        self.assertIn("5_0", manifest["cutscenes"])
+        with open(json_reader.linkPath("Void"), 'rb') as linkfile:
+            raw = linkfile.read()
+        for cid, entry in manifest["cutscenes"].items():
+            self.assertEqual(json.loads(raw[entry["offset"]:entry["offset"] + entry["length"]]),
+                             doc["cutscenes"][cid])
+        self.assertEqual(dict(json_reader.iterLink("Void")), doc["cutscenes"])
+        self.assertEqual(json_reader.readCutscene("Void", "5_0"), doc["cutscenes"]["5_0"])
+        with open(json_reader.manifestPath("Void")) as manifestfile:
+            self.assertIn("5_0", json.load(manifestfile)["cutscenes"])
+
+    def testBuiltOneCutsceneAtATime(self):
+        """
+        Building a manifest never decodes the whole link file at once.
+        """
+        size = os.path.getsize(json_reader.linkPath("Lovers"))
+        with mock.patch.object(json, "loads", wraps=json.loads) as decode:
+            manifest = json_reader.readManifest("Lovers")
+        self.assertEqual(len(manifest["cutscenes"]), 9)
+        self.assertGreater(decode.call_count, 9)
+        self.assertLess(max(len(call[0][0]) for call in decode.call_args_list), size // 2)
+        with open(json_reader.linkPath("Lovers")) as linkfile:
+            self.assertEqual(manifest["meta"], {key: value for key, value in json.load(linkfile).items()
+                                                if key != "cutscenes"})
+
+    def testCorruptedManifestIsRebuilt(self):
+        """
+        An unreadable manifest is rebuilt from the link.
+        """
+        expected = json_reader.readManifest("Void")
+        json_reader._MANIFESTS.clear() #pylint: disable=protected-access
+        with open(json_reader.manifestPath("Void"), 'w') as manifestfile:
+            manifestfile.write("{not json")
+        self.assertEqual(json_reader.readManifest("Void")["cutscenes"], expected["cutscenes"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+"""
+Tests for the layered layout of the graph view, libs/layout.py.
+"""
+import random
+import unittest
+
+from libs.action import Info
+from libs.layout import Layout, layered
+from libs.logictree import MathGraph
+
+
+def makeGraph(relations, size):
+    """
+    Build a graph of Info nodes from the relations of each node.
+
+    :param dict relations: {index: [relations...]}
+    :param int size: number of nodes
+
+    :returns: the graph
+    :rtype: MathGraph
+    """
+    return MathGraph("Layout").loadGraph([[{"text": str(index)}] + relations.get(index, [])
+                                          for index in range(size)])
+
+
+def crossings(graph, layout):
+    """
+    Count the crossings between relations from one row to the next.
+
+    :param MathGraph graph: graph laid out
+    :param Layout layout: its layout
+
+    :returns: number of pairs of relations crossing each other
+    :rtype: int
+    """
+    rank, column = layout.rank, layout.column
+    relations = [(i, j) for i in rank for j in graph.getRelations(i) if rank.get(j) == rank[i] + 1]
+    return sum(1 for a, b in relations for c, d in relations
+               if rank[a] == rank[c] and column[a] < column[c] and column[b] > column[d])
+
+
+class TestLayout(unittest.TestCase):
+    """
+    Rows, columns and loops of laid out graphs.
+    """
+    def assertWellFormed(self, graph, layout):
+        """
+        Check the layout of a graph: every node reached is placed once, relations lead down unless they close
+        a loop, nodes sit right below their lowest predecessor, and columns keep every row in order.
+
+        :param MathGraph graph: graph laid out
+        :param Layout layout: its layout
+        """
+        reached = set(graph.reachable(0))
+        self.assertEqual(set(layout.rank), reached)
+        self.assertEqual(sorted(node for row in layout.rows for node in row), sorted(reached))
+        for row, nodes in enumerate(layout.rows):
+            self.assertTrue(all(layout.rank[node] == row for node in nodes))
+            columns = [layout.column[node] for node in nodes]
+            self.assertEqual(columns, sorted(set(columns)))
+        if reached:
+            # Placeholders of relations spanning many rows take columns too.
+            self.assertGreater(layout.width, max(layout.column.values()))
+            self.assertGreaterEqual(min(layout.column.values()), 0)
+        lowest = {node: 0 for node in reached}
+        for node in reached:
+            for relation in graph.getRelations(node):
+                if relation not in reached:
+                    continue
+                if (node, relation) in layout.backEdges:
+                    self.assertLessEqual(layout.rank[relation], layout.rank[node])
+                    self.assertIn(node, graph.reachable(relation))
+                else:
+                    self.assertGreater(layout.rank[relation], layout.rank[node])
+                    lowest[relation] = max(lowest[relation], layout.rank[node] + 1)
+        self.assertEqual(layout.rank, lowest)
+
+    def testRows(self):
+        """
+        Nodes are placed on the row after their lowest predecessor.
+        """
+        graph = makeGraph({0: [1, 2], 1: [2], 2: [3]}, 4)
+        layout = layered(graph)
+        self.assertEqual(layout.rank, {0: 0, 1: 1, 2: 2, 3: 3})
+        self.assertEqual(layout.rows, [[0], [1], [2], [3]])
+        self.assertEqual(layout.backEdges, set())
+        self.assertWellFormed(graph, layout)
+
+    def testLoops(self):
+        """
+        Relations closing a loop, self-loops included, are set aside and everything else still leads down.
+        """
+        graph = makeGraph({0: [1], 1: [2, 1], 2: [1, 3], 3: [0]}, 4)
+        layout = layered(graph)
+        self.assertEqual(layout.backEdges, {(1, 1), (2, 1), (3, 0)})
+        self.assertEqual(layout.rows, [[0], [1], [2], [3]])
+        self.assertWellFormed(graph, layout)
+
+    def testCrossings(self):
+        """
+        Rows are reordered so that relations don't cross when they don't have to.
+        """
+        graph = makeGraph({0: [1, 3], 1: [4, 2], 2: [5], 3: [4], 4: [5]}, 6)
+        self.assertEqual(crossings(graph, Layout(graph, sweeps=0)), 1)
+        layout = layered(graph)
+        self.assertEqual(crossings(graph, layout), 0)
+        self.assertWellFormed(graph, layout)
+
+    def testRandomGraphs(self):
+        """
+        Random graphs, loops and relations past the end included, are always laid out well.
+        """
+        rng = random.Random(20)
+        for case in range(300):
+            size = rng.randint(1, 12)
+            relations = {index: rng.sample(range(size + 2), rng.randint(0, min(3, size + 2)))
+                         for index in range(size)}
+            graph = makeGraph(relations, size)
+            with self.subTest(case=case, relations=relations):
+                self.assertWellFormed(graph, layered(graph))
+
+    def testOnlyReachable(self):
+        """
+        Only nodes reachable from the start are laid out, relations past the end are ignored.
+        """
+        graph = makeGraph({0: [1, 7], 2: [0]}, 3)
+        layout = layered(graph)
+        self.assertEqual(layout.rows, [[0], [1]])
+        self.assertNotIn(2, layout.rank)
+        empty = layered(MathGraph("Empty"))
+        self.assertEqual((empty.rows, empty.rank, empty.width), ([], {}, 0))
+
+    def testCached(self):
+        """
+        Layouts are computed once, until the graph changes.
+        """
+        graph = makeGraph({0: [1]}, 2)
+        layout = layered(graph)
+        self.assertIs(layered(graph), layout)
+        graph.addItem(Info("2"), 2)
+        graph.addRelation(1, 2)
+        self.assertIsNot(layered(graph), layout)
+        self.assertEqual(layered(graph).rows, [[0], [1], [2]])
+
+
+if __name__ == "__main__":
+    unittest.main()
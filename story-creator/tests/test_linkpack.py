@@ -0,0 +1,96 @@
+"""
+Tests for the packed link format, libs/linkpack.py.
+"""
+import json
+import unittest
+from glob import glob
+
+from libs import json_reader, linkpack
+
+
+class TestLinkPack(unittest.TestCase):
+    """
+    Packing and unpacking link documents.
+    """
+    def setUp(self):
+        self.docs = {}
+        for path in sorted(glob(json_reader.buildPath('data/*_link.json'))):
+            with open(path) as linkfile:
+                self.docs[path] = json.load(linkfile)
+
+    def testRoundTripSavedLinks(self):
+        """
+        Every saved link unpacks to exactly what json.load gives, compressed or not.
+        """
+        self.assertTrue(self.docs)
+        for path, doc in self.docs.items():
+            for compress in (True, False):
+                with self.subTest(path=path, compress=compress):
+                    packed = linkpack.dumps(doc, compress)
+                    self.assertTrue(linkpack.isPacked(packed))
+                    self.assertEqual(linkpack.loads(packed), doc)
+
+    def testOnlySomeCutscenes(self):
+        """
+        Unpacking only some cutscenes gives exactly those, and the same link-level information.
+        """
+        for path, doc in self.docs.items():
+            cids = set(sorted(doc["cutscenes"])[::2])
+            for compress in (True, False):
+                with self.subTest(path=path, compress=compress):
+                    loaded = linkpack.loads(linkpack.dumps(doc, compress), cids)
+                    expected = {cid: doc["cutscenes"][cid] for cid in cids}
+                    self.assertEqual(loaded, dict(doc, cutscenes=expected))
+                    self.assertEqual(linkpack.loads(linkpack.dumps(doc, compress), set())["cutscenes"], {})
+
+    def testUnpackedNodesAreNotShared(self):
+        """
+        Identical values are stored once, but unpacked nodes never share a container.
+        """
+        action = {"text": "Hi", "speaker": "Boy", "points": {"Void": 1}, "angle": {}, "emotion": ""}
+        doc = {"arcana": "Void", "cutscenes": {"1_0": {"id": "Void1_0", "items": [
+            [dict(action), 1], [dict(action)]
+        ]}}}
+        items = linkpack.loads(linkpack.dumps(doc))["cutscenes"]["1_0"]["items"]
+        items[0][0]["points"]["Void"] = 5
+        self.assertEqual(items[1][0]["points"], {"Void": 1})
+
+    def testWrongMagicIsRejected(self):
+        """
+        Anything not starting with the packed marker is rejected, JSON links included.
+        """
+        packed = linkpack.dumps(next(iter(self.docs.values())))
+        for data in (b"", b"PXS", b"XXSL" + packed[4:], json.dumps({"arcana": "Void"}).encode("utf-8")):
+            with self.subTest(data=data[:8]):
+                self.assertFalse(linkpack.isPacked(data))
+                with self.assertRaises(ValueError):
+                    linkpack.loads(data)
+
+    def testUnsupportedVersionIsRejected(self):
+        """
+        Links packed by a newer format version are rejected.
+        """
+        packed = bytearray(linkpack.dumps({"arcana": "Void"}))
+        packed[len(linkpack.MAGIC)] = linkpack.VERSION + 1
+        with self.assertRaises(ValueError):
+            linkpack.loads(bytes(packed))
+
+    def testTruncatedFileIsRejected(self):
+        """
+        Every truncation of a packed link raises a ValueError, never another error or a partial document.
+        """
+        doc = max(self.docs.values(), key=lambda doc: len(doc.get("cutscenes", {})))
+        for compress in (True, False):
+            packed = linkpack.dumps(doc, compress)
+            # Every cut through the first bytes, then a sample of cuts through the rest.
+            ends = set(range(len(linkpack.MAGIC), min(len(packed), 256)))
+            ends.update(range(256, len(packed), max(1, len(packed) // 400)))
+            ends.add(len(packed) - 1)
+            for end in sorted(ends):
+                with self.subTest(compress=compress, end=end):
+                    with self.assertRaises(ValueError):
+                        linkpack.loads(packed[:end])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+"""
+Tests for the headless cutscene validation, libs/lint.py.
+"""
+import json
+import unittest
+from unittest import mock
+
+from libs import json_reader, lint
+from libs.action import Info, Movement
+from libs.logictree import MathGraph
+from tests.helpers import TempDataTestCase
+
+
+def brokenGraph():
+    """
+    Build a cutscene with one of every problem.
+
+    :returns: the cutscene
+    :rtype: MathGraph
+    """
+    graph = MathGraph("Broken1_0")
+    with graph.batch():
+        for index, text in ((0, "Start"), (1, "Pick"), (2, "Other"), (3, "End"), (5, "Orphan")):
+            graph.addItem(Info(text), index)
+        graph.addItem(Movement(), 6)
+        for i, j in ((0, 1), (0, 2), (1, 3), (1, 4), (2, 9)):
+            graph.addRelation(i, j)
+    return graph
+
+
+BROKEN = [
+    (0, lint.NESTED_CHOICE, "option 1 is itself a choice"),
+    (1, lint.EMPTY_TARGET, "leads to 4, an empty slot"),
+    (2, lint.DANGLING, "leads to 9, past the last node"),
+    (4, lint.MISSING_ID, "empty slot" + lint.TRUNCATED),
+    (5, lint.UNREACHABLE, "can't be reached from the start"),
+    (6, lint.MISSING_ID, "Movement without an ID"),
+    (6, lint.UNREACHABLE, "can't be reached from the start"),
+]
+
+
+class TestLintGraph(unittest.TestCase):
+    """
+    Problems found in a single cutscene.
+    """
+    def testEveryRule(self):
+        """
+        Every kind of problem is found, by index.
+        """
+        self.assertEqual(lint.lintGraph(brokenGraph()), BROKEN)
+
+    def testClean(self):
+        """
+        A well-formed cutscene, loops and single-option chains included, has no problem.
+        """
+        graph = MathGraph("Clean").loadGraph([
+            [{"text": "Start"}, 1, 2], [{"text": "Left"}, 3], [{"text": "Right"}, 3],
+            [{"text": "Again?"}, 1, 4], [{"text": "End"}]
+        ])
+        self.assertEqual(lint.lintGraph(graph), [])
+        self.assertEqual(lint.lintGraph(MathGraph("Empty")), [])
+
+    def testFirstMissingID(self):
+        """
+        Only the first node without an ID cuts the ID list short, later ones are reported without it.
+        """
+        graph = MathGraph("IDs")
+        graph.addItem(Info("Start"), 0)
+        graph.addItem(Movement(), 1)
+        graph.addItem(Movement(), 2)
+        graph.addRelation(0, 1)
+        graph.addRelation(1, 2)
+        self.assertEqual(lint.lintGraph(graph), [
+            (1, lint.MISSING_ID, "Movement without an ID" + lint.TRUNCATED),
+            (2, lint.MISSING_ID, "Movement without an ID"),
+        ])
+
+
+class TestLintLinks(TempDataTestCase):
+    """
+    Linting saved links, in process or in parallel.
+    """
+    def setUp(self):
+        super().setUp()
+        doc = {"arcana": "Broken", "cutscenes": {"1_0": brokenGraph().toDict()}}
+        with open(json_reader.linkPath("Broken"), 'w') as linkfile:
+            json.dump(doc, linkfile)
+
+    def testLintLink(self):
+        """
+        Problems are reported with the link and cutscene they were found in.
+        """
+        expected = [lint.Problem("Broken", "1", "0", *problem) for problem in BROKEN]
+        self.assertEqual(lint.lintLink("Broken"), expected)
+        self.assertEqual(lint.lintAll(["Broken"]), expected)
+
+    def testSavedLinks(self):
+        """
+        The links saved with the application are clean.
+        """
+        with mock.patch.object(lint, "Pool", side_effect=AssertionError("Pool started")):
+            for arcana in json_reader.listLinks():
+                if arcana != "Broken":
+                    with self.subTest(arcana=arcana):
+                        self.assertEqual(lint.lintAll([arcana]), [])
+
+    def testPool(self):
+        """
+        Many links are linted in worker processes, with the same results in the same order as one by one.
+        """
+        arcanas = sorted(json_reader.listLinks())
+        self.assertGreater(len(arcanas), 2)
+        expected = [problem for arcana in arcanas for problem in lint.lintLink(arcana)]
+        self.assertTrue(expected)
+        with mock.patch.object(lint, "Pool", wraps=lint.Pool) as pool:
+            self.assertEqual(lint.lintAll(arcanas, processes=2), expected)
+        pool.assert_called_once_with(2)
+        with mock.patch.object(lint, "Pool", wraps=lint.Pool) as pool:
+            self.assertEqual(sorted(lint.lintAll(processes=2)), sorted(expected))
+        pool.assert_called_once_with(2)
+
+    def testReport(self):
+        """
+        Reports have a line per problem, saying where it is.
+        """
+        report = lint.formatReport(lint.lintLink("Broken")).split("\n")
+        self.assertEqual(len(report), len(BROKEN))
+        self.assertEqual(report[0],
+                         "Broken level 1 angle 0, node 0: [nested-choice] option 1 is itself a choice")
+        self.assertEqual(lint.formatReport([]), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
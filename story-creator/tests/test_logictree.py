@@ -0,0 +1,674 @@
+"""
+Tests for the cutscene graph, libs/logictree.py.
+"""
+import random
+import unittest
+from unittest import mock
+
+from libs import action
+from libs.logictree import MathGraph, strongComponents, BFS, DFS, POSTORDER
+
+
+def makeGraph(relations, size=None, labels=None):
+    """
+    Build a graph of Info nodes from the relations of each node.
+
+    :param dict relations: {index: [relations...]}
+    :param int size: number of nodes. Defaults to the number of labels, or one past the highest index in
+                     relations
+    :param list labels: text of each node. Defaults to the index of the node
+
+    :returns: the graph
+    :rtype: MathGraph
+    """
+    if size is None and labels is not None:
+        size = len(labels)
+    elif size is None:
+        size = max(max(relations), *(max(targets, default=0) for targets in relations.values())) + 1
+    if labels is None:
+        labels = [str(index) for index in range(size)]
+    return MathGraph("Test").loadGraph([[{"text": labels[index]}] + relations.get(index, [])
+                                        for index in range(size)])
+
+
+class TestSubTree(unittest.TestCase):
+    """
+    Subtrees: every node that can only be reached through a given node.
+    """
+    def testDiamond(self):
+        """
+        The two sides of a diamond own nothing past it, its top owns all of it.
+        """
+        graph = makeGraph({0: [1, 2], 1: [3], 2: [3], 3: [4]})
+        self.assertEqual(sorted(graph.subTree(0)), [0, 1, 2, 3, 4])
+        self.assertEqual(graph.subTree(1), [1])
+        self.assertEqual(graph.subTree(2), [2])
+        self.assertEqual(sorted(graph.subTree(3)), [3, 4])
+        self.assertEqual(graph.subTree(4), [4])
+
+    def testSharedChildren(self):
+        """
+        Children shared with another branch aren't part of a branch's subtree, even further down.
+        """
+        graph = makeGraph({0: [1, 2], 1: [3], 2: [4], 3: [5], 4: [5], 5: [6]})
+        self.assertEqual(sorted(graph.subTree(1)), [1, 3])
+        self.assertEqual(sorted(graph.subTree(2)), [2, 4])
+        graph = makeGraph({0: [1, 2], 1: [3, 4], 2: [3]})
+        self.assertEqual(sorted(graph.subTree(1)), [1, 4])
+
+    def testOrphans(self):
+        """
+        Orphans are entries of their own: what they lead to isn't owned by anything else.
+        """
+        graph = makeGraph({0: [1], 2: [1, 3]})
+        self.assertEqual(graph.subTree(0), [0])
+        self.assertEqual(sorted(graph.subTree(2)), [2, 3])
+        self.assertEqual(graph.subTree(1), [1])
+
+    def testUnreachable(self):
+        """
+        A loop reached by neither the first node nor an orphan is entered through its first node.
+        """
+        graph = makeGraph({0: [1], 2: [3], 3: [2, 4]})
+        self.assertEqual(sorted(graph.subTree(0)), [0, 1])
+        self.assertEqual(sorted(graph.subTree(2)), [2, 3, 4])
+        self.assertEqual(sorted(graph.subTree(3)), [3, 4])
+
+    def testOutOfRange(self):
+        """
+        Indexes past the last node are their own subtree.
+        """
+        graph = makeGraph({0: [1]})
+        self.assertEqual(graph.subTree(5), [5])
+
+
+class TestDeletion(unittest.TestCase):
+    """
+    Deleting nodes and relations.
+    """
+    def testDeleteNodesRemapsRelations(self):
+        """
+        Nodes after a deleted one move down, relations follow them and relations to deleted nodes go away.
+        """
+        graph = makeGraph({0: [1, 2], 1: [3], 2: [3], 3: [4, 9]}, labels=["a", "b", "c", "d", "e"])
+        remap = graph.deleteNodes([1, 4])
+        self.assertEqual(remap.tolist(), [0, -1, 1, 2, -1])
+        self.assertEqual(graph.size(), 3)
+        self.assertEqual(graph.getRelations(0), [1])
+        self.assertEqual(graph.getRelations(1), [2])
+        # Relations past the end stay past the end
+        self.assertEqual(graph.getRelations(2), [7])
+        self.assertEqual(graph.getPredecessors(2), [1])
+        self.assertEqual(graph.getPredecessors(1), [0])
+
+    def testDeleteNodesRemapsLabels(self):
+        """
+        IDs follow their nodes, repeated IDs are renumbered after their new index.
+        """
+        graph = makeGraph({0: [1], 1: [2], 2: [3]}, labels=["x", "y", "x", "z"])
+        self.assertEqual(graph.getIDs(), ["x", "y", "x2", "z"])
+        graph.deleteNodes([1])
+        self.assertEqual(graph.getIDs(), ["x", "x1", "z"])
+        self.assertEqual(graph.getIndex("z"), 2)
+        self.assertEqual(graph.getLabel(1), "x1")
+        self.assertIsNone(graph.getLabel(3))
+        with self.assertRaises(ValueError):
+            graph.getIndex("y")
+
+    def testDelRelationKeepsSharedNode(self):
+        """
+        Removing a relation leaves its target alone while something else still leads to it.
+        """
+        graph = makeGraph({0: [1, 2], 1: [3], 2: [3], 3: [4]})
+        self.assertIsNone(graph.delRelation(1, 3))
+        self.assertEqual(graph.size(), 5)
+        self.assertEqual(graph.getRelations(1), [])
+        self.assertEqual(graph.getPredecessors(3), [2])
+
+    def testDelRelationDeletesLastPath(self):
+        """
+        Removing the last relation to a node deletes it along with its subtree.
+        """
+        graph = makeGraph({0: [1, 2], 1: [3], 2: [3], 3: [4], 4: [5]}, size=7)
+        graph.delRelation(1, 3)
+        remap = graph.delRelation(2, 3)
+        self.assertEqual(remap.tolist(), [0, 1, 2, -1, -1, -1, 3])
+        self.assertEqual(graph.getIDs(), ["0", "1", "2", "6"])
+        self.assertEqual(graph.getRelations(0), [1, 2])
+        self.assertEqual(graph.getRelations(2), [])
+
+    def testDelRelationKeepsNodesReachedElsewhere(self):
+        """
+        Nodes below a deleted one that are also reached some other way are kept.
+        """
+        graph = makeGraph({0: [1, 2], 1: [3, 4], 2: [4]})
+        remap = graph.delRelation(0, 1)
+        self.assertEqual(remap.tolist(), [0, -1, 1, -1, 2])
+        self.assertEqual(graph.getIDs(), ["0", "2", "4"])
+        self.assertEqual(graph.getRelations(1), [2])
+
+
+class TestComponents(unittest.TestCase):
+    """
+    Strongly connected components and the loops they make.
+    """
+    def assertReverseTopological(self, graph):
+        """
+        Check that the components of a graph are what mutual reachability gives, numbered in reverse
+        topological order, and that the condensation matches the relations between them.
+
+        :param MathGraph graph: graph to check
+        """
+        component, members = graph.components()
+        successors = graph.condensation()
+        size = graph.size()
+        self.assertEqual(sorted(node for nodes in members for node in nodes), list(range(size)))
+        for comp, nodes in enumerate(members):
+            self.assertTrue(all(component[node] == comp for node in nodes))
+        reach = [graph.reachable(index) for index in range(size)]
+        for i in range(size):
+            for j in range(size):
+                self.assertEqual(component[i] == component[j], j in reach[i] and i in reach[j], (i, j))
+        expected = [set() for _ in members]
+        for i in range(size):
+            for j in graph.getRelations(i):
+                if j < size:
+                    self.assertLessEqual(component[j], component[i])
+                    if component[j] != component[i]:
+                        expected[component[i]].add(component[j])
+        self.assertEqual([set(following) for following in successors], expected)
+        self.assertEqual((component, members), strongComponents(*graph.adjacency()))
+
+    def testSelfLoop(self):
+        """
+        A node leading to itself is a loop of its own, endless only without another way out.
+        """
+        graph = makeGraph({0: [1], 1: [1, 2]})
+        self.assertEqual(graph.loops(), [[1]])
+        self.assertEqual(graph.endlessLoops(), [])
+        self.assertTrue(graph.inLoop(1))
+        self.assertFalse(graph.inLoop(1, endless=True))
+        self.assertFalse(graph.inLoop(0))
+        self.assertFalse(graph.inLoop(2))
+        graph = makeGraph({0: [1], 1: [1]})
+        self.assertEqual(graph.endlessLoops(), [[1]])
+        self.assertTrue(graph.inLoop(1, endless=True))
+        self.assertReverseTopological(graph)
+
+    def testLoopWithExit(self):
+        """
+        A loop that can reach an end node isn't endless.
+        """
+        graph = makeGraph({0: [1], 1: [2], 2: [1, 3]})
+        self.assertEqual([sorted(nodes) for nodes in graph.loops()], [[1, 2]])
+        self.assertEqual(graph.endlessLoops(), [])
+        self.assertTrue(graph.inLoop(2))
+        self.assertFalse(graph.inLoop(2, endless=True))
+        self.assertFalse(graph.inLoop(3))
+        self.assertReverseTopological(graph)
+
+    def testLoopWithoutExit(self):
+        """
+        A loop with no way out, or whose only ways out lead to other endless loops, is endless.
+        """
+        graph = makeGraph({0: [1], 1: [2], 2: [1]})
+        self.assertEqual([sorted(nodes) for nodes in graph.endlessLoops()], [[1, 2]])
+        self.assertTrue(graph.inLoop(1, endless=True))
+        self.assertFalse(graph.inLoop(0, endless=True))
+        graph = makeGraph({0: [1], 1: [0, 2], 2: [3], 3: [2]})
+        self.assertEqual(sorted(sorted(nodes) for nodes in graph.endlessLoops()), [[0, 1], [2, 3]])
+        self.assertReverseTopological(graph)
+
+    def testNestedLoops(self):
+        """
+        Loops inside loops are a single component.
+        """
+        graph = makeGraph({0: [1], 1: [2], 2: [3], 3: [2, 1, 4]})
+        self.assertEqual([sorted(nodes) for nodes in graph.loops()], [[1, 2, 3]])
+        self.assertEqual(graph.endlessLoops(), [])
+        component = graph.components()[0]
+        self.assertEqual(component[1], component[2])
+        self.assertEqual(component[2], component[3])
+        self.assertEqual(graph.condensation()[component[0]], [component[1]])
+        self.assertEqual(graph.condensation()[component[1]], [component[4]])
+        self.assertReverseTopological(graph)
+
+    def testRelationsPastTheEnd(self):
+        """
+        Relations leading past the last node are ignored, and so are indexes past it.
+        """
+        graph = makeGraph({0: [1, 5], 1: [0]}, size=2)
+        self.assertEqual([sorted(nodes) for nodes in graph.endlessLoops()], [[0, 1]])
+        self.assertFalse(graph.inLoop(5))
+        self.assertReverseTopological(graph)
+
+    def testChangesAreSeen(self):
+        """
+        Components are recomputed once the graph changes.
+        """
+        graph = makeGraph({0: [1], 1: [2]})
+        self.assertEqual(graph.loops(), [])
+        graph.addRelation(2, 1)
+        self.assertEqual([sorted(nodes) for nodes in graph.endlessLoops()], [[1, 2]])
+        graph.addRelation(2, 3)
+        graph.addItem(action.Info("End"), 3)
+        self.assertEqual(graph.endlessLoops(), [])
+
+    def testRandomGraphs(self):
+        """
+        Components of random graphs match mutual reachability, in reverse topological order.
+        """
+        rng = random.Random(19)
+        for case in range(200):
+            size = rng.randint(1, 12)
+            relations = {index: rng.sample(range(size), rng.randint(0, min(3, size)))
+                         for index in range(size)}
+            with self.subTest(case=case):
+                self.assertReverseTopological(makeGraph(relations, size=size))
+
+
+
+class TestPredecessors(unittest.TestCase):
+    """
+    The predecessor index, kept along with the relations.
+    """
+    def assertPredecessors(self, graph):
+        """
+        Check that the predecessors of every node are the nodes with a relation to it.
+
+        :param MathGraph graph: graph to check
+        """
+        targets = [relation for index in range(graph.size()) for relation in graph.getRelations(index)]
+        for index in range(max(targets + [graph.size()]) + 2):
+            expected = [pred for pred in range(graph.size()) if index in graph.getRelations(pred)]
+            self.assertEqual(sorted(graph.getPredecessors(index)), expected, "node " + str(index))
+
+    def testRandomChanges(self):
+        """
+        The index matches the relations through any sequence of changes, batched or not.
+        """
+        rng = random.Random(12)
+        for case in range(100):
+            graph = makeGraph({0: [1]})
+            for step in range(30):
+                size = max(graph.size(), 1)
+                kind = rng.random()
+                if kind < 0.3:
+                    graph.addItem(action.Info(str(step)), rng.randrange(size + 3))
+                elif kind < 0.6:
+                    graph.addRelation(rng.randrange(size), rng.randrange(size + 3))
+                elif kind < 0.7:
+                    relations = [(i, j) for i in range(size) for j in graph.getRelations(i)]
+                    if relations:
+                        graph.delRelation(*rng.choice(relations))
+                elif kind < 0.8:
+                    graph.deleteNodes(rng.sample(range(size), rng.randint(0, min(2, size - 1))))
+                elif kind < 0.9:
+                    with graph.batch():
+                        for _ in range(rng.randint(1, 4)):
+                            graph.addItem(action.Info("Batched"), rng.randrange(size + 2))
+                            graph.addRelation(rng.randrange(size), rng.randrange(size + 2))
+                else:
+                    graph = MathGraph("Reloaded").loadGraph(graph.toDict()["items"])
+                with self.subTest(case=case, step=step):
+                    self.assertPredecessors(graph)
+
+    def testIncremental(self):
+        """
+        Relations added one at a time update the index in place, a batch rebuilds it once at the end.
+        """
+        graph = makeGraph({0: [1], 1: [2]})
+        with mock.patch.object(graph, "_rebuildPredecessors", wraps=graph._rebuildPredecessors) as rebuild:
+            graph.addRelation(2, 0)
+            graph.addRelation(0, 2)
+            self.assertEqual(graph.getPredecessors(0), [2])
+            rebuild.assert_not_called()
+            with graph.batch():
+                graph.addRelation(1, 0)
+                graph.addRelation(2, 1)
+                rebuild.assert_not_called()
+            rebuild.assert_called_once_with()
+        self.assertPredecessors(graph)
+
+    def testRolledBack(self):
+        """
+        A batch that fails leaves the index as it was before the batch.
+        """
+        graph = makeGraph({0: [1], 1: [2]})
+        with self.assertRaises(ValueError):
+            with graph.batch():
+                graph.addRelation(2, 0)
+                graph.addRelation(0, -1)
+        self.assertEqual(graph.getPredecessors(0), [])
+        self.assertPredecessors(graph)
+
+
+def walk(graph, starts, order, skip=()):
+    """
+    Walk a graph the straightforward way, recursively for depth-first orders, see MathGraph.traverse.
+
+    :param MathGraph graph: graph to walk
+    :param list starts: indexes of the nodes to start from
+    :param str order: BFS, DFS or POSTORDER
+    :param iterable skip: nodes considered already visited
+
+    :returns: (index, depth) of every node reached, in order
+    :rtype: list[tuple]
+    """
+    size = graph.size()
+    visited = set(skip)
+    found = []
+
+    def visit(node, depth):
+        """
+        Walk a node depth-first.
+
+        :param int node: index of the node
+        :param int depth: depth of the node in the search tree
+        """
+        visited.add(node)
+        if order == DFS:
+            found.append((node, depth))
+        for target in graph.getRelations(node):
+            if target < size and target not in visited:
+                visit(target, depth + 1)
+        if order == POSTORDER:
+            found.append((node, depth))
+
+    for start in starts:
+        if not 0 <= start < size or start in visited:
+            continue
+        if order != BFS:
+            visit(start, 0)
+            continue
+        visited.add(start)
+        queue = [(start, 0)]
+        for node, depth in queue:
+            for target in graph.getRelations(node):
+                if target < size and target not in visited:
+                    visited.add(target)
+                    queue.append((target, depth + 1))
+        found.extend(queue)
+    return found
+
+
+class TestTraverse(unittest.TestCase):
+    """
+    Iterative graph walks, MathGraph.traverse.
+    """
+    def testOrders(self):
+        """
+        Each order lists nodes and depths the way a plain walk does.
+        """
+        graph = makeGraph({0: [1, 2], 1: [3], 2: [3, 4], 3: [0], 4: [9]}, size=5)
+        self.assertEqual(graph.traverse(0, BFS, depths=True), [(0, 0), (1, 1), (2, 1), (3, 2), (4, 2)])
+        self.assertEqual(graph.traverse(0, DFS, depths=True), [(0, 0), (1, 1), (3, 2), (2, 1), (4, 2)])
+        self.assertEqual(graph.traverse(0, POSTORDER, depths=True), [(3, 2), (1, 1), (4, 2), (2, 1), (0, 0)])
+        self.assertEqual(graph.traverse(2), [2, 3, 0, 1, 4])
+
+    def testStartsAndSkip(self):
+        """
+        Later starts skip what earlier ones reached, skipped nodes are neither listed nor walked through.
+        """
+        graph = makeGraph({0: [1], 1: [2], 3: [1, 4]})
+        self.assertEqual(graph.traverse([3, 0], DFS, depths=True),
+                         [(3, 0), (1, 1), (2, 2), (4, 1), (0, 0)])
+        self.assertEqual(graph.traverse([0, 3, -1, 7]), [0, 1, 2, 3, 4])
+        self.assertEqual(graph.traverse(3, skip=[1, 12]), [3, 4])
+        self.assertEqual(graph.traverse(1, skip=[1]), [])
+
+    def testRandomGraphs(self):
+        """
+        Walks of random graphs match plain walks, in every order.
+        """
+        rng = random.Random(14)
+        for case in range(200):
+            size = rng.randint(1, 12)
+            relations = {index: rng.sample(range(size + 2), rng.randint(0, 3)) for index in range(size)}
+            graph = makeGraph(relations, size=size)
+            starts = [rng.randrange(-1, size + 1) for _ in range(rng.randint(1, 3))]
+            skip = rng.sample(range(size), rng.randint(0, min(2, size)))
+            for order in (BFS, DFS, POSTORDER):
+                with self.subTest(case=case, order=order):
+                    self.assertEqual(graph.traverse(starts, order, skip, depths=True),
+                                     walk(graph, starts, order, skip))
+                    self.assertFalse(any(graph._visited)) #pylint: disable=protected-access
+
+    def testDeepGraph(self):
+        """
+        Long chains are walked without hitting the recursion limit.
+        """
+        size = 20000
+        graph = makeGraph({index: [index + 1] for index in range(size - 1)}, size=size)
+        for order in (BFS, DFS, POSTORDER):
+            with self.subTest(order=order):
+                walked = graph.traverse(0, order)
+                self.assertEqual(walked, list(range(size)) if order != POSTORDER else list(range(size))[::-1])
+
+    def testInterruptedWalk(self):
+        """
+        A walk interrupted midway doesn't leave nodes marked as visited for the next one.
+        """
+        graph = makeGraph({0: [1], 1: [2]})
+
+        def starts():
+            """
+            Start from the first node, then fail.
+            """
+            yield 0
+            raise RuntimeError("Interrupted")
+
+        with self.assertRaises(RuntimeError):
+            graph.traverse(starts())
+        self.assertEqual(graph.traverse(0), [0, 1, 2])
+
+    def testChangesAreSeen(self):
+        """
+        Walks follow the graph as it is, after changes.
+        """
+        graph = makeGraph({0: [1]})
+        self.assertEqual(graph.reachable(0), {0, 1})
+        graph.addRelation(1, 2)
+        graph.addItem(action.Info("2"), 2)
+        self.assertEqual(graph.reachable(0), {0, 1, 2})
+        graph.deleteNodes([1])
+        self.assertEqual(graph.reachable(0), {0})
+
+    def testReachable(self):
+        """
+        reachable and the older ywaysfromi give every node reached, the latter along with processed nodes.
+        """
+        graph = makeGraph({0: [1, 2], 1: [3], 2: [3], 4: [0]})
+        self.assertEqual(graph.reachable(0), {0, 1, 2, 3})
+        self.assertEqual(graph.reachable(4), {0, 1, 2, 3, 4})
+        self.assertEqual(graph.ywaysfromi(0), {0, 1, 2, 3})
+        self.assertEqual(graph.ywaysfromi(0, {1}), {0, 1, 2, 3})
+        self.assertEqual(graph.ywaysfromi(0, {2, 3}), {0, 1, 2, 3})
+        self.assertEqual(graph.ywaysfromi(4, {0}), {0, 4})
+
+
+class TestLabels(unittest.TestCase):
+    """
+    Node IDs, MathGraph.getIDs and the lookups built on them.
+    """
+    def testKinds(self):
+        """
+        Each kind of action is labelled by its own field, the first node without one ends the list.
+        """
+        graph = MathGraph("Labels")
+        graph.addItem(action.Info("Note"), 0)
+        graph.addItem(action.Speak("Hello", "Boy"), 1)
+        graph.addItem(action.Camera("Room"), 2)
+        graph.addItem(action.Movement("Girl"), 3)
+        graph.addItem(action.Info("After the gap"), 5)
+        self.assertEqual(graph.getIDs(), ["Note", "Hello", "Room", "Girl"])
+        self.assertIsNone(graph.getLabel(5))
+        with self.assertRaises(ValueError):
+            graph.getIndex("After the gap")
+
+    def testRepeatedIDs(self):
+        """
+        Repeated IDs get their index appended, and every listed ID leads back to its node.
+        """
+        graph = makeGraph({}, labels=["x", "y", "x", "x", "y"])
+        labels = graph.getIDs()
+        self.assertEqual(labels, ["x", "y", "x2", "x3", "y4"])
+        for index, label in enumerate(labels):
+            self.assertEqual(graph.getLabel(index), label)
+            self.assertEqual(graph.getIndex(label), index)
+        self.assertIsNone(graph.getLabel(-1))
+        self.assertIsNone(graph.getLabel(5))
+
+    def testCached(self):
+        """
+        IDs are worked out once, until the graph changes.
+        """
+        graph = makeGraph({0: [1]}, labels=["a", "b"])
+        with mock.patch.object(graph, "getOneID", wraps=graph.getOneID) as getOneID:
+            graph.getIDs()
+            graph.getIndex("b")
+            graph.getLabel(0)
+            self.assertEqual(getOneID.call_count, 2)
+            graph.addItem(action.Info("c"), 2)
+            self.assertEqual(graph.getIndex("c"), 2)
+            self.assertEqual(getOneID.call_count, 5)
+
+    def testChangesAreSeen(self):
+        """
+        Replacing, adding or deleting nodes changes the IDs.
+        """
+        graph = makeGraph({0: [1]}, labels=["a", "b"])
+        self.assertEqual(graph.getIndex("b"), 1)
+        graph.addItem(action.Info("a"), 1)
+        self.assertEqual(graph.getIDs(), ["a", "a1"])
+        graph.addItem(action.Info("b"), 2)
+        self.assertEqual(graph.getIndex("b"), 2)
+        graph.deleteNodes([0])
+        self.assertEqual(graph.getIDs(), ["a", "b"])
+        self.assertEqual(graph.getIndex("a"), 0)
+
+    def testCopies(self):
+        """
+        The list of IDs is the caller's own.
+        """
+        graph = makeGraph({0: [1]}, labels=["a", "b"])
+        labels = graph.getIDs()
+        labels.append("c")
+        labels[0] = "z"
+        self.assertEqual(graph.getIDs(), ["a", "b"])
+        self.assertEqual(graph.getIndex("a"), 0)
+        self.assertIsNot(graph.getIDs(), graph.getIDs())
+
+
+class TestBatch(unittest.TestCase):
+    """
+    Changes grouped into a single transaction, MathGraph.batch.
+    """
+    def testCommit(self):
+        """
+        A batch that goes through keeps every change, and validates the graph once.
+        """
+        graph = makeGraph({0: [1]})
+        with mock.patch.object(graph, "validate", wraps=graph.validate) as validate:
+            with graph.batch():
+                graph.addItem(action.Info("2"), 2)
+                graph.addRelation(1, 2)
+                graph.addRelation(2, 0)
+                validate.assert_not_called()
+            validate.assert_called_once_with()
+        self.assertEqual(graph.toDict()["items"],
+                         [[{"text": "0"}, 1], [{"text": "1"}, 2], [{"text": "2"}, 0]])
+        self.assertEqual(graph.getPredecessors(0), [2])
+
+    def testRollbackOnException(self):
+        """
+        An exception raised midway puts every node and relation back, and goes through.
+        """
+        graph = makeGraph({0: [1]})
+        before = graph.toDict()
+        with self.assertRaisesRegex(RuntimeError, "Midway"):
+            with graph.batch():
+                graph.addItem(action.Info("2"), 2)
+                graph.addRelation(1, 2)
+                graph.deleteNodes([0])
+                raise RuntimeError("Midway")
+        self.assertEqual(graph.toDict(), before)
+        self.assertEqual(graph.getPredecessors(1), [0])
+        self.assertEqual(graph.getIDs(), ["0", "1"])
+        self.assertEqual(graph.reachable(0), {0, 1})
+
+    def testRollbackOnInvalidGraph(self):
+        """
+        A batch leaving the graph invalid raises ValueError and puts it back.
+        """
+        graph = makeGraph({0: [1]})
+        before = graph.toDict()
+        for change in (lambda: graph.addRelation(0, -3), lambda: graph.addItem("Not an action", 1)):
+            with self.subTest(change=change):
+                with self.assertRaises(ValueError):
+                    with graph.batch():
+                        graph.addItem(action.Info("2"), 2)
+                        change()
+                self.assertEqual(graph.toDict(), before)
+
+    def testNested(self):
+        """
+        Nested batches are part of the outermost one: nothing is validated before it ends, and everything is
+        rolled back with it.
+        """
+        graph = makeGraph({0: [1]})
+        before = graph.toDict()
+        with mock.patch.object(graph, "validate", wraps=graph.validate) as validate:
+            with self.assertRaises(RuntimeError):
+                with graph.batch():
+                    with graph.batch():
+                        graph.addRelation(1, 0)
+                    validate.assert_not_called()
+                    graph.addItem(action.Info("2"), 2)
+                    raise RuntimeError("Outer")
+        self.assertEqual(graph.toDict(), before)
+        with graph.batch():
+            with graph.batch():
+                graph.addRelation(1, 0)
+        self.assertEqual(graph.getPredecessors(0), [1])
+
+
+class TestGraphRows(unittest.TestCase):
+    """
+    The list-of-rows view of a graph, MathGraph.items.
+    """
+    def testRows(self):
+        """
+        Rows are [action, relations...], every row having an action first, None for empty slots.
+        """
+        graph = MathGraph("Rows").loadGraph([[{"text": "Start"}, 2, 3], [], [{"text": "End"}]])
+        rows = graph.items
+        self.assertEqual(len(rows), 3)
+        self.assertIs(rows[0][0], graph.getItem(0))
+        self.assertEqual(rows[0][1:], [2, 3])
+        self.assertEqual(rows[1], [None])
+        self.assertEqual(rows[-1], [graph.getItem(2)])
+        self.assertEqual([row[0] for row in rows], [graph.getItem(0), None, graph.getItem(2)])
+        self.assertEqual(rows[1:], [[None], [graph.getItem(2)]])
+
+    def testPastTheEnd(self):
+        """
+        Reading past the end gives an empty slot, without growing the graph.
+        """
+        graph = makeGraph({0: [1]})
+        self.assertEqual(graph.items[5], [None])
+        self.assertEqual(graph.size(), 2)
+
+    def testReadOnly(self):
+        """
+        Rows are copies, changing one doesn't change the graph.
+        """
+        graph = makeGraph({0: [1]})
+        graph.items[0].append(0)
+        self.assertEqual(graph.getRelations(0), [1])
+        with self.assertRaises(TypeError):
+            graph.items[0] = [action.Info("Replaced")] #pylint: disable=unsupported-assignment-operation
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+"""
+Tests for the Monte Carlo playthroughs, libs/montecarlo.py.
+"""
+import unittest
+from unittest import mock
+
+from libs import json_reader, montecarlo
+from libs.ranges import POINTS
+from tests.helpers import TempDataTestCase
+
+
+def summary(results):
+    """
+    Get what matters of simulation results, for comparisons.
+
+    :param dict results: {(arcana, level_angle): Distribution}
+
+    :returns: {(arcana, level_angle): (runs, unfinished, histograms)}
+    :rtype: dict
+    """
+    return {key: (distribution.runs, distribution.unfinished, distribution.histograms)
+            for key, distribution in results.items()}
+
+
+class TestSimulation(TempDataTestCase):
+    """
+    Simulating saved links.
+    """
+    def testInProcess(self):
+        """
+        A single process, or a single chunk to play, doesn't start a pool.
+        """
+        with mock.patch.object(montecarlo, "Pool", side_effect=AssertionError("Pool started")):
+            results = montecarlo.simulateAll(montecarlo.CHUNK * 2, arcanas=["Empress"], processes=1)
+            self.assertEqual(results[("Empress", "1_0")].runs, montecarlo.CHUNK * 2)
+            with mock.patch.object(json_reader, "listCutscenes", return_value=["2_0"]):
+                results = montecarlo.simulateAll(10, arcanas=["Empress"], processes=4)
+        self.assertEqual(results[("Empress", "2_0")].runs, 10)
+        self.assertEqual(montecarlo._GRAPHS, {}) #pylint: disable=protected-access
+
+    def testSameForAnyNumberOfProcesses(self):
+        """
+        Results only depend on the seed.
+        """
+        runs = montecarlo.CHUNK + 100
+        single = montecarlo.simulateAll(runs, 3, arcanas=["Empress"], processes=1, limit=200)
+        pooled = montecarlo.simulateAll(runs, 3, arcanas=["Empress"], processes=2, limit=200)
+        self.assertEqual(summary(single), summary(pooled))
+        self.assertEqual(sum(single[("Empress", "1_0")].histograms[(POINTS, "Empress")].values()), runs)
+
+    def testSeedsAreKeptApart(self):
+        """
+        Every seed, negative ones included, plays differently, and always the same way.
+        """
+        simulateChunk = montecarlo._simulateChunk #pylint: disable=protected-access
+        histograms = {}
+        for seed in (-2, -1, 0, 1, 2**32 - 1, -2**32):
+            task = ("Empress", "1_0", 0, 200, seed, montecarlo.uniform, montecarlo.LIMIT)
+            histogram = simulateChunk(task).histograms
+            self.assertEqual(simulateChunk(task).histograms, histogram)
+            histograms[seed] = histogram[(POINTS, "Empress")]
+        found = list(histograms.values())
+        for position, histogram in enumerate(found):
+            self.assertNotIn(histogram, found[position + 1:])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+"""
+Tests for the persistent Persona and character name indexes, libs/nameindex.py.
+"""
+import json
+import os
+import unittest
+from unittest import mock
+
+from libs import json_reader, nameindex
+from libs.creatures import Character
+from tests.helpers import TempDataTestCase
+
+
+class TestNameIndex(TempDataTestCase):
+    """
+    Indexes over an entity directory of the temporary data directory, which starts out missing.
+    """
+    def setUp(self):
+        super().setUp()
+        self.index = nameindex.NameIndex('pers', ('arcana', 'level'))
+        self.directory = json_reader.buildPath('data/pers')
+
+    def writeEntity(self, name, mtime=None, **fields):
+        """
+        Write an entity file directly, as something other than the application would.
+
+        :param str name: name of the entity
+        :param int mtime: modification time to give the file, in nanoseconds. Defaults to now
+        :param fields: content of the entity
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, name + '.json')
+        with open(path, 'w') as entity:
+            json.dump(dict(fields, name=name), entity)
+        if mtime is not None:
+            os.utime(path, ns=(mtime, mtime))
+
+    def testMissingDirectory(self):
+        """
+        A directory that doesn't exist yet has nothing in it, and is picked up once created.
+        """
+        self.assertEqual(self.index.get(), {})
+        self.assertEqual(self.index.names(), [])
+        self.writeEntity("Alice", arcana="Death", level="56")
+        self.assertEqual(self.index.names(), ["Alice"])
+
+    def testAddedFile(self):
+        """
+        Files added behind the application's back are indexed.
+        """
+        self.writeEntity("Alice", arcana="Death", level="56")
+        self.assertEqual(self.index.get(), {"Alice": {"arcana": "Death", "level": "56"}})
+        self.writeEntity("Jack", arcana="Magician", level="8")
+        self.assertEqual(self.index.names(), ["Alice", "Jack"])
+        self.assertEqual(self.index.get()["Jack"], {"arcana": "Magician", "level": "8"})
+
+    def testEditedFile(self):
+        """
+        Files edited in place, which doesn't change the directory, are indexed again.
+        """
+        self.writeEntity("Alice", 1000000000, arcana="Death", level="56")
+        self.writeEntity("Jack", 1000000000, arcana="Magician", level="8")
+        self.assertEqual(self.index.get()["Alice"]["level"], "56")
+        stamp = os.stat(self.directory).st_mtime_ns
+        self.writeEntity("Alice", 2000000000, arcana="Death", level="60")
+        self.assertEqual(os.stat(self.directory).st_mtime_ns, stamp)
+        with mock.patch.object(json_reader, "readOne", wraps=json_reader.readOne) as readOne:
+            self.assertEqual(self.index.get()["Alice"]["level"], "60")
+        readOne.assert_called_once_with("Alice", 'pers')
+
+    def testRemovedFile(self):
+        """
+        Files removed behind the application's back leave the index.
+        """
+        self.writeEntity("Alice", arcana="Death", level="56")
+        self.writeEntity("Jack", arcana="Magician", level="8")
+        self.assertEqual(self.index.names(), ["Alice", "Jack"])
+        os.remove(os.path.join(self.directory, "Jack.json"))
+        self.assertEqual(self.index.names(), ["Alice"])
+
+    def testIndexIsPersisted(self):
+        """
+        A new index over an unchanged directory is loaded from the index file, without reading any entity.
+        """
+        self.writeEntity("Alice", arcana="Death", level="56")
+        expected = self.index.get()
+        with mock.patch.object(json_reader, "readOne", side_effect=AssertionError("Entity read")):
+            self.assertEqual(nameindex.NameIndex('pers', ('arcana', 'level')).get(), expected)
+
+    def testInterruptedSave(self):
+        """
+        A save that fails midway leaves the previous index file intact.
+        """
+        self.writeEntity("Alice", arcana="Death", level="56")
+        self.index.get()
+        with open(self.index.path()) as indexfile:
+            saved = indexfile.read()
+        self.writeEntity("Jack", arcana="Magician", level="8")
+        with mock.patch.object(os, "replace", side_effect=OSError("Disk full")):
+            with self.assertRaises(OSError):
+                self.index.get()
+        with open(self.index.path()) as indexfile:
+            self.assertEqual(indexfile.read(), saved)
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         [nameindex.INDEX_NAME, "Alice.json", "Jack.json"])
+
+    def testWritesAndDeletes(self):
+        """
+        Entities written or deleted through json_reader are indexed right away.
+        """
+        os.makedirs(json_reader.buildPath('data/chars'))
+        json_reader.writeOne(Character("Boy", "A boy", True), 'chars')
+        self.assertEqual(json_reader.readCharIndex(), {"Boy": {"important": True}})
+        json_reader.writeOne(Character("Boy", "A boy", False), 'chars')
+        self.assertEqual(json_reader.readCharIndex(), {"Boy": {"important": False}})
+        json_reader.deleteChar("Boy")
+        self.assertEqual(json_reader.readCharNames(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,236 @@
+"""
+Tests for the point and angle range analysis, libs/ranges.py, against libs/playback.py.
+"""
+import random
+import unittest
+
+from libs.action import Info, Speak
+from libs.logictree import MathGraph
+from libs.playback import Playback, CHOICE, END
+from libs.ranges import analyse, INFINITY, POINTS, ANGLE
+
+LIMIT = 40 # Nodes played before a playthrough is considered to be in a loop
+
+
+def playthroughs(graph):
+    """
+    Play every complete playthrough of a cutscene, by trying every option of every choice.
+
+    :param MathGraph graph: cutscene to play
+
+    :returns: (choices, points, angle) of every playthrough reaching an end node, None if a loop can be
+              reached (there would be no end to them)
+    :rtype: list[tuple]|None
+    """
+    found = []
+    pending = [[]]
+    while pending:
+        choices = pending.pop()
+        playback = Playback(graph)
+        picks = iter(choices)
+        try:
+            while True:
+                if len(playback.history) > LIMIT:
+                    return None
+                step = playback.step()
+                if step.kind == END:
+                    found.append((choices, dict(playback.points), dict(playback.angle)))
+                    break
+                if step.kind != CHOICE:
+                    playback.advance()
+                    continue
+                choice = next(picks, None)
+                if choice is None:
+                    pending.extend(choices + [option] for option in range(len(step.choices)))
+                    break
+                playback.advance(choice)
+        except ValueError:
+            # Empty slot or relation past the end: not a playthrough
+            continue
+    return found
+
+
+def replay(graph, choices):
+    """
+    Play a cutscene picking given options.
+
+    :param MathGraph graph: cutscene to play
+    :param list[int] choices: position of the option picked at every choice
+
+    :returns: the finished playback
+    :rtype: Playback
+    """
+    picks = iter(choices)
+    return Playback(graph).run(lambda step: next(picks))
+
+
+def makeGraph(rows):
+    """
+    Build a cutscene from its nodes and their relations.
+
+    :param list rows: (action, [relations...]) of every node, None for empty slots
+
+    :returns: the cutscene
+    :rtype: MathGraph
+    """
+    graph = MathGraph("Test")
+    with graph.batch():
+        for index, row in enumerate(rows):
+            if row is None:
+                continue
+            graph.addItem(row[0], index)
+            for relation in row[1]:
+                graph.addRelation(index, relation)
+    return graph
+
+
+def speak(points=0, angle=0):
+    """
+    Make a Speak action giving Aeon points and Void angle.
+
+    :param int points: Aeon points given
+    :param int angle: Void angle given
+
+    :returns: the action
+    :rtype: Speak
+    """
+    return Speak("Line", "Someone", {"Aeon": points} if points else {}, {"Void": angle} if angle else {})
+
+
+class TestEnumeration(unittest.TestCase):
+    """
+    Ranges of small cutscenes match what trying every playthrough gives.
+    """
+    def randomGraph(self, rng):
+        """
+        Make a random cutscene of a few nodes, with empty slots, relations past the end and loops.
+
+        :param Random rng: random number generator
+
+        :returns: the cutscene
+        :rtype: MathGraph
+        """
+        size = rng.randint(1, 9)
+        acyclic = rng.random() < 0.6
+        rows = []
+        for index in range(size):
+            if rng.random() < 0.07:
+                rows.append(None)
+                continue
+            if rng.random() < 0.6:
+                act = speak(rng.randint(-3, 3) if rng.random() < 0.7 else 0,
+                            rng.randint(-2, 2) if rng.random() < 0.4 else 0)
+            else:
+                act = Info("Info " + str(index))
+            relations = []
+            for _ in range(rng.choice([0, 1, 1, 2, 3])):
+                target = rng.randrange(size + 1)
+                if (not acyclic or target > index) and target not in relations:
+                    relations.append(target)
+            rows.append((act, relations))
+        return makeGraph(rows)
+
+    def testRandomCutscenes(self):
+        """
+        Totals, number of playthroughs and best/worst choices match exhaustive playback.
+        """
+        rng = random.Random(22)
+        checked = 0
+        for case in range(1500):
+            graph = self.randomGraph(rng)
+            runs = playthroughs(graph)
+            if runs is None:
+                continue
+            checked += 1
+            ranges = analyse(graph)
+            with self.subTest(case=case, items=graph.toDict()["items"]):
+                self.assertEqual(ranges.paths, len(runs))
+                for kind, totals in ((POINTS, 1), (ANGLE, 2)):
+                    arcanas = {arcana for run in runs for arcana in run[totals]}
+                    self.assertLessEqual(arcanas, set(getattr(ranges, kind)))
+                    for arcana in getattr(ranges, kind):
+                        values = [run[totals].get(arcana, 0) for run in runs]
+                        self.assertTrue(values)
+                        self.assertEqual(getattr(ranges, kind)[arcana], (min(values), max(values)))
+                        best = replay(graph, ranges.best(kind, arcana))
+                        worst = replay(graph, ranges.worst(kind, arcana))
+                        self.assertTrue(best.finished and worst.finished)
+                        self.assertEqual(getattr(best, kind).get(arcana, 0), max(values))
+                        self.assertEqual(getattr(worst, kind).get(arcana, 0), min(values))
+                self.assertIs(analyse(graph), ranges)
+        self.assertGreater(checked, 1000)
+
+
+class TestLoops(unittest.TestCase):
+    """
+    Loops that can be played for more, for nothing, or never left.
+    """
+    def testPositiveLoop(self):
+        """
+        A loop giving points can be played forever for more: the highest total is unbounded.
+        """
+        graph = makeGraph([
+            (Info("Start"), [1, 2]),
+            (speak(1), [0]),
+            (Info("End"), []),
+        ])
+        ranges = analyse(graph)
+        self.assertEqual(ranges.points["Aeon"], (0, INFINITY))
+        self.assertEqual(ranges.paths, INFINITY)
+        self.assertIsNone(ranges.best(POINTS, "Aeon"))
+        self.assertEqual(ranges.worst(POINTS, "Aeon"), [1])
+        self.assertEqual(replay(graph, [0, 0, 0, 1]).points, {"Aeon": 3})
+
+    def testZeroSumLoop(self):
+        """
+        A loop giving nothing overall is never worth going around: the shortest playthrough is picked.
+        """
+        graph = makeGraph([
+            (Info("Start"), [1, 3]),
+            (speak(2), [2]),
+            (speak(-2), [0]),
+            (speak(1), [4]),
+            (Info("End"), []),
+        ])
+        ranges = analyse(graph)
+        self.assertEqual(ranges.points["Aeon"], (1, 1))
+        self.assertEqual(ranges.paths, INFINITY)
+        self.assertEqual(ranges.best(POINTS, "Aeon"), [1])
+        self.assertEqual(ranges.worst(POINTS, "Aeon"), [1])
+        self.assertEqual(replay(graph, [0, 0, 1]).points, {"Aeon": 1})
+
+    def testDeadEnd(self):
+        """
+        Playthroughs caught in a loop that never ends don't count, nor does anything only they give.
+        """
+        graph = makeGraph([
+            (Info("Start"), [1, 4]),
+            (speak(5, 3), [2]),
+            (Info("Loop"), [3]),
+            (Info("Loop"), [2]),
+            (speak(1), []),
+        ])
+        ranges = analyse(graph)
+        self.assertEqual(ranges.points, {"Aeon": (1, 1)})
+        self.assertEqual(ranges.angle, {"Void": (0, 0)})
+        self.assertEqual(ranges.paths, 1)
+        self.assertEqual(ranges.best(POINTS, "Aeon"), [1])
+        self.assertEqual(ranges.best(ANGLE, "Void"), [1])
+
+    def testNoEnd(self):
+        """
+        A cutscene that can never end has no totals and no best playthrough.
+        """
+        graph = makeGraph([
+            (speak(1), [1]),
+            (speak(1), [0]),
+        ])
+        ranges = analyse(graph)
+        self.assertEqual(ranges.points, {})
+        self.assertEqual(ranges.paths, 0)
+        self.assertIsNone(ranges.best(POINTS, "Aeon"))
+        self.assertIsNone(ranges.worst(POINTS, "Aeon"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+"""
+Tests for the sharded link layout of libs/json_reader.py: one file per cutscene in data/{arcana}/.
+"""
+import os
+import unittest
+
+from libs import json_reader
+from libs.action import Info
+from libs.sls import SocialLink
+from tests.helpers import TempDataTestCase
+
+PAST = 1000000000 # Modification time given to files that shouldn't be written again
+
+
+class TestShards(TempDataTestCase):
+    """
+    Migrating a link to shards and editing it.
+    """
+    def setUp(self):
+        super().setUp()
+        self.before = json_reader.readLink("Void")
+        SocialLink("Void").save(sharded=True)
+
+    def testMigration(self):
+        """
+        A single-file link migrated to shards reads back the same, from one file per cutscene.
+        """
+        self.assertTrue(json_reader.isShardedLink("Void"))
+        self.assertFalse(os.path.exists(json_reader.linkPath("Void")))
+        self.assertEqual(json_reader.readLink("Void"), self.before)
+        self.assertIn("Void", json_reader.listLinks())
+        expected = [json_reader.shardPath("Void", cid) for cid in self.before["cutscenes"]]
+        self.assertEqual(json_reader.linkFiles("Void"), sorted(expected + [json_reader.shardPath("Void")]))
+        self.assertEqual(sorted(json_reader.listCutscenes("Void")), sorted(self.before["cutscenes"]))
+        self.assertEqual(json_reader.readCutscene("Void", "2_0"), self.before["cutscenes"]["2_0"])
+
+    def testEditTouchesOneShard(self):
+        """
+        Saving an edit to one cutscene only rewrites that cutscene's file, and maybe the link-level one.
+        """
+        for path in json_reader.linkFiles("Void"):
+            os.utime(path, ns=(PAST, PAST))
+        link = SocialLink("Void", ["1_0"])
+        link.cutscenes["1_0"].addItem(Info("Edited"), 1)
+        link.save()
+        for path in json_reader.linkFiles("Void"):
+            if os.path.basename(path) != "link.json":
+                with self.subTest(path=os.path.basename(path)):
+                    self.assertEqual(os.stat(path).st_mtime_ns != PAST, os.path.basename(path) == "1_0.json")
+        after = json_reader.readLink("Void")
+        self.assertEqual(after["cutscenes"]["1_0"], link.cutscenes["1_0"].toDict())
+        self.before["cutscenes"]["1_0"] = after["cutscenes"]["1_0"]
+        self.assertEqual(after, self.before)
+
+    def testJournalCompactsIntoShards(self):
+        """
+        Journaled edits are folded into the files of the cutscenes they touch only.
+        """
+        for path in json_reader.linkFiles("Void"):
+            os.utime(path, ns=(PAST, PAST))
+        link = SocialLink("Void", ["2_0"])
+        link.cutscenes["2_0"].addItem(Info("Journaled"), 0)
+        link.saveNode(2, 0, 0)
+        json_reader.compactLink("Void")
+        self.assertFalse(os.path.exists(json_reader.journalPath("Void")))
+        for path in json_reader.linkFiles("Void"):
+            with self.subTest(path=os.path.basename(path)):
+                self.assertEqual(os.stat(path).st_mtime_ns != PAST, os.path.basename(path) == "2_0.json")
+        self.assertEqual(json_reader.readCutscene("Void", "2_0"), link.cutscenes["2_0"].toDict())
+
+    def testBackToSingleFile(self):
+        """
+        A sharded link saved as a single file again loses its shard directory.
+        """
+        SocialLink("Void").save(sharded=False)
+        self.assertFalse(json_reader.isShardedLink("Void"))
+        self.assertFalse(os.path.exists(os.path.dirname(json_reader.shardPath("Void"))))
+        self.assertEqual(json_reader.readLink("Void"), self.before)
+
+
+if __name__ == "__main__":
+    unittest.main()
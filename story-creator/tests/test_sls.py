@@ -0,0 +1,197 @@
+"""
+Tests for social links and their lazily loaded cutscenes, libs/sls.py.
+"""
+import json
+import os
+import unittest
+from unittest import mock
+
+from libs import json_reader
+from libs.action import Info
+from libs.logictree import MathGraph
+from libs.sls import LazyCutscenes, SocialLink
+from tests.helpers import TempDataTestCase
+
+
+class TestLazyCutscenes(TempDataTestCase):
+    """
+    Cutscenes only read and built on first access.
+    """
+    def setUp(self):
+        super().setUp()
+        with open(json_reader.linkPath("Void")) as linkfile:
+            self.saved = json.load(linkfile)["cutscenes"]
+
+    def testNothingReadOnOpen(self):
+        """
+        Opening a link reads and builds none of its cutscenes, accessing one only reads and builds that one.
+        """
+        with mock.patch.object(json_reader, "readCutscenes", wraps=json_reader.readCutscenes) as reader:
+            link = SocialLink("Void")
+            self.assertEqual(sorted(link.cutscenes), sorted(self.saved))
+            reader.assert_not_called()
+            self.assertFalse(any(link.cutscenes.isBuilt(cid) for cid in link.cutscenes))
+            graph = link.cutscenes["2_0"]
+            self.assertIs(link.cutscenes["2_0"], graph)
+        reader.assert_called_once_with("Void", ["2_0"])
+        self.assertEqual([cid for cid in link.cutscenes if link.cutscenes.isBuilt(cid)], ["2_0"])
+        self.assertEqual(graph.toDict(), self.saved["2_0"])
+
+    def testPartialLink(self):
+        """
+        A link opened with only some cutscenes never lists, reads or builds the others.
+        """
+        with mock.patch.object(json_reader, "readCutscenes", wraps=json_reader.readCutscenes) as reader:
+            link = SocialLink("Void", ["1_0", "9_9"])
+            self.assertTrue(link.partial)
+            self.assertEqual(list(link.cutscenes), ["1_0"])
+            self.assertEqual(link.cutscenes["1_0"].toDict(), self.saved["1_0"])
+        reader.assert_called_once_with("Void", ["1_0"])
+        self.assertEqual(link.cutsceneKeys(), sorted(self.saved))
+        self.assertEqual(SocialLink("Void", []).cutscenes.entries, {})
+
+    def testToDict(self):
+        """
+        Dumps include unread cutscenes as stored, unless left out, without building them.
+        """
+        link = SocialLink("Void")
+        link.cutscenes["1_0"].addItem(Info("Edited"), 0)
+        edited = link.cutscenes["1_0"].toDict()
+        self.assertEqual(link.cutscenes.toDict(unread=False), {"1_0": edited})
+        self.assertEqual(link.cutscenes.toDict(), dict(self.saved, **{"1_0": edited}))
+        self.assertEqual([cid for cid in link.cutscenes if link.cutscenes.isBuilt(cid)], ["1_0"])
+
+    def testUnreadReadAtOnce(self):
+        """
+        Dumping a link reads every cutscene it never accessed in a single pass over the link file, packed or
+        not.
+        """
+        for packed in (False, True):
+            SocialLink("Void").save(packed=packed)
+            link = SocialLink("Void")
+            link.cutscenes["1_0"] #pylint: disable=pointless-statement
+            #pylint: disable=protected-access
+            with mock.patch.object(json_reader, "_iterLinkFile", wraps=json_reader._iterLinkFile) as files, \
+                 mock.patch.object(json_reader.linkpack, "loads", wraps=json_reader.linkpack.loads) as unpack:
+                with self.subTest(packed=packed):
+                    self.assertEqual(link.cutscenes.toDict(), self.saved)
+                    files.assert_called_once_with("Void", set(self.saved) - {"1_0"})
+                    self.assertEqual(unpack.call_count, int(packed))
+
+    def testMissingCutscene(self):
+        """
+        A cutscene gone from storage raises KeyError on access and is left out of dumps.
+        """
+        cutscenes = LazyCutscenes({"1_0": None, "2_0": None},
+                                  lambda cids: {cid: self.saved[cid] for cid in cids if cid == "1_0"})
+        with self.assertRaises(KeyError):
+            cutscenes["2_0"] #pylint: disable=pointless-statement
+        self.assertIsInstance(cutscenes["1_0"], MathGraph)
+        self.assertEqual(cutscenes.toDict(), {"1_0": self.saved["1_0"]})
+        self.assertEqual(sorted(cutscenes), ["1_0", "2_0"])
+
+    def testPartialSaveKeepsUnread(self):
+        """
+        Saving a partially loaded link keeps the cutscenes it didn't load, as they were.
+        """
+        link = SocialLink("Void", ["1_0"])
+        link.cutscenes["1_0"].addItem(Info("Edited"), 0)
+        link.save()
+        after = json_reader.readLink("Void")
+        self.assertEqual(after["cutscenes"], dict(self.saved, **{"1_0": link.cutscenes["1_0"].toDict()}))
+
+    def testContentHashes(self):
+        """
+        Unread cutscenes are hashed from the manifest, without being read, the same as once read.
+        """
+        link = SocialLink("Void")
+        with mock.patch.object(json_reader, "readCutscenes", side_effect=AssertionError("Cutscene read")):
+            hashes = link.cutscenes.contentHashes()
+        self.assertEqual(hashes, {cid: json_reader.contentHash(raw) for cid, raw in self.saved.items()})
+        for cid in link.cutscenes:
+            link.cutscenes[cid] #pylint: disable=pointless-statement
+        self.assertEqual(link.cutscenes.contentHashes(), hashes)
+        self.assertEqual(link.digest, link.contentHash())
+
+
+
+class TestBatch(TempDataTestCase):
+    """
+    Changes to a link and its cutscenes grouped into a single save, SocialLink.batch.
+    """
+    def setUp(self):
+        super().setUp()
+        self.link = SocialLink("Void")
+        with open(json_reader.linkPath("Void"), 'rb') as linkfile:
+            self.saved = linkfile.read()
+
+    def assertUnchanged(self):
+        """
+        Check that the link, in memory and on disk, is as it was loaded.
+        """
+        self.assertEqual(json_reader.linkToDict(self.link), json_reader.readLink("Void"))
+        self.assertEqual(self.link.contentHash(), self.link.digest)
+        with open(json_reader.linkPath("Void"), 'rb') as linkfile:
+            self.assertEqual(linkfile.read(), self.saved)
+        self.assertFalse(os.path.exists(json_reader.journalPath("Void")))
+
+    def testSavedOnce(self):
+        """
+        Every change is saved at once when the batch ends, and nothing is journaled in the meantime.
+        """
+        with mock.patch.object(json_reader, "writeLink", wraps=json_reader.writeLink) as writeLink:
+            with self.link.batch():
+                self.link.info = "Batched"
+                graph = self.link.startLink(3, 0)
+                graph.addItem(Info("New"), 0)
+                self.link.saveNode(3, 0, 0)
+                self.link.cutscenes["1_0"].addItem(Info("Edited"), 0)
+                self.link.saveCutscene(1, 0)
+                with self.link.batch():
+                    self.link.pseudoname = "Nested"
+                writeLink.assert_not_called()
+            writeLink.assert_called_once_with(self.link, None, None)
+        self.assertFalse(os.path.exists(json_reader.journalPath("Void")))
+        saved = json_reader.readLink("Void")
+        self.assertEqual((saved["info"], saved["pseudoname"]), ("Batched", "Nested"))
+        self.assertEqual(saved["cutscenes"]["3_0"], graph.toDict())
+        self.assertEqual(saved["cutscenes"]["1_0"], self.link.cutscenes["1_0"].toDict())
+
+    def testRollbackOnException(self):
+        """
+        An exception raised midway puts the link and its cutscenes back, and nothing is saved.
+        """
+        self.link.cutscenes["2_0"] #pylint: disable=pointless-statement
+        with mock.patch.object(json_reader, "writeLink") as writeLink:
+            with self.assertRaisesRegex(RuntimeError, "Midway"):
+                with self.link.batch():
+                    self.link.info = "Batched"
+                    self.link.cutinfo["1_0"] = "Batched"
+                    self.link.startLink(3, 0).addItem(Info("New"), 0)
+                    self.link.cutscenes["2_0"].addItem(Info("Edited"), 0)
+                    self.link.cutscenes["1_0"].addRelation(0, 0)
+                    del self.link.cutscenes["10_5"]
+                    raise RuntimeError("Midway")
+        writeLink.assert_not_called()
+        self.assertFalse(self.link.batching)
+        self.assertUnchanged()
+
+    def testRollbackOnInvalidCutscene(self):
+        """
+        A cutscene left invalid, even one first read during the batch, raises ValueError and rolls everything
+        back.
+        """
+        with mock.patch.object(json_reader, "writeLink") as writeLink:
+            with self.assertRaises(ValueError):
+                with self.link.batch():
+                    self.link.info = "Batched"
+                    self.link.cutscenes["1_0"].addRelation(0, -1)
+        writeLink.assert_not_called()
+        self.assertUnchanged()
+        with self.link.batch():
+            self.link.info = "Valid"
+        self.assertEqual(json_reader.readLink("Void")["info"], "Valid")
+
+
+if __name__ == "__main__":
+    unittest.main()
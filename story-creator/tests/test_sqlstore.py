@@ -0,0 +1,70 @@
+"""
+Tests for the SQLite storage backend, libs/sqlstore.py.
+"""
+import os
+import unittest
+
+from libs import json_reader
+from libs.sls import SocialLink
+from libs.sqlstore import SQLiteBackend
+from tests.helpers import TempDataTestCase
+
+
+class TestSQLiteLinks(TempDataTestCase):
+    """
+    Social links saved in the database behave like links saved as files.
+    """
+    def setUp(self):
+        super().setUp()
+        self.files = {arcana: json_reader.readLink(arcana) for arcana in json_reader.listLinks()}
+        self.backend = SQLiteBackend(os.path.join(self.root, 'data.db'))
+        self.addCleanup(self.backend.close)
+        self.backend.importFiles()
+        json_reader.useBackend(self.backend)
+
+    def testImport(self):
+        """
+        Imported links read back exactly as they were in their files.
+        """
+        self.assertEqual(json_reader.listLinks(), sorted(self.files))
+        for arcana, doc in self.files.items():
+            with self.subTest(arcana=arcana):
+                self.assertEqual(json_reader.readLink(arcana), doc)
+
+    def testFullSaveDropsDeletedCutscenes(self):
+        """
+        Saving a fully loaded link drops the cutscenes it no longer has, like the file backend.
+        """
+        link = SocialLink("Void")
+        del link.cutscenes["1_42"]
+        link.save()
+        self.assertNotIn("1_42", json_reader.listCutscenes("Void"))
+        self.assertIsNone(json_reader.readCutscene("Void", "1_42"))
+        self.assertEqual(sorted(json_reader.listCutscenes("Void")), sorted(link.cutsceneKeys()))
+        self.assertNotIn("1_42", json_reader.readManifest("Void")["cutscenes"])
+
+    def testFullSaveKeepsUnreadCutscenes(self):
+        """
+        Cutscenes never read from a fully loaded link are still part of it, and kept.
+        """
+        before = json_reader.readLink("Void")
+        link = SocialLink("Void")
+        link.info = "Changed"
+        link.save()
+        after = json_reader.readLink("Void")
+        self.assertEqual(after["info"], "Changed")
+        self.assertEqual(after["cutscenes"], before["cutscenes"])
+
+    def testPartialSaveKeepsOtherCutscenes(self):
+        """
+        Saving a partially loaded link leaves the cutscenes it didn't load alone.
+        """
+        before = json_reader.listCutscenes("Void")
+        link = SocialLink("Void", ["1_0"])
+        link.info = "Changed"
+        link.save()
+        self.assertEqual(json_reader.listCutscenes("Void"), before)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+"""
+Tests for the atomic, change-aware file writes of libs/json_reader.py.
+"""
+import os
+import unittest
+from unittest import mock
+
+from libs import json_reader
+from libs.sls import SocialLink
+from tests.helpers import TempDataTestCase
+
+PAST = 1000000000 # Modification time given to files that shouldn't be written again
+
+
+class TestWriteFile(TempDataTestCase):
+    """
+    Writing whole files through json_reader._writeFile.
+    """
+    def setUp(self):
+        super().setUp()
+        self.path = json_reader.buildPath('data/written.json')
+
+    def listData(self):
+        """
+        :returns: names of the files of the temporary data directory
+        :rtype: list[str]
+        """
+        return sorted(os.listdir(os.path.dirname(self.path)))
+
+    def testNewFile(self):
+        """
+        A file that doesn't exist yet is created, readable by everyone.
+        """
+        self.assertTrue(json_reader._writeFile(self.path, b'{"a": 1}')) #pylint: disable=protected-access
+        with open(self.path, 'rb') as written:
+            self.assertEqual(written.read(), b'{"a": 1}')
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o644)
+
+    def testUnchangedContent(self):
+        """
+        Writing back the content a file was read or written with leaves the file alone.
+        """
+        json_reader._writeFile(self.path, b'{"a": 1}') #pylint: disable=protected-access
+        os.utime(self.path, ns=(PAST, PAST))
+        json_reader._readFile(self.path) #pylint: disable=protected-access
+        with mock.patch.object(os, "replace") as replace:
+            self.assertFalse(json_reader._writeFile(self.path, b'{"a": 1}')) #pylint: disable=protected-access
+        replace.assert_not_called()
+        self.assertEqual(os.stat(self.path).st_mtime_ns, PAST)
+        self.assertTrue(json_reader._writeFile(self.path, b'{"a": 2}')) #pylint: disable=protected-access
+        self.assertNotEqual(os.stat(self.path).st_mtime_ns, PAST)
+
+    def testChangedBehindOurBack(self):
+        """
+        A file changed by something else since it was read is written again, even with the content it was read
+        with.
+        """
+        json_reader._writeFile(self.path, b'{"a": 1}') #pylint: disable=protected-access
+        with open(self.path, 'wb') as other:
+            other.write(b'{"a": 3}')
+        os.utime(self.path, ns=(PAST, PAST))
+        self.assertTrue(json_reader._writeFile(self.path, b'{"a": 1}')) #pylint: disable=protected-access
+        with open(self.path, 'rb') as written:
+            self.assertEqual(written.read(), b'{"a": 1}')
+
+    def testFailedWrite(self):
+        """
+        A write that fails midway, before or while replacing the file, leaves the original intact and no
+        temporary file behind.
+        """
+        json_reader._writeFile(self.path, b'{"a": 1}') #pylint: disable=protected-access
+        before = self.listData()
+        for target, name in ((os, "replace"), (os, "fsync")):
+            with self.subTest(failing=name):
+                with mock.patch.object(target, name, side_effect=OSError("Disk full")):
+                    with self.assertRaises(OSError):
+                        json_reader._writeFile(self.path, b'{"a": 2}') #pylint: disable=protected-access
+                with open(self.path, 'rb') as original:
+                    self.assertEqual(original.read(), b'{"a": 1}')
+                self.assertEqual(self.listData(), before)
+        self.assertTrue(json_reader._writeFile(self.path, b'{"a": 2}')) #pylint: disable=protected-access
+
+    def testUnchangedLinkSave(self):
+        """
+        Saving a link whose content is what was read doesn't write its file again, its own hash check aside.
+        """
+        path = json_reader.linkPath("Void")
+        link = SocialLink("Void")
+        link.digest = None
+        link.save()
+        os.utime(path, ns=(PAST, PAST))
+        link = SocialLink("Void")
+        link.digest = None
+        link.save()
+        self.assertEqual(os.stat(path).st_mtime_ns, PAST)
+
+
+if __name__ == "__main__":
+    unittest.main()